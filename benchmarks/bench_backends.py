@@ -0,0 +1,124 @@
+"""
+Benchmark of the XML/JSON backends in src.io.backends.
+
+Times every installed backend on each stage and prints the speedup over the
+standard library. Outputs of all backends are compared against the standard
+library on every document.
+
+Usage:
+    python -m benchmarks.bench_backends path/to/xml_directory [--repeat 3]
+"""
+import argparse
+import os
+import time
+
+from src.io import backends
+from src.io.compression import open_file
+from src.io.file_converter import elem_to_dict
+
+STDLIB = {
+    'parse_xml': 'etree',
+    'loads': 'json',
+    'dumps_pretty': 'json',
+    'dumps_compact': 'json',
+}
+
+
+def load_corpus(directory):
+    """
+    Reads XML documents and their dictionary form with the standard library.
+
+    Args:
+        directory: Directory with XML files
+
+    Returns:
+        tuple: (list of XML bytes, list of document dicts)
+    """
+    names = sorted(f for f in os.listdir(directory) if '.xml' in f)
+    xml_docs = []
+    for name in names:
+        with open_file(os.path.join(directory, name), 'rb') as file:
+            xml_docs.append(file.read())
+    backends.set_backend('parse_xml', 'etree')
+    docs = [elem_to_dict(backends.parse_xml(data)) for data in xml_docs]
+    return xml_docs, docs
+
+
+def run_stage(kind, inputs, repeat):
+    """
+    Runs one stage with the currently selected backend.
+
+    Returns:
+        tuple: (best wall time in seconds, outputs of the last run)
+    """
+    funcs = {
+        'parse_xml': lambda data: elem_to_dict(backends.parse_xml(data)),
+        'loads': backends.json_loads,
+        'dumps_pretty': backends.json_dumps_pretty,
+        'dumps_compact': backends.json_dumps_compact,
+    }
+    func = funcs[kind]
+    best = None
+    outputs = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = [func(item) for item in inputs]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outputs
+
+
+def benchmark(directory, repeat=3):
+    """
+    Benchmarks all backends on a directory of XML documents.
+
+    Returns:
+        list of dict: One row per (stage, backend)
+    """
+    xml_docs, docs = load_corpus(directory)
+    json_texts = [backends.json_dumps_pretty(doc) for doc in docs]
+    stage_inputs = {
+        'parse_xml': xml_docs,
+        'loads': json_texts,
+        'dumps_pretty': docs,
+        'dumps_compact': docs,
+    }
+    total_bytes = sum(len(data) for data in xml_docs)
+
+    rows = []
+    for kind, names in backends.available_backends().items():
+        reference_time = None
+        reference_out = None
+        for name in [STDLIB[kind]] + [n for n in names if n != STDLIB[kind]]:
+            backends.set_backend(kind, name)
+            elapsed, outputs = run_stage(kind, stage_inputs[kind], repeat)
+            if reference_out is None:
+                reference_time, reference_out = elapsed, outputs
+            rows.append({
+                'stage': kind,
+                'backend': name,
+                'seconds': elapsed,
+                'docs_per_sec': len(docs) / elapsed if elapsed else float('inf'),
+                'speedup': reference_time / elapsed if elapsed else float('inf'),
+                'identical': outputs == reference_out,
+            })
+        backends.set_backend(kind)
+
+    print(f"{len(docs)} documents, {total_bytes / 1e6:.1f} MB of XML, best of {repeat}")
+    print(f"{'stage':<15}{'backend':<10}{'seconds':>10}{'docs/s':>12}{'speedup':>10}  identical")
+    for row in rows:
+        print(f"{row['stage']:<15}{row['backend']:<10}{row['seconds']:>10.3f}"
+              f"{row['docs_per_sec']:>12.1f}{row['speedup']:>9.2f}x  {row['identical']}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark XML/JSON backends")
+    parser.add_argument('input', help="Directory with XML documents")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage (best is reported)")
+    args = parser.parse_args()
+    benchmark(args.input, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Import-time regression check.
+
+Imports the package entry points in fresh interpreters and checks that
+1. none of the heavy dependencies (pandas, numpy, matplotlib, tqdm) is imported, and
+2. the median import time stays within the budget.
+
+Usage:
+    python -m benchmarks.bench_import [--budget-ms 150] [--repeat 5]
+
+Exits with status 1 if a check fails.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'tqdm', 'lxml')
+
+# Statements timed in a fresh interpreter, with the heavy dependencies that must stay unloaded
+TARGETS = {
+    'src': 'import src',
+    'src.parsers': 'from src.parsers import get_sex, get_gosp_info, compute_full_wards, get_final_table1',
+    'src.io': 'import src.io; from src.io import xml_to_dict, extract_features, PackReader',
+    'src.utils': 'from src.utils import safe_parse_table, find_section_by_optimized_path, analyze_json_values',
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'ms': elapsed * 1000, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(statement, repeat=5):
+    """
+    Runs an import statement in fresh interpreters.
+
+    Args:
+        statement: Python statement to time
+        repeat: Number of interpreter runs
+
+    Returns:
+        dict: {'median_ms': float, 'loaded': list of heavy modules imported by the statement}
+    """
+    times = []
+    loaded = set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result['ms'])
+        loaded.update(result['loaded'])
+    return {'median_ms': round(statistics.median(times), 2), 'loaded': sorted(loaded)}
+
+
+def check(budget_ms=150, repeat=5):
+    """
+    Measures all targets and prints a report.
+
+    Args:
+        budget_ms: Maximum median import time per target
+        repeat: Interpreter runs per target
+
+    Returns:
+        list: Names of failed targets
+    """
+    failed = []
+    print(f"{'target':<14}{'median ms':>11}  heavy modules")
+    for name, statement in TARGETS.items():
+        result = measure(statement, repeat)
+        ok = not result['loaded'] and result['median_ms'] <= budget_ms
+        if not ok:
+            failed.append(name)
+        print(f"{name:<14}{result['median_ms']:>11.1f}  {', '.join(result['loaded']) or '-'}"
+              f"{'' if ok else '  FAIL'}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check package import time")
+    parser.add_argument('--budget-ms', type=float, default=150, help="Maximum median import time per target")
+    parser.add_argument('--repeat', type=int, default=5, help="Interpreter runs per target")
+    args = parser.parse_args()
+
+    failed = check(args.budget_ms, args.repeat)
+    if failed:
+        print(f"Import regressions: {', '.join(failed)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Latency benchmark of the in-memory document service (src.service).
+
+Measures on synthetic documents:
+- parse_document called in-process (one document at a time)
+- DocumentPool.parse_many throughput
+- the HTTP server (`python -m src.service`) under concurrent clients, with
+  client-side p50/p99 latency and the server's own /stats
+
+Usage:
+    python -m benchmarks.bench_service [--docs 200] [--workers 2] [--clients 8]
+        [--batch-size 16] [--batch-wait-ms 2]
+"""
+import argparse
+import http.client
+import json
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from src.service import DocumentPool, parse_document, warm_up
+from src.utils.synthetic_cda import generate_document
+
+
+def percentiles(latencies, points=(50, 90, 99)):
+    """
+    Returns latency percentiles in milliseconds.
+    """
+    latencies = sorted(latencies)
+    result = {f'p{p}': round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 3)
+              for p in points}
+    result['mean'] = round(statistics.mean(latencies) * 1000, 3)
+    return result
+
+
+def bench_in_process(documents):
+    warm_up()
+    latencies = []
+    for xml_data in documents:
+        start = time.perf_counter()
+        parse_document(xml_data)
+        latencies.append(time.perf_counter() - start)
+    return {'docs_per_sec': round(len(documents) / sum(latencies), 1), 'latency_ms': percentiles(latencies)}
+
+
+def bench_pool(documents, workers):
+    with DocumentPool(workers) as pool:
+        start = time.perf_counter()
+        outcomes = pool.parse_many(documents)
+        elapsed = time.perf_counter() - start
+    errors = sum(error is not None for _, error in outcomes)
+    return {'docs_per_sec': round(len(documents) / elapsed, 1), 'errors': errors}
+
+
+def _client(host, port, documents, latencies, failures):
+    connection = http.client.HTTPConnection(host, port)
+    for xml_data in documents:
+        start = time.perf_counter()
+        connection.request('POST', '/parse', body=xml_data, headers={'Content-Type': 'application/xml'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            failures.append(response.status)
+    connection.close()
+
+
+def bench_http(documents, workers, clients, batch_size, batch_wait_ms):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'src.service', '--port', '0', '--workers', str(workers),
+         '--batch-size', str(batch_size), '--batch-wait-ms', str(batch_wait_ms)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        match = re.search(r'http://([^:]+):(\d+)', process.stdout.readline())
+        host, port = match.group(1), int(match.group(2))
+
+        latencies, failures = [], []
+        threads = [threading.Thread(target=_client, args=(host, port, documents[i::clients], latencies, failures))
+                   for i in range(clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        connection = http.client.HTTPConnection(host, port)
+        connection.request('GET', '/stats')
+        server_stats = json.loads(connection.getresponse().read())
+        connection.close()
+    finally:
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=30)
+
+    return {
+        'docs_per_sec': round(len(documents) / elapsed, 1),
+        'failures': len(failures),
+        'latency_ms': percentiles(latencies),
+        'server': server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory document service")
+    parser.add_argument('--docs', type=int, default=200, help="Number of synthetic documents")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes for the pool and the server")
+    parser.add_argument('--clients', type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument('--batch-size', type=int, default=16, help="Server batch size")
+    parser.add_argument('--batch-wait-ms', type=float, default=2.0, help="Server batch wait")
+    args = parser.parse_args()
+
+    documents = [generate_document(i).encode('utf-8') for i in range(args.docs)]
+    report = {
+        'in_process': bench_in_process(documents),
+        'pool': bench_pool(documents, args.workers),
+        'http': bench_http(documents, args.workers, args.clients, args.batch_size, args.batch_wait_ms),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
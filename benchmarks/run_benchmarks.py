@@ -0,0 +1,248 @@
+"""
+Stage benchmark suite on a synthetic CDA corpus.
+
+Generates a reproducible corpus with src.utils.synthetic_cda, times every stage
+of the pipeline, measures its peak Python memory with tracemalloc and compares
+the throughput with a stored baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--docs 200] [--wards 2 4] [--seed 0]
+    python -m benchmarks.run_benchmarks --update-baseline
+
+Throughput below (1 - tolerance) of the baseline is reported as a regression and
+makes the script exit with status 1.
+"""
+import os
+
+# Progress bars would dominate the output of short stages
+os.environ.setdefault('TQDM_DISABLE', '1')
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# The package imports these lazily; import them up front so that no stage is charged for it
+import pandas  # noqa: F401
+import tqdm  # noqa: F401
+
+from src.io.file_converter import xml_to_json
+from src.io.data_processor import modify_json, process_data_to_structured_format
+from src.io.dataset_process import create_patients_table, create_ward_list_table, create_table_generic
+from src.io.table_types import add_stay_columns
+from src.io.lab_store import create_lab_store
+from src.io.text_index import create_text_index
+from src.utils.synthetic_cda import generate_corpus
+from src.utils.table_utils import safe_parse_table, parse_table_as_dict, table_cache
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def _measure(func, items, memory=True):
+    """
+    Runs `func` over all items, returning wall time and peak traced memory.
+
+    The timed run and the memory run are separate, because tracemalloc slows
+    allocation-heavy code down considerably.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        elapsed = time.perf_counter() - start
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            for item in items:
+                func(item)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return elapsed, peak
+
+
+def _collect_tables(features):
+    """
+    Collects all raw tables of feature records, as handed to safe_parse_table.
+    """
+    tables = []
+    for data in features:
+        for key in ('table_gosp', 'diagnosis', 'ward_table', 'final_table1', 'final_table2'):
+            if data.get(key):
+                tables.append(data[key])
+        for researches in (data.get('ward_list') or {}).values():
+            tables.extend(table for table in researches.values() if table)
+    return tables
+
+
+def run(docs=200, wards=(2, 4), seed=0, memory=True, workdir=None):
+    """
+    Runs all stage benchmarks.
+
+    Args:
+        docs: Number of synthetic documents
+        wards: (min, max) wards per document
+        seed: Corpus seed
+        memory: Also measure peak memory
+        workdir: Directory for the corpus and intermediate files (temporary if None)
+
+    Returns:
+        dict: Stage name -> metrics
+    """
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='cda_bench_')
+    try:
+        xml_dir = os.path.join(workdir, 'xml')
+        json_dir = os.path.join(workdir, 'json')
+        feat_dir = os.path.join(workdir, 'features')
+        struct_dir = os.path.join(workdir, 'structured')
+        for directory in (json_dir, feat_dir, struct_dir):
+            os.makedirs(directory, exist_ok=True)
+
+        xml_paths = generate_corpus(xml_dir, docs, seed=seed, wards=wards)
+        names = [os.path.splitext(os.path.basename(p))[0] for p in xml_paths]
+        xml_bytes = sum(os.path.getsize(p) for p in xml_paths)
+
+        results = {}
+
+        def record(stage, elapsed, peak, count, nbytes=None):
+            results[stage] = {
+                'items': count,
+                'seconds': round(elapsed, 4),
+                'items_per_sec': round(count / elapsed, 2) if elapsed else None,
+                'mb_per_sec': round(nbytes / 1e6 / elapsed, 3) if nbytes and elapsed else None,
+                'peak_mb': round(peak / 1e6, 2) if peak is not None else None,
+            }
+
+        elapsed, peak = _measure(
+            lambda n: xml_to_json(os.path.join(xml_dir, n + '.xml'), os.path.join(json_dir, n + '.json')),
+            names, memory)
+        record('xml_to_json', elapsed, peak, docs, xml_bytes)
+
+        json_bytes = sum(os.path.getsize(os.path.join(json_dir, n + '.json')) for n in names)
+        elapsed, peak = _measure(
+            lambda n: modify_json(os.path.join(json_dir, n + '.json'), os.path.join(feat_dir, f'file_{n}.json')),
+            names, memory)
+        record('modify_json', elapsed, peak, docs, json_bytes)
+
+        features = []
+        for name in names:
+            with open(os.path.join(feat_dir, f'file_{name}.json'), 'r', encoding='utf-8') as file:
+                features.append(json.load(file))
+
+        elapsed, peak = _measure(process_data_to_structured_format, features, memory)
+        record('process_data_to_structured_format', elapsed, peak, docs)
+
+        tables = _collect_tables(features)
+        elapsed, peak = _measure(safe_parse_table, tables, memory)
+        record('safe_parse_table', elapsed, peak, len(tables))
+
+        elapsed, _ = _measure(parse_table_as_dict, tables, memory=False)
+        record('parse_table_as_dict', elapsed, None, len(tables))
+        # Same tables with a cold subtree-hash cache (timed pass only, a memory pass would hit the warm cache)
+        with table_cache() as cache:
+            elapsed, _ = _measure(parse_table_as_dict, tables, memory=False)
+        record('parse_table_as_dict.cached', elapsed, None, len(tables))
+        results['parse_table_as_dict.cached']['cache'] = cache.info()
+
+        for i, data in enumerate(features, start=1):
+            with open(os.path.join(struct_dir, f'file_{i}.json'), 'w', encoding='utf-8') as file:
+                json.dump(process_data_to_structured_format(data), file, ensure_ascii=False, indent=4)
+
+        builders = {
+            'create_patients_table': lambda _: create_patients_table(struct_dir),
+            'create_ward_list_table': lambda _: create_ward_list_table(struct_dir),
+            'create_table_generic': lambda _: create_table_generic(
+                struct_dir, "pd.DataFrame.from_dict(data['tables']['final_table1'])"),
+            'create_lab_store': lambda _: create_lab_store(struct_dir),
+            'create_text_index': lambda _: create_text_index(struct_dir),
+        }
+        for stage, builder in builders.items():
+            elapsed, peak = _measure(builder, [None], memory)
+            record(stage, elapsed, peak, docs)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            patients = create_patients_table(struct_dir)
+            table_gosp = create_table_generic(struct_dir, "pd.DataFrame.from_dict(data['tables']['table_gosp'])")
+        elapsed, peak = _measure(lambda _: add_stay_columns(patients, table_gosp), [None], memory)
+        record('add_stay_columns', elapsed, peak, docs)
+
+        return results
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Compares throughput with a baseline.
+
+    Args:
+        results: Output of `run`
+        baseline: Stored baseline (same structure, under the 'stages' key)
+        tolerance: Allowed relative throughput drop
+
+    Returns:
+        list: Names of regressed stages
+    """
+    regressions = []
+    stages = baseline.get('stages', {})
+    print(f"{'stage':<36}{'items/s':>12}{'MB/s':>9}{'peak MB':>10}{'vs base':>10}")
+    for stage, metrics in results.items():
+        base = stages.get(stage, {}).get('items_per_sec')
+        ratio = metrics['items_per_sec'] / base if base and metrics['items_per_sec'] else None
+        flag = ''
+        if ratio is not None and ratio < 1 - tolerance:
+            regressions.append(stage)
+            flag = '  REGRESSION'
+        print(f"{stage:<36}{metrics['items_per_sec'] or 0:>12.1f}{metrics['mb_per_sec'] or 0:>9.2f}"
+              f"{metrics['peak_mb'] if metrics['peak_mb'] is not None else float('nan'):>10.2f}"
+              f"{(f'{ratio:.2f}x' if ratio is not None else '-'):>10}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline stages on a synthetic CDA corpus")
+    parser.add_argument('--docs', type=int, default=200, help="Number of synthetic documents")
+    parser.add_argument('--wards', type=int, nargs=2, default=(2, 4), metavar=('MIN', 'MAX'),
+                        help="Wards per document")
+    parser.add_argument('--seed', type=int, default=0, help="Corpus seed")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc run")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument('--update-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative throughput drop")
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(args.docs, tuple(args.wards), args.seed, memory=not args.no_memory)
+    report = {
+        'params': {'docs': args.docs, 'wards': list(args.wards), 'seed': args.seed},
+        'python': platform.python_version(),
+        'stages': results,
+    }
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,12 +7,17 @@ This package provides tools for:
 3. Processing medical records
 4. Analyzing medical data
 """
+from src.utils.lazy import lazy_exports
 
-# Make key components available at package level
-from src.io.file_converter import xml_to_json, process_files_in_directory
-from src.io.data_processor import (
-    modify_json,
-    save_features,
-    process_data_to_structured_format,
-    process_folder_to_structured_format
-) 
\ No newline at end of file
+# Re-exports are imported on first access, so importing the package stays cheap
+_EXPORTS = {
+    'xml_to_json': 'src.io.file_converter',
+    'process_files_in_directory': 'src.io.file_converter',
+    'modify_json': 'src.io.data_processor',
+    'save_features': 'src.io.data_processor',
+    'process_data_to_structured_format': 'src.io.data_processor',
+    'process_folder_to_structured_format': 'src.io.data_processor',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,7 @@
+"""
+Entry point for `python -m src` (see src.cli).
+"""
+from src.cli import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Command-line pipeline runner.
+
+Runs any consecutive range of the pipeline stages
+    convert     XML -> JSON                     (process_files_in_directory)
+    features    JSON -> feature records         (save_features)
+    structured  features -> structured records  (process_folder_to_structured_format)
+    tables      structured -> dataset tables    (create_*_table)
+with shared options, writing each stage's output to a subfolder of the output
+directory: json/, features/, structured/ and tables/. The input of the first
+selected stage is given on the command line; every later stage reads the
+previous stage's output.
+
+Progress and statistics go to stderr. At the end a JSON summary with the
+throughput and the errors (aggregated by cause) of each stage is printed to
+stdout or written to --summary.
+
+Usage:
+    python -m src INPUT OUTPUT_DIR [--from convert] [--to tables] [--workers 4]
+        [--incremental] [--output-format json|jsonl|pack] [--compress gz|xz|bz2]
+        [--profile] [--error-logs] [--dedup] [--io-concurrency 32] [--summary summary.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+STAGES = ('convert', 'features', 'structured', 'tables')
+
+# Output location of each document stage, relative to the output directory
+STAGE_OUTPUTS = {'convert': 'json', 'features': 'features', 'structured': 'structured', 'tables': 'tables'}
+
+# Tables built by the 'tables' stage with create_table_generic: name -> (accessor, id column)
+GENERIC_TABLES = {
+    name: (f"pd.DataFrame.from_dict(data['tables']['{name}'])", f"{name}_id")
+    for name in ('table_gosp', 'diagnosis', 'ward_table', 'final_table1', 'final_table2')
+}
+
+
+def stage_output(output_dir, stage, output_format='json'):
+    """
+    Returns the output path of a stage.
+
+    Args:
+        output_dir: Pipeline output directory
+        stage: Stage name
+        output_format: 'json', 'jsonl' or 'pack'
+
+    Returns:
+        str: Directory (or `.pack` path for the 'pack' format)
+    """
+    path = os.path.join(output_dir, STAGE_OUTPUTS[stage])
+    if output_format == 'pack' and stage != 'tables':
+        path += '.pack'
+    return path
+
+
+def _write_table(df, path, table_format):
+    if table_format == 'csv':
+        df.to_csv(path + '.csv', index=False)
+    elif table_format == 'parquet':
+        df.to_parquet(path + '.parquet', index=False)
+    elif table_format == 'pickle':
+        df.to_pickle(path + '.pkl')
+    else:
+        raise ValueError("table_format must be 'csv', 'parquet' or 'pickle'")
+
+
+def _build_tables(input_path, output_path, table_format='csv', error_log=None, dedup=False):
+    """
+    Builds the dataset tables from structured records and writes them to a directory.
+    With `dedup`, duplicate records are left out of all tables.
+
+    Returns:
+        dict: Statistics with the row count of every table, the duplicates and the errors by cause.
+            Like the document stages, total, success and errors count records: a record that
+            failed in any of the tables is counted once in errors
+    """
+    from src.io.dataset_process import (create_patients_table, create_ward_list_table, create_table_generic,
+                                        extract_number)
+    from src.io.dedup import SeenSet, find_duplicates
+    from src.io.storage import open_source
+    from src.utils.errors import ErrorCollector
+
+    os.makedirs(output_path, exist_ok=True)
+    rows = {}
+    duplicates = {}
+    with open_source(input_path) as source:
+        names = sorted(source.list_names('.json'), key=extract_number)
+        if dedup:
+            # The tables are rebuilt from all records on every run, so only duplicates within them count
+            with SeenSet() as seen:
+                duplicates = find_duplicates(source, names, seen)
+    with ErrorCollector(error_log) as errors:
+        patients = create_patients_table(input_path, errors=errors, exclude=duplicates)
+        _write_table(patients, os.path.join(output_path, 'patients'), table_format)
+        rows['patients'] = len(patients)
+
+        ward_list = create_ward_list_table(input_path, errors=errors, exclude=duplicates)
+        _write_table(ward_list, os.path.join(output_path, 'ward_list'), table_format)
+        rows['ward_list'] = len(ward_list)
+
+        for name, (accessor, id_column) in GENERIC_TABLES.items():
+            table = create_table_generic(input_path, accessor, id_column_name=id_column, errors=errors,
+                                         exclude=duplicates, fields=[f'tables.{name}'])
+            _write_table(table, os.path.join(output_path, name), table_format)
+            rows[name] = len(table)
+
+    failed = len(errors.failed_files())
+    return {
+        'total': len(names),
+        'success': len(names) - len(duplicates) - failed,
+        'errors': failed,
+        'duplicates': len(duplicates),
+        'tables': rows,
+        'error_causes': errors.summary(),
+    }
+
+
+def run_pipeline(input_path, output_dir, first='convert', last='tables', workers=1, incremental=False,
+                 output_format='json', shard_size=10000, compress=None, profile=False, error_logs=False,
+                 table_format='csv', dedup=False, table_cache_size=None, io_concurrency=None):
+    """
+    Runs a range of pipeline stages.
+
+    Args:
+        input_path: Input of the first stage (directory, pack, archive or shards)
+        output_dir: Directory that receives one subfolder per stage
+        first: First stage to run
+        last: Last stage to run
+        workers: Worker processes for the document stages
+        incremental: Skip documents that are already converted; `features` resumes from its checkpoint
+        output_format: 'json', 'jsonl' or 'pack' for the document stages
+        shard_size: Records per shard for the 'jsonl' format
+        compress: None, 'gz', 'xz' or 'bz2' - compression of the stage outputs (not available for packs,
+            which are always uncompressed)
+        profile: Collect timers and counters for every stage
+        error_logs: Write the errors of each stage to `<output_dir>/logs/<stage>.errors.jsonl`
+        table_format: 'csv', 'parquet' or 'pickle' for the tables stage
+        dedup: Skip duplicate documents (see src.io.dedup). The convert stage keeps a persisted seen set in
+            `<output_dir>/dedup/convert.seen.jsonl`, so documents resent in later batches are skipped;
+            the tables stage leaves out duplicate records
+        table_cache_size: Parsed tables cached by subtree hash in the structured stage (None - off)
+        io_concurrency: Reads prefetched asynchronously by the document stages (None - off, see
+            src.utils.prefetch); for inputs on slow network filesystems, with workers=1
+
+    Returns:
+        dict: Summary with the statistics of each stage
+    """
+    from src.io.file_converter import process_files_in_directory
+    from src.io.data_processor import save_features, process_folder_to_structured_format
+
+    stages = STAGES[STAGES.index(first):STAGES.index(last) + 1]
+    if not stages:
+        raise ValueError(f"Stage '{first}' comes after '{last}'")
+    if compress and output_format == 'pack':
+        raise ValueError("Packs are not compressed; use compress with the 'json' or 'jsonl' output format")
+    sink_format = 'jsonl' if output_format == 'jsonl' else 'json'
+
+    summary = {'input': input_path, 'output': output_dir, 'stages': {}}
+    current_input = input_path
+    for stage in stages:
+        output_path = stage_output(output_dir, stage, output_format)
+        error_log = os.path.join(output_dir, 'logs', f'{stage}.errors.jsonl') if error_logs else None
+        common = dict(profile=profile, error_log=error_log, workers=workers, io_concurrency=io_concurrency)
+        document_options = dict(output_format=sink_format, shard_size=shard_size, compress=compress)
+
+        start = time.perf_counter()
+        if stage == 'convert':
+            seen_path = os.path.join(output_dir, 'dedup', 'convert.seen.jsonl') if dedup else None
+            stats = process_files_in_directory(current_input, output_path, incremental=incremental, dedup=seen_path,
+                                               **document_options, **common)
+        elif stage == 'features':
+            stats = save_features(current_input, output_path, resume=incremental, **document_options, **common)
+        elif stage == 'structured':
+            stats = process_folder_to_structured_format(current_input, output_path, incremental=incremental,
+                                                        table_cache_size=table_cache_size,
+                                                        **document_options, **common)
+        else:
+            stats = _build_tables(current_input, output_path, table_format, error_log, dedup)
+        elapsed = time.perf_counter() - start
+
+        processed = stats['success'] + stats['errors']
+        stats.update({
+            'input': current_input,
+            'output': output_path,
+            'seconds': round(elapsed, 3),
+            'docs_per_sec': round(processed / elapsed, 2) if elapsed else None,
+        })
+        summary['stages'][stage] = stats
+        current_input = output_path
+
+    summary['errors'] = sum(stats['errors'] for stats in summary['stages'].values())
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src', description="Run pipeline stages end to end")
+    parser.add_argument('input', help="Input of the first stage: directory, pack, zip/tar archive or JSON Lines shards")
+    parser.add_argument('output', help="Output directory (one subfolder per stage)")
+    parser.add_argument('--from', dest='first', choices=STAGES, default='convert', help="First stage")
+    parser.add_argument('--to', dest='last', choices=STAGES, default='tables', help="Last stage")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes for the document stages")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Skip documents converted by a previous run; resume save_features from its checkpoint")
+    parser.add_argument('--output-format', choices=('json', 'jsonl', 'pack'), default='json',
+                        help="Format of the document stage outputs")
+    parser.add_argument('--shard-size', type=int, default=10000, help="Records per shard for --output-format jsonl")
+    parser.add_argument('--compress', choices=('gz', 'xz', 'bz2'),
+                        help="Compress the document stage outputs (json and jsonl formats; packs are not compressed)")
+    parser.add_argument('--table-format', choices=('csv', 'parquet', 'pickle'), default='csv',
+                        help="Format of the tables stage output")
+    parser.add_argument('--profile', action='store_true', help="Include stage/parser timers and counters")
+    parser.add_argument('--error-logs', action='store_true', help="Write per-stage JSON Lines error logs to OUTPUT/logs")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Skip duplicate documents, also across runs into the same OUTPUT (see src.io.dedup)")
+    parser.add_argument('--table-cache', type=int, metavar='N',
+                        help="Cache up to N parsed tables by content in the structured stage")
+    parser.add_argument('--io-concurrency', type=int, metavar='N',
+                        help="Prefetch up to N file reads asynchronously in the document stages (slow network filesystems)")
+    parser.add_argument('--summary', help="Write the JSON summary to this file instead of stdout")
+    args = parser.parse_args(argv)
+    if args.compress and args.output_format == 'pack':
+        parser.error("--compress cannot be used with --output-format pack")
+
+    # Keep stdout for the machine-readable summary
+    with contextlib.redirect_stdout(sys.stderr):
+        summary = run_pipeline(args.input, args.output, args.first, args.last, workers=args.workers,
+                               incremental=args.incremental, output_format=args.output_format,
+                               shard_size=args.shard_size, compress=args.compress, profile=args.profile,
+                               error_logs=args.error_logs, table_format=args.table_format, dedup=args.dedup,
+                               table_cache_size=args.table_cache, io_concurrency=args.io_concurrency)
+
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    return summary
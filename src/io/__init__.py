@@ -5,13 +5,45 @@ This module contains functionality for:
 - Converting between XML and JSON formats
 - Processing medical data files
 - Saving and loading structured data
+- Streaming documents through the stages one at a time
+- Flattening research and lab results into a columnar store
+- Full-text search over the anamnesis and condition texts
+- Bitmap-indexed cohort selection across the tables
+- Packing many small documents into a single memory-mapped file
 """
+from src.utils.lazy import lazy_exports
 
-from src.io.file_converter import xml_to_json, process_files_in_directory
-from src.io.data_processor import (
-    modify_json,
-    save_features,
-    process_data_to_structured_format,
-    process_file_to_structured_format,
-    process_folder_to_structured_format
-) 
\ No newline at end of file
+# Re-exports are imported on first access, so importing the package stays cheap
+_EXPORTS = {
+    'xml_to_json': 'src.io.file_converter',
+    'xml_to_dict': 'src.io.file_converter',
+    'process_files_in_directory': 'src.io.file_converter',
+    'extract_features': 'src.io.data_processor',
+    'modify_json': 'src.io.data_processor',
+    'save_features': 'src.io.data_processor',
+    'process_data_to_structured_format': 'src.io.data_processor',
+    'process_file_to_structured_format': 'src.io.data_processor',
+    'process_folder_to_structured_format': 'src.io.data_processor',
+    'iter_documents': 'src.io.streaming',
+    'iter_records': 'src.io.streaming',
+    'iter_features': 'src.io.streaming',
+    'iter_structured': 'src.io.streaming',
+    'iter_table_rows': 'src.io.streaming',
+    'SharedCategories': 'src.io.table_types',
+    'type_patients_table': 'src.io.table_types',
+    'add_stay_columns': 'src.io.table_types',
+    'LabStore': 'src.io.lab_store',
+    'LabStoreBuilder': 'src.io.lab_store',
+    'create_lab_store': 'src.io.lab_store',
+    'ParameterSeries': 'src.io.lab_series',
+    'TextIndex': 'src.io.text_index',
+    'create_text_index': 'src.io.text_index',
+    'Bitmap': 'src.io.cohort',
+    'CohortIndex': 'src.io.cohort',
+    'PackReader': 'src.io.pack',
+    'PackWriter': 'src.io.pack',
+    'pack_directory': 'src.io.pack',
+}
+
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
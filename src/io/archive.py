@@ -0,0 +1,143 @@
+"""
+Read access to documents inside zip and tar archives.
+
+Members are streamed straight from the archive, nothing is extracted to disk.
+Member names keep their directory part inside the archive, e.g. `batch_1/doc.xml`.
+Compressed members (`doc.xml.gz`, ...) are decompressed while they are read.
+"""
+from src.io.compression import strip_compression_suffix, wrap_stream
+from src.io.backends import json_loads
+from src.utils.lazy import lazy_import
+from src.utils.profiling import timed, count, counted
+
+tarfile = lazy_import('tarfile')
+zipfile = lazy_import('zipfile')
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path):
+    """
+    Checks whether the path points to a supported archive.
+
+    Args:
+        path: Path to check
+
+    Returns:
+        bool: True for zip and (compressed) tar archives
+    """
+    return str(path).lower().endswith(ARCHIVE_SUFFIXES)
+
+
+class ArchiveSource:
+    """
+    Reads documents from a zip or tar archive.
+
+    For tar archives reading members in archive order is a single forward pass
+    over the (possibly compressed) stream; reading them in any other order seeks
+    back, which decompresses a compressed tar again from its start. Iterating
+    over the source reads the members in archive order.
+
+    Args:
+        path: Path to the archive
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if str(path).lower().endswith('.zip'):
+            self._zip = zipfile.ZipFile(path)
+            self._tar = None
+            self._members = {info.filename: info for info in self._zip.infolist() if not info.is_dir()}
+        else:
+            self._zip = None
+            self._tar = tarfile.open(path, 'r:*')
+            self._members = {member.name: member for member in self._tar.getmembers() if member.isfile()}
+        # Zip members are opened with their own position; tar members share the stream (see src.utils.prefetch)
+        self.concurrent_reads = self._zip is not None
+        # Tar members are only cheap to read in archive order (see src.utils.parallel)
+        self.sequential_reads = self._zip is None
+
+    def list_names(self, suffix=''):
+        """
+        Returns member names with the given suffix in archive order.
+
+        Args:
+            suffix: Name suffix, e.g. '.xml' (also matches 'doc.xml.gz')
+
+        Returns:
+            list: Member names
+        """
+        return [name for name in self._members if strip_compression_suffix(name).endswith(suffix)]
+
+    def _open_raw(self, name):
+        """
+        Opens a member as a binary stream without decompression.
+        """
+        if self._zip is not None:
+            return self._zip.open(self._members[name])
+        return self._tar.extractfile(self._members[name])
+
+    def open(self, name):
+        """
+        Opens a member as a decompressed binary stream.
+
+        Args:
+            name: Member name
+
+        Returns:
+            File-like object
+        """
+        return counted(wrap_stream(self._open_raw(name), name))
+
+    def read_bytes(self, name):
+        """
+        Returns the (decompressed) bytes of a member.
+        """
+        with timed('io.read'), self._open_raw(name) as raw, wrap_stream(raw, name) as file:
+            data = file.read()
+        count('bytes_read', len(data))
+        return data
+
+    def load_json(self, name):
+        """
+        Loads a JSON member.
+        """
+        data = self.read_bytes(name)
+        with timed('json.load'):
+            return json_loads(data)
+
+    def iter_bytes(self, names=None):
+        """
+        Yields the (decompressed) bytes of members in archive order.
+
+        Args:
+            names: Only read these members (default: all)
+
+        Yields:
+            tuple: (name, bytes)
+        """
+        wanted = set(names) if names is not None else None
+        for name in self._members:
+            if wanted is None or name in wanted:
+                yield name, self.read_bytes(name)
+
+    def __iter__(self):
+        """
+        Iterates over (name, bytes) pairs in archive order, a single forward pass for tar archives.
+        """
+        return self.iter_bytes()
+
+    def close(self):
+        """
+        Closes the archive.
+        """
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,264 @@
+"""
+Pluggable XML and JSON parser/serializer backends.
+
+Faster libraries are used when they are installed, the standard library otherwise:
+- XML parsing: xml.etree.ElementTree by default, lxml on request. Parsing itself is
+  faster with lxml, but building dictionaries from lxml elements is slower, so for
+  `xml_to_dict` lxml only pays off on very large documents
+  (see benchmarks/bench_backends.py)
+- JSON parsing: orjson, ujson, fallback json
+- Compact JSON output: orjson, ujson, fallback json
+- Indented JSON output (indent=4): ujson, fallback json (orjson only supports indent=2)
+
+A fast backend is only selected for an operation if it produces exactly the same
+result as the standard library on a probe document covering everything this
+pipeline writes (nested dicts and lists, empty containers, None, booleans,
+integers, floats whose shortest form differs between libraries (1e16, 1/3),
+NaN and Infinity, non-ASCII text and escaped characters). Backends can also be
+chosen explicitly with `set_backend`.
+
+The json module writes missing table cells (NaN) as the non-standard `NaN`,
+which orjson rejects. The fast parsers therefore hand a document they cannot
+decode to `json.loads`, so they read everything the json module writes, and
+documents that are invalid for both fail with the json module's error.
+
+The fast serializers write some floats in another form than the json module
+(orjson `1e16` for `1e+16`, ujson `1e-5` for `1e-05`) and orjson writes NaN as
+null, so they do not pass the probe and JSON is written with the json module.
+"""
+import importlib.util
+import json
+import xml.etree.ElementTree as ET
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# lxml is opt-in, so it is only imported when it is first used
+_HAS_LXML = importlib.util.find_spec('lxml') is not None
+
+
+_PROBE = {
+    "{urn:hl7-org:v3}section": {
+        "{urn:hl7-org:v3}title": {"text": "Анамнез \"жизни\" \\ / \t\n\u0001 "},
+        "entries": [1, -2, 0, [], {}, [[]], None, True, False],
+        "floats": [1e16, 0.1, 1 / 3, -2.5e-07, 120.0, 1e-05, 12345678.9],
+        "missing": [float('nan'), float('inf'), float('-inf')],
+        "table": {"Показатель": ["Гемоглобин", None], "Значение": ["120 г/л", "—"]},
+    },
+    "id": "12345",
+}
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+def _stdlib_dumps_compact(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _stdlib_dumps_pretty(obj):
+    return json.dumps(obj, ensure_ascii=False, indent=4)
+
+
+def _with_fallback(loads):
+    """
+    Wraps a fast parser so that documents it rejects are parsed by the json module.
+    """
+    def fallback_loads(data):
+        try:
+            return loads(data)
+        except ValueError:
+            return json.loads(data)
+    return fallback_loads
+
+
+def _stdlib_parse_xml(data):
+    if isinstance(data, (str, bytes)):
+        return ET.fromstring(data)
+    return ET.parse(data).getroot()
+
+
+_LOADS = {'json': _stdlib_loads}
+_DUMPS_COMPACT = {'json': _stdlib_dumps_compact}
+_DUMPS_PRETTY = {'json': _stdlib_dumps_pretty}
+_PARSE_XML = {'etree': _stdlib_parse_xml}
+
+if orjson is not None:
+    _LOADS['orjson'] = _with_fallback(orjson.loads)
+    _DUMPS_COMPACT['orjson'] = lambda obj: orjson.dumps(obj).decode('utf-8')
+
+if ujson is not None:
+    _LOADS['ujson'] = _with_fallback(ujson.loads)
+    _DUMPS_COMPACT['ujson'] = lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+    _DUMPS_PRETTY['ujson'] = lambda obj: ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, indent=4)
+
+if _HAS_LXML:
+    _lxml = None
+
+    def _lxml_parser():
+        global _lxml
+        if _lxml is None:
+            from lxml import etree as lxml_etree
+            try:
+                # Expand internal entities like expat does, but never fetch external ones
+                parser = lxml_etree.XMLParser(resolve_entities='internal', no_network=True,
+                                              huge_tree=True, remove_comments=True, remove_pis=True)
+            except (TypeError, ValueError):
+                parser = lxml_etree.XMLParser(resolve_entities=False, no_network=True,
+                                              huge_tree=True, remove_comments=True, remove_pis=True)
+            _lxml = (lxml_etree, parser)
+        return _lxml
+
+    def _lxml_parse_xml(data):
+        if isinstance(data, str):
+            # lxml rejects str input with an encoding declaration
+            return _stdlib_parse_xml(data)
+        lxml_etree, parser = _lxml_parser()
+        if isinstance(data, bytes):
+            return lxml_etree.fromstring(data, parser)
+        return lxml_etree.parse(data, parser).getroot()
+
+    _PARSE_XML['lxml'] = _lxml_parse_xml
+
+
+def _probe_ok(kind, func):
+    """
+    Checks that a backend gives the same result as the standard library on the probe document.
+    """
+    try:
+        if kind == 'loads':
+            # Compared through the json module's output, as NaN != NaN
+            text = _stdlib_dumps_compact(_PROBE)
+            return _stdlib_dumps_compact(func(text)) == text == _stdlib_dumps_compact(func(text.encode('utf-8')))
+        if kind == 'dumps_compact':
+            return func(_PROBE) == _stdlib_dumps_compact(_PROBE)
+        if kind == 'dumps_pretty':
+            return func(_PROBE) == _stdlib_dumps_pretty(_PROBE)
+        if kind == 'parse_xml':
+            from src.io.file_converter import elem_to_dict
+            xml_data = ('<?xml version="1.0" encoding="UTF-8"?>'
+                        '<doc xmlns="urn:hl7-org:v3"><!-- c --><a code="1" n="x">Текст &amp; '
+                        '<b/></a><a code="2"><?pi x?><c>  </c></a></doc>').encode('utf-8')
+            return elem_to_dict(func(xml_data)) == elem_to_dict(_stdlib_parse_xml(xml_data))
+    except Exception:
+        return False
+    return False
+
+
+_REGISTRY = {
+    'loads': (_LOADS, ('orjson', 'ujson', 'json')),
+    'dumps_compact': (_DUMPS_COMPACT, ('orjson', 'ujson', 'json')),
+    'dumps_pretty': (_DUMPS_PRETTY, ('ujson', 'json')),
+    'parse_xml': (_PARSE_XML, ('etree', 'lxml')),
+}
+
+_active = {}
+
+
+def available_backends():
+    """
+    Returns the installed backends for each operation.
+
+    Returns:
+        dict: Operation name -> list of backend names
+    """
+    return {kind: list(backends) for kind, (backends, _) in _REGISTRY.items()}
+
+
+def set_backend(kind, name=None):
+    """
+    Selects the backend for an operation.
+
+    Args:
+        kind: 'loads', 'dumps_compact', 'dumps_pretty' or 'parse_xml'
+        name: Backend name (see `available_backends`). If None, the fastest
+            installed backend that passes the probe is chosen
+
+    Returns:
+        str: Name of the selected backend
+    """
+    backends, preference = _REGISTRY[kind]
+    if name is None:
+        name = next(n for n in preference if n in backends and _probe_ok(kind, backends[n]))
+    elif name not in backends:
+        raise ValueError(f"Backend '{name}' is not available for {kind}: {sorted(backends)}")
+    _active[kind] = (name, backends[name])
+    return name
+
+
+def get_backends():
+    """
+    Returns the backend selected for each operation.
+
+    Returns:
+        dict: Operation name -> backend name
+    """
+    return {kind: _get(kind)[0] for kind in _REGISTRY}
+
+
+def _get(kind):
+    if kind not in _active:
+        set_backend(kind)
+    return _active[kind]
+
+
+def json_loads(data):
+    """
+    Parses JSON from str or bytes.
+    """
+    return _get('loads')[1](data)
+
+
+def json_load(file):
+    """
+    Parses JSON from a file object.
+
+    The document is read in full before it is parsed: none of the backends
+    decodes JSON incrementally, so the decompressed text of a compressed
+    document is held in memory next to the parsed object while it is parsed.
+    Compressed files are still decompressed as a stream, never written to
+    disk, and the text is passed on as bytes, without another decoded copy.
+    Readers that only need some fields can avoid building the rest of the
+    object with src.io.selective.
+    """
+    return json_loads(file.read())
+
+
+def json_dumps_compact(obj):
+    """
+    Serializes to compact JSON (no whitespace, non-ASCII kept as is).
+    """
+    return _get('dumps_compact')[1](obj)
+
+
+def json_dumps_pretty(obj):
+    """
+    Serializes to JSON with indent=4 (non-ASCII kept as is), same as
+    `json.dump(obj, file, ensure_ascii=False, indent=4)`.
+    """
+    return _get('dumps_pretty')[1](obj)
+
+
+def json_dump_pretty(obj, file):
+    """
+    Writes JSON with indent=4 to a text file object.
+    """
+    file.write(json_dumps_pretty(obj))
+
+
+def parse_xml(data):
+    """
+    Parses XML from str, bytes or a binary stream.
+
+    Returns:
+        Root element (xml.etree or lxml element)
+    """
+    return _get('parse_xml')[1](data)
@@ -0,0 +1,173 @@
+"""
+Checkpoints for long-running folder jobs.
+
+A checkpoint is a small JSON marker written next to the job's output after
+every `every` input files. It holds the position in the (sorted) input list,
+the job's counters and the state of its output: the sink's `sync()` state
+(pack and shard sizes) or the number of flushed table parts. The marker is
+replaced atomically, and only after the output it describes has been flushed
+to disk, so after a crash the output is always at least as far as the marker.
+On resume, anything written after the marker is cut off and the job continues
+at the marker's position. It therefore writes the same records, numbering and
+IDs as an uninterrupted run.
+
+The errors collected by the job are not part of the marker: every checkpoint
+appends the records collected since the previous one to `<marker>.errors.jsonl`,
+and the marker holds the size of that file, so a checkpoint costs the same
+however many files have failed.
+
+The marker and the error file are removed when the job completes.
+"""
+import hashlib
+import json
+import os
+from src.io.pack import PACK_SUFFIX
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+DEFAULT_CHECKPOINT_EVERY = 1000
+
+
+def checkpoint_path(output_path, job):
+    """
+    Returns the marker path for a job's output.
+
+    Args:
+        output_path: Output directory or `.pack` path
+        job: Job name, e.g. 'save_features'
+
+    Returns:
+        str: `<output_dir>/_<job>.checkpoint` or `<pack>.<job>.checkpoint`
+    """
+    if str(output_path).endswith(PACK_SUFFIX):
+        return f"{output_path}.{job}{CHECKPOINT_SUFFIX}"
+    return os.path.join(output_path, f"_{job}{CHECKPOINT_SUFFIX}")
+
+
+def fingerprint(names):
+    """
+    Returns a fingerprint of the input file list, so a checkpoint is never applied to different input.
+
+    Args:
+        names: Input file names in processing order
+
+    Returns:
+        str: SHA-1 hex digest
+    """
+    digest = hashlib.sha1()
+    for name in names:
+        digest.update(name.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """
+    Periodic progress marker of one job.
+
+    Args:
+        path: Marker file path (see `checkpoint_path`)
+        job: Job name stored in the marker
+        input_fingerprint: Fingerprint of the input list (see `fingerprint`)
+        every: Number of input files between checkpoints
+        errors: ErrorCollector of the job; its records are saved with every checkpoint and restored by `load`
+    """
+
+    def __init__(self, path, job, input_fingerprint, every=DEFAULT_CHECKPOINT_EVERY, errors=None):
+        if every < 1:
+            raise ValueError("checkpoint interval must be positive")
+        self.path = path
+        self.job = job
+        self.input_fingerprint = input_fingerprint
+        self.every = every
+        self.errors = errors
+        self.errors_path = path + '.errors.jsonl'
+        # Records of the collector from before the job (not saved), saved records and the size of their file
+        self._errors_base = len(errors) if errors is not None else 0
+        self._errors_saved = 0
+        self._errors_size = 0
+
+    def load(self):
+        """
+        Reads the marker, restoring the saved errors into the job's ErrorCollector.
+
+        Returns:
+            dict or None: Saved state, None if there is no checkpoint
+
+        Raises:
+            ValueError: If the marker belongs to another job or another input
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r', encoding='utf-8') as file:
+            marker = json.load(file)
+        if marker.get('job') != self.job or marker.get('input') != self.input_fingerprint:
+            raise ValueError(f"Checkpoint {self.path} was written for a different job or input; "
+                             f"remove it to start over")
+        state = marker['state']
+        if self.errors is not None and 'error_state' in state:
+            self._restore_errors(state['error_state'])
+        return state
+
+    def _restore_errors(self, saved):
+        """
+        Restores the error records saved up to the checkpoint; records appended after it are dropped.
+        """
+        records = []
+        if saved['size']:
+            with open(self.errors_path, 'rb') as file:
+                records = [json.loads(line) for line in file.read(saved['size']).splitlines()]
+        self.errors.restore({'records': records, 'log_size': saved['log_size']})
+        self._errors_saved = saved['count']
+        self._errors_size = saved['size']
+
+    def _save_errors(self):
+        """
+        Appends the error records collected since the last checkpoint to the error file.
+
+        Returns:
+            dict: Error state for the marker
+        """
+        error_state = self.errors.state(since=self._errors_base + self._errors_saved)
+        with open(self.errors_path, 'ab') as file:
+            # Drop records of an interrupted run written after its last checkpoint
+            file.truncate(self._errors_size)
+            file.write(b''.join(json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+                                for entry in error_state['records']))
+            file.flush()
+            os.fsync(file.fileno())
+            self._errors_size = file.tell()
+        self._errors_saved = error_state['count'] - self._errors_base
+        return {'count': self._errors_saved, 'size': self._errors_size, 'log_size': error_state['log_size']}
+
+    def due(self, position):
+        """
+        Checks whether a checkpoint should be written after `position` input files.
+        """
+        return position % self.every == 0
+
+    def save(self, state):
+        """
+        Atomically replaces the marker, after saving the new error records of the job.
+
+        Args:
+            state: JSON-serializable job state
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.errors is not None:
+            state = dict(state, error_state=self._save_errors())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'job': self.job, 'input': self.input_fingerprint, 'state': state}, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """
+        Removes the marker and the error file after the job has completed.
+        """
+        for path in (self.path, self.errors_path):
+            if os.path.exists(path):
+                os.remove(path)
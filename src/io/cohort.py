@@ -0,0 +1,413 @@
+"""
+Bitmap-indexed cohort queries over the dataset tables.
+
+Selecting a cohort with pandas means building a boolean mask over every
+table involved and joining the results on id_card. `CohortIndex` keeps, for
+every value of the indexed columns (`sex`, `type_gosp`, the ward names of the
+ward_list table, the final table fields, ...), the set of cards that have it
+as a compressed bitmap. Filters combine these bitmaps with AND (`&`), OR
+(`|`), NOT (`~`) and difference (`-`), and only the rows of the final cohort
+are taken from a table:
+
+    cohort = CohortIndex.from_tables(patients=patients, ward_list=ward_list)
+    selected = (cohort.eq('patients.sex', 'Мужской')
+                & cohort.isin('ward_list.column_name', ['Кардиологическое отделение', 'Хирургическое отделение'])
+                & ~cohort.eq('patients.hospitalization_outcome', 'Умер'))
+    len(selected)                       # size of the cohort
+    cohort.rows(selected, 'patients')   # its rows of the patients table
+
+`Bitmap` follows the layout of Roaring bitmaps: the id_card space is cut into
+chunks of 2^16 cards, and each chunk holds its cards either as a sorted
+uint16 array (up to 4096 cards) or as a 65536-bit bitset (1024 uint64
+words), whichever is smaller. Set operations run chunk by chunk with NumPy,
+so their cost follows the size of the bitmaps, not of the tables.
+"""
+from src.utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Array containers hold up to this many cards; fuller chunks are bitsets
+ARRAY_LIMIT = 4096
+# Columns with more distinct values (or distinct values in more than half of the rows) are not indexed
+DEFAULT_MAX_VALUES = 1000
+
+_CHUNK_BITS = 16
+
+
+def _popcount(words):
+    return int(np.bitwise_count(words).sum()) if hasattr(np, 'bitwise_count') \
+        else int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def _to_bits(container):
+    """
+    Returns a container as a bitset.
+    """
+    if container.dtype == np.uint64:
+        return container
+    bits = np.zeros(1 << _CHUNK_BITS, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+
+def _from_bits(words):
+    """
+    Returns the smaller container for a bitset, None if it is empty.
+    """
+    cardinality = _popcount(words)
+    if not cardinality:
+        return None
+    if cardinality > ARRAY_LIMIT:
+        return words
+    return np.flatnonzero(np.unpackbits(words.view(np.uint8), bitorder='little')).astype(np.uint16)
+
+
+def _contains(words, low):
+    """
+    Tests which of the low cards are set in a bitset.
+    """
+    low = low.astype(np.int64)
+    return ((words[low >> 6] >> (low & 63).astype(np.uint64)) & np.uint64(1)).astype(bool)
+
+
+def _low_cards(container):
+    """
+    Returns the low 16 bits of the cards of a container, sorted.
+    """
+    if container.dtype == np.uint64:
+        return np.flatnonzero(np.unpackbits(container.view(np.uint8), bitorder='little'))
+    return container
+
+
+def _and(a, b):
+    if a.dtype == np.uint64 and b.dtype == np.uint64:
+        return _from_bits(a & b)
+    if a.dtype == np.uint64:
+        a, b = b, a
+    result = np.intersect1d(a, b, assume_unique=True) if b.dtype == np.uint16 else a[_contains(b, a)]
+    return result if len(result) else None
+
+
+def _or(a, b):
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        union = np.union1d(a, b)
+        return union if len(union) <= ARRAY_LIMIT else _to_bits(union)
+    return _to_bits(a) | _to_bits(b)
+
+
+def _andnot(a, b):
+    if a.dtype == np.uint16:
+        result = a[~(_contains(b, a) if b.dtype == np.uint64 else np.isin(a, b, assume_unique=True))]
+        return result if len(result) else None
+    return _from_bits(a & ~_to_bits(b))
+
+
+class Bitmap:
+    """
+    Compressed set of id_card values (see the module docstring).
+
+    Supports `&`, `|`, `-` (difference), `~` (complement within `universe`),
+    `len`, `in` and iteration over the sorted cards.
+
+    Args:
+        keys: Sorted chunk numbers (id_card >> 16) of the non-empty chunks
+        containers: Container of each chunk: sorted uint16 array or 1024 uint64 words
+        universe: Bitmap of all cards, the reference of `~` (None: `~` is not available)
+    """
+
+    def __init__(self, keys=(), containers=(), universe=None):
+        self.keys = list(keys)
+        self.containers = list(containers)
+        self.universe = universe
+
+    @classmethod
+    def from_cards(cls, cards, universe=None):
+        """
+        Builds a bitmap from id_card values.
+
+        Args:
+            cards: Array-like of non-negative id_card (any order, duplicates allowed)
+            universe: See the class
+
+        Returns:
+            Bitmap: The bitmap
+        """
+        return cls._from_sorted(np.sort(np.asarray(cards, dtype=np.int64)), universe)
+
+    @classmethod
+    def _from_sorted(cls, cards, universe=None):
+        """
+        Builds a bitmap from sorted id_card values (duplicates allowed).
+        """
+        if len(cards) and cards[0] < 0:
+            raise ValueError("id_card values must be non-negative")
+        cards = cards[np.append(True, cards[1:] != cards[:-1])] if len(cards) else cards
+        high = cards >> _CHUNK_BITS
+        starts = np.flatnonzero(np.append(True, high[1:] != high[:-1])) if len(cards) else np.empty(0, np.int64)
+        containers = []
+        for low in np.split((cards & 0xFFFF).astype(np.uint16), starts[1:]) if len(cards) else ():
+            containers.append(low if len(low) <= ARRAY_LIMIT else _to_bits(low))
+        return cls(high[starts].tolist(), containers, universe)
+
+    def _combine(self, other, operation, keep_left, keep_right):
+        """
+        Applies a container operation to the chunks of two bitmaps. Chunks present in
+        only one bitmap are kept as they are if keep_left/keep_right, dropped otherwise.
+        """
+        if not isinstance(other, Bitmap):
+            return NotImplemented
+        keys, containers = [], []
+        i = j = 0
+        left, right = self.keys, other.keys
+        while i < len(left) or j < len(right):
+            if j == len(right) or (i < len(left) and left[i] < right[j]):
+                if keep_left:
+                    keys.append(left[i])
+                    containers.append(self.containers[i])
+                i += 1
+            elif i == len(left) or right[j] < left[i]:
+                if keep_right:
+                    keys.append(right[j])
+                    containers.append(other.containers[j])
+                j += 1
+            else:
+                container = operation(self.containers[i], other.containers[j])
+                if container is not None:
+                    keys.append(left[i])
+                    containers.append(container)
+                i += 1
+                j += 1
+        return Bitmap(keys, containers, self.universe if self.universe is not None else other.universe)
+
+    def __and__(self, other):
+        return self._combine(other, _and, False, False)
+
+    def __or__(self, other):
+        return self._combine(other, _or, True, True)
+
+    def __sub__(self, other):
+        return self._combine(other, _andnot, True, False)
+
+    def __invert__(self):
+        if self.universe is None:
+            raise ValueError("The complement needs a universe; use a bitmap of a CohortIndex")
+        return self.universe - self
+
+    def __len__(self):
+        return sum(len(container) if container.dtype == np.uint16 else _popcount(container)
+                   for container in self.containers)
+
+    def __contains__(self, id_card):
+        key = int(id_card) >> _CHUNK_BITS
+        if key not in self.keys:
+            return False
+        container = self.containers[self.keys.index(key)]
+        low = np.array([int(id_card) & 0xFFFF])
+        if container.dtype == np.uint64:
+            return bool(_contains(container, low)[0])
+        return bool(np.isin(low, container)[0])
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def __repr__(self):
+        return f"Bitmap({len(self)} cards)"
+
+    def to_array(self):
+        """
+        Returns the cards of the bitmap.
+
+        Returns:
+            np.ndarray: Sorted int64 id_card values
+        """
+        if not self.keys:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([(key << _CHUNK_BITS) + _low_cards(container).astype(np.int64)
+                               for key, container in zip(self.keys, self.containers)])
+
+    def nbytes(self):
+        """
+        Returns the memory of the containers in bytes.
+        """
+        return sum(container.nbytes for container in self.containers)
+
+
+def _exploded(cards, values):
+    """
+    Returns (cards, values) with list values expanded to one entry per item.
+    """
+    lengths = np.fromiter((len(value) if type(value) in (list, tuple) else 1 for value in values),
+                          dtype=np.int64, count=len(values))
+    flat = np.empty(int(lengths.sum()), dtype=object)
+    flat[:] = [item for value in values for item in (value if type(value) in (list, tuple) else (value,))]
+    return np.repeat(cards, lengths), flat
+
+
+class CohortIndex:
+    """
+    Bitmaps of the values of table columns, keyed by id_card (see the module docstring).
+
+    Columns are named '<table>.<column>'. Besides the bitmaps, the index keeps
+    the tables it was built from, to materialize the rows of a cohort.
+    """
+
+    def __init__(self):
+        self.bitmaps = {}
+        self.tables = {}
+        self._row_index = {}
+        self.universe = Bitmap()
+
+    @classmethod
+    def from_tables(cls, max_values=DEFAULT_MAX_VALUES, **tables):
+        """
+        Builds an index over the categorical columns of tables.
+
+        Args:
+            max_values: See `add_table`
+            **tables: Tables with an id_card column by name, e.g. patients=..., ward_list=...
+
+        Returns:
+            CohortIndex: The index
+        """
+        index = cls()
+        for name, df in tables.items():
+            index.add_table(name, df, max_values=max_values)
+        return index
+
+    def add_table(self, name, df, columns=None, max_values=DEFAULT_MAX_VALUES):
+        """
+        Indexes the columns of a table and keeps the table for `rows`. Adding a
+        table again replaces it and its bitmaps.
+
+        Args:
+            name: Table name, the prefix of its column names
+            df: Table with an id_card column; list values (final table fields) count for every item
+            columns: Columns to index; by default the columns other than id_card, id, source_file
+                and *_id with at most max_values distinct values, and at most one per two rows
+                (so free text and raw tables are left out)
+            max_values: Distinct value limit of the default columns
+        """
+        cards = df['id_card'].to_numpy(dtype=np.int64)
+        self.bitmaps = {key: bitmap for key, bitmap in self.bitmaps.items() if not key.startswith(f'{name}.')}
+        self.tables[name] = df
+        order = np.argsort(cards, kind='stable')
+        self._row_index[name] = (cards[order], order)
+        self.universe = self.universe | Bitmap.from_cards(cards)
+
+        explicit = columns is not None
+        if not explicit:
+            columns = [column for column in df.columns
+                       if column not in ('id_card', 'id', 'source_file') and not column.endswith('_id')]
+        for column in columns:
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                column_cards, codes, uniques = cards, series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                values = series.to_numpy(dtype=object)
+                column_cards = cards
+                try:
+                    codes, uniques = pd.factorize(values)
+                except TypeError:
+                    # Lists of selected options count for every option; other unhashable values
+                    # (raw tables) cannot be indexed
+                    column_cards, values = _exploded(cards, values)
+                    try:
+                        codes, uniques = pd.factorize(values)
+                    except TypeError:
+                        if explicit:
+                            raise
+                        continue
+            if not explicit and (len(uniques) > max_values or len(uniques) > max(len(df) // 2, 1)):
+                continue
+            present = codes >= 0
+            self._index_column(f'{name}.{column}', column_cards[present], codes[present], uniques)
+        # The universe grew: point all bitmaps to the new one
+        for bitmaps in self.bitmaps.values():
+            for bitmap in bitmaps.values():
+                bitmap.universe = self.universe
+
+    def _index_column(self, key, cards, codes, uniques):
+        """
+        Builds the bitmaps of all values of a column.
+        """
+        order = np.lexsort((cards, codes))
+        codes, cards = codes[order], cards[order]
+        bounds = np.searchsorted(codes, np.arange(len(uniques) + 1))
+        self.bitmaps[key] = {value: Bitmap._from_sorted(cards[bounds[i]:bounds[i + 1]])
+                             for i, value in enumerate(uniques)}
+
+    def values(self, column):
+        """
+        Returns the indexed values of a column with their number of cards.
+
+        Args:
+            column: Column name, '<table>.<column>'
+
+        Returns:
+            dict: Value -> number of cards
+        """
+        return {value: len(bitmap) for value, bitmap in self._column(column).items()}
+
+    def _column(self, column):
+        bitmaps = self.bitmaps.get(column)
+        if bitmaps is None:
+            raise KeyError(f"Column {column!r} is not indexed; indexed columns: {sorted(self.bitmaps)}")
+        return bitmaps
+
+    def eq(self, column, value):
+        """
+        Returns the cards with a value in a column.
+
+        Args:
+            column: Column name, '<table>.<column>'
+            value: Value
+
+        Returns:
+            Bitmap: The cards (empty if the value does not occur)
+        """
+        bitmap = self._column(column).get(value)
+        return bitmap if bitmap is not None else Bitmap(universe=self.universe)
+
+    def isin(self, column, values):
+        """
+        Returns the cards with any of the values in a column.
+
+        Args:
+            column: Column name, '<table>.<column>'
+            values: Iterable of values
+
+        Returns:
+            Bitmap: The cards
+        """
+        result = Bitmap(universe=self.universe)
+        for value in values:
+            result = result | self.eq(column, value)
+        return result
+
+    def all(self):
+        """
+        Returns the cards of all indexed tables.
+        """
+        return self.universe
+
+    def rows(self, bitmap, table, columns=None):
+        """
+        Materializes the rows of a cohort from one of the indexed tables.
+
+        Args:
+            bitmap: Cohort
+            table: Table name
+            columns: Columns to return (all if None)
+
+        Returns:
+            pd.DataFrame: Rows of the table whose id_card is in the cohort, in table order
+        """
+        sorted_cards, order = self._row_index[table]
+        cards = bitmap.to_array()
+        left = np.searchsorted(sorted_cards, cards, side='left')
+        lengths = np.searchsorted(sorted_cards, cards, side='right') - left
+        within = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.sort(order[np.repeat(left, lengths) + within])
+        df = self.tables[table]
+        return df.iloc[rows] if columns is None else df.iloc[rows][list(columns)]
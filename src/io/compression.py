@@ -0,0 +1,107 @@
+"""
+Transparent compression based on file name suffixes.
+
+Files ending with `.gz`, `.xz` or `.bz2` are compressed and decompressed as
+streams while they are read or written; any other file is opened as is.
+"""
+import os
+import bz2
+import gzip
+import lzma
+
+COMPRESSORS = {
+    '.gz': gzip,
+    '.xz': lzma,
+    '.bz2': bz2,
+}
+
+
+def compression_suffix(path):
+    """
+    Returns the compression suffix of a path.
+
+    Args:
+        path: File path or name
+
+    Returns:
+        str: '.gz', '.xz', '.bz2' or '' for uncompressed files
+    """
+    ext = os.path.splitext(str(path))[1].lower()
+    return ext if ext in COMPRESSORS else ''
+
+
+def strip_compression_suffix(path):
+    """
+    Removes the compression suffix from a path.
+
+    Args:
+        path: File path or name
+
+    Returns:
+        str: Path without the compression suffix, e.g. 'a.json.gz' -> 'a.json'
+    """
+    suffix = compression_suffix(path)
+    return str(path)[:-len(suffix)] if suffix else str(path)
+
+
+def normalize_compression(compress):
+    """
+    Converts a `compress` argument to a compression suffix.
+
+    Args:
+        compress: None/False (no compression), True (gzip), or 'gz', 'xz', 'bz2'
+
+    Returns:
+        str: Compression suffix or ''
+    """
+    if not compress:
+        return ''
+    if compress is True:
+        return '.gz'
+    suffix = '.' + str(compress).lstrip('.').lower()
+    if suffix not in COMPRESSORS:
+        raise ValueError("compress must be one of: True, 'gz', 'xz', 'bz2'")
+    return suffix
+
+
+def open_file(path, mode='rb', encoding='utf-8'):
+    """
+    Opens a file, compressing or decompressing it on the fly if its suffix says so.
+
+    Args:
+        path: File path
+        mode: File mode ('rb', 'wb', 'r', 'w', 'ab', ...)
+        encoding: Encoding for text modes
+
+    Returns:
+        File-like object
+    """
+    module = COMPRESSORS.get(compression_suffix(path))
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    text = 't' in mode
+
+    if module is None:
+        return open(path, mode.replace('t', ''), encoding=encoding if text else None)
+    return module.open(path, mode, encoding=encoding if text else None)
+
+
+def wrap_stream(fileobj, name):
+    """
+    Wraps a binary stream with a decompressor chosen by the member name.
+
+    Args:
+        fileobj: Binary file-like object (e.g. an archive member)
+        name: Name used to detect the compression
+
+    Returns:
+        File-like object with decompressed content
+    """
+    suffix = compression_suffix(name)
+    if suffix == '.gz':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if suffix == '.xz':
+        return lzma.LZMAFile(fileobj, mode='rb')
+    if suffix == '.bz2':
+        return bz2.BZ2File(fileobj, mode='rb')
+    return fileobj
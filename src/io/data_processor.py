@@ -2,110 +2,217 @@
 Module for data processing and saving.
 """
 import os
-import json
-from tqdm import tqdm
+from functools import partial
+from src.parsers.base_parser import get_document_id
 from src.parsers.patient_parser import get_sex, get_age, get_id, get_amnez_d, get_amnez_life, get_condition, parse_conditions_as_key_value
 from src.parsers.hosp_parser import get_gosp_info, get_diagnosis
 from src.parsers.ward_parser import get_ward_table, compute_full_wards
 from src.parsers.final_parser import get_final_table1, get_final_table2
-from src.utils.table_utils import safe_parse_table, save_table_as_dict
+from src.parsers.layout import document_layout
+from src.utils.table_utils import parse_table_as_dict, table_cache, enable_table_cache
+from src.io.storage import open_source, open_sink, existing_names
+from src.io.checkpoint import Checkpoint, checkpoint_path, fingerprint, DEFAULT_CHECKPOINT_EVERY
+from src.io.compression import open_file, strip_compression_suffix
+from src.io.backends import json_load, json_dump_pretty
+from src.utils.errors import ErrorCollector
+from src.utils.parallel import process_documents
+from src.utils.profiling import profiling, timed, count, call
+from src.utils.lazy import lazy_function
 
+tqdm = lazy_function('tqdm', 'tqdm')
 
-def modify_json(in_path, out_path):
+
+def extract_features(data):
     """
-    Modifies a JSON file by extracting structured data from it.
+    Extracts structured data from a document.
+    Each parser call is timed as parser.<name> when profiling is active.
     
     Args:
-        in_path: Path to the input JSON file
-        out_path: Path where the result will be saved
+        data: Document JSON data
         
     Returns:
-        bool: True if successful, False otherwise
+        dict: Extracted features
     """
-    try:
-        with open(in_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-
-        result = {}
+    result = {}
 
+    # The parsers share one layout resolution (see src.parsers.layout)
+    with document_layout(data):
         # Extract patient data
-        result['sex'] = get_sex(data)
-        result['age'] = get_age(data)
-        result['id'] = get_id(data)
-        result['anamnez_d'] = get_amnez_d(data)
-        result['anamnez_l'] = get_amnez_life(data)
-        result['conditions'] = get_condition(data)
+        result['sex'] = call('parser.get_sex', get_sex, data)
+        result['age'] = call('parser.get_age', get_age, data)
+        result['id'] = call('parser.get_id', get_id, data)
+        result['document_id'] = call('parser.get_document_id', get_document_id, data)
+        result['anamnez_d'] = call('parser.get_amnez_d', get_amnez_d, data)
+        result['anamnez_l'] = call('parser.get_amnez_life', get_amnez_life, data)
+        result['conditions'] = call('parser.get_condition', get_condition, data)
 
         # Extract hospitalization data
-        table_gosp, type_gosp, way_gosp = get_gosp_info(data, type='raw')
+        table_gosp, type_gosp, way_gosp = call('parser.get_gosp_info', get_gosp_info, data, type='raw')
         result['table_gosp'] = table_gosp
         result['type_gosp'] = type_gosp
         result['way_gosp'] = way_gosp
-        result['diagnosis'] = get_diagnosis(data, type='raw')
+        result['diagnosis'] = call('parser.get_diagnosis', get_diagnosis, data, type='raw')
 
         # Extract department data
-        result['ward_table'] = get_ward_table(data, type='raw')
-        result['ward_list'] = compute_full_wards(data)
+        result['ward_table'] = call('parser.get_ward_table', get_ward_table, data, type='raw')
+        result['ward_list'] = call('parser.compute_full_wards', compute_full_wards, data)
 
         # Extract final tables
-        result['final_table1'] = get_final_table1(data, type='raw')
-        result['final_table2'] = get_final_table2(data, type='raw')
+        result['final_table1'] = call('parser.get_final_table1', get_final_table1, data, type='raw')
+        result['final_table2'] = call('parser.get_final_table2', get_final_table2, data, type='raw')
 
-        with open(out_path, "w", encoding='utf-8') as file:
-            json.dump(result, file, ensure_ascii=False, indent=4)
+    return result
+
+def modify_json(in_path, out_path, writer=None, errors=None):
+    """
+    Modifies a JSON file by extracting structured data from it.
+    Paths ending with `.gz`, `.xz` or `.bz2` are decompressed/compressed on the fly.
+    
+    Args:
+        in_path: Path to the input JSON file
+        out_path: Path where the result will be saved
+        writer: Optional sink (e.g. a PackWriter or JsonlShardWriter). If given, the result is written
+            to it under the file name of `out_path` instead of a separate file
+        errors: ErrorCollector the failure is recorded in (stage 'extract_features'; a new one if None)
+        
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    errors = errors if errors is not None else ErrorCollector()
+    try:
+        with open_file(in_path, 'rb') as file:
+            data = json_load(file)
+
+        result = extract_features(data)
+
+        if writer is not None:
+            writer.write(strip_compression_suffix(os.path.basename(out_path)), result)
+        else:
+            with open_file(out_path, "w") as file:
+                json_dump_pretty(result, file)
         
         return True
     except Exception as e:
-        print(f"Error processing file {in_path}: {str(e)}")
+        errors.record(in_path, 'extract_features', e)
         return False
 
-def save_features(input_folder, output_folder):
+def _extract_document(source, name):
+    """
+    Extracts the features of one document of a source (per-document step of
+    `save_features`, also run in worker processes).
+    """
+    data = source.load_json(name)
+    with timed('stage.extract_features'):
+        return extract_features(data)
+
+def save_features(input_folder, output_folder, output_format='json', shard_size=10000, compress=False,
+                  profile=False, profile_sample=None, error_log=None, checkpoint_every=None, resume=False,
+                  workers=1, io_concurrency=None):
     """
     Processes all JSON files in the specified directory and saves the extracted data.
-    Handles exceptions for individual files and prints processing statistics.
-    Only error messages are displayed during processing.
+    Errors of individual files are collected (see src.utils.errors) and summarized
+    by cause after processing, together with the processing statistics.
     Uses tqdm for progress visualization.
+
+    The records are written as `file_{N}.json`, N being the position of the input
+    among the sorted input names, so the numbering (and the id_card of the tables)
+    is the same for every input format.
     
     Args:
-        input_folder: Input directory with JSON files
-        output_folder: Output directory for processed data
+        input_folder: Input directory, pack or zip/tar archive with JSON files
+        output_folder: Output directory for processed data, or a `.pack` path
+        output_format: 'json' - one file per document, 'jsonl' - JSON Lines shards
+        shard_size: Records per shard for the 'jsonl' format
+        compress: Output compression: None, True (gzip), 'gz', 'xz' or 'bz2'
+        profile: Collect stage, parser and I/O timers and counters (see src.utils.profiling)
+        profile_sample: Position of one file in the processing order to run under
+            cProfile and tracemalloc (requires profile=True)
+        error_log: Optional JSON Lines file that error records are appended to
+        checkpoint_every: Write a checkpoint (see src.io.checkpoint) after every N input files.
+            Defaults to 1000 if resume=True, otherwise no checkpoints are written
+        resume: Continue from the last checkpoint in the output, if there is one
+        workers: Number of worker processes for feature extraction (see src.utils.parallel)
+        io_concurrency: Prefetch up to this many file reads asynchronously, overlapping reads and
+            writes with feature extraction (see src.utils.prefetch). For slow network filesystems;
+            serial runs only
         
     Returns:
-        dict: Statistics of processing (total, success, errors)
+        dict: Statistics of processing (total, success, errors, error_causes - errors
+            aggregated by cause, see src.utils.errors), plus 'profile' if profiling
     """
-    # Make sure the output folder exists
-    os.makedirs(output_folder, exist_ok=True)
+    with profiling(enabled=profile) as profiler, ErrorCollector(error_log) as errors, \
+            open_source(input_folder) as source:
+        # Records are numbered by their position among the sorted names, whatever the input format;
+        # sources that are only cheap to read in storage order (JSON Lines shards, tar archives)
+        # are processed in that order
+        files = sorted(source.list_names('.json'))
+        numbers = {name: number for number, name in enumerate(files, start=1)}
+        if getattr(source, 'sequential_reads', False):
+            files = source.list_names('.json')
+        
+        # Counters for statistics
+        total_files = len(files)
+        success_count = 0
+        error_count = 0
+        start = 0
 
-    # Get a sorted list of files in the input folder
-    files = sorted(f for f in os.listdir(input_folder) if f.endswith('.json'))
-    
-    # Counters for statistics
-    total_files = len(files)
-    success_count = 0
-    error_count = 0
-
-    # Process each file with progress bar
-    for idx, file_name in enumerate(tqdm(files, desc="Processing JSON files", unit="file"), start=1):
-        in_path = os.path.join(input_folder, file_name)
-        out_path = os.path.join(output_folder, f"file_{idx}.json")
-
-        # Call the modify_json function with appropriate paths
-        if modify_json(in_path, out_path):
-            success_count += 1
-        else:
-            error_count += 1
+        checkpoint = None
+        state = None
+        if checkpoint_every or resume:
+            checkpoint = Checkpoint(checkpoint_path(output_folder, 'save_features'), 'save_features',
+                                    fingerprint(files), checkpoint_every or DEFAULT_CHECKPOINT_EVERY, errors)
+            state = checkpoint.load() if resume else None
+        if state is not None:
+            start = state['position']
+            success_count = state['success']
+            error_count = state['errors']
+            print(f"Resuming after {start} of {total_files} files")
+
+        with open_sink(output_folder, output_format, shard_size, compress,
+                       resume_state=state['sink'] if state is not None else None) as sink:
+            results = process_documents(_extract_document, source, input_folder, files[start:], workers,
+                                        sample=profile_sample - start if profile_sample is not None else None,
+                                        io_concurrency=io_concurrency)
+            # Process each file with progress bar
+            progress = tqdm(results, desc="Processing JSON files", unit="file", initial=start, total=total_files)
+            for idx, (file_name, result, error) in enumerate(progress, start=start + 1):
+                try:
+                    if error is not None:
+                        raise error
+                    sink.write(f"file_{numbers[file_name]}.json", result)
+                    count('documents')
+                    success_count += 1
+                except Exception as e:
+                    errors.record(file_name, 'extract_features', e)
+                    error_count += 1
+
+                if checkpoint is not None and checkpoint.due(idx) and idx < total_files:
+                    checkpoint.save({
+                        'position': idx,
+                        'success': success_count,
+                        'errors': error_count,
+                        'sink': sink.sync(),
+                    })
+
+        if checkpoint is not None:
+            checkpoint.clear()
     
     # Print statistics
     print(f"\nProcessing complete!")
     print(f"Total files: {total_files}")
     print(f"Successfully processed: {success_count}")
     print(f"Errors: {error_count}")
+    errors.print_summary()
     
-    return {
+    stats = {
         "total": total_files,
         "success": success_count,
-        "errors": error_count
+        "errors": error_count,
+        "error_causes": errors.summary()
     }
+    if profiler is not None:
+        stats["profile"] = profiler.as_dict()
+    return stats
 
 def process_data_to_structured_format(data):
     """
@@ -117,9 +224,15 @@ def process_data_to_structured_format(data):
     Returns:
         dict: Structured data format
     """
+    def parse(key):
+        if not data.get(key):
+            return None
+        return call('parser.safe_parse_table', parse_table_as_dict, data[key])
+
     # Convert data to a more convenient format
     processed_json = {
         "id": data.get("id"),
+        "document_id": data.get("document_id"),
         "sex": data.get("sex"),
         "birth_date": data.get("age"),
         "type_gosp": data.get("type_gosp"),
@@ -129,86 +242,164 @@ def process_data_to_structured_format(data):
             "life_history": data.get("anamnez_l")
         },
         "ward_list": data.get("ward_list"),
-        "conditions": parse_conditions_as_key_value(data.get("conditions", [])),
+        "conditions": call('parser.parse_conditions_as_key_value', parse_conditions_as_key_value, data.get("conditions", [])),
         "tables": {
-            "table_gosp": save_table_as_dict(safe_parse_table(data["table_gosp"])) if data.get("table_gosp") else None,
-            "diagnosis": save_table_as_dict(safe_parse_table(data["diagnosis"])) if data.get("diagnosis") else None,
-            "ward_table": save_table_as_dict(safe_parse_table(data["ward_table"])) if data.get("ward_table") else None,
-            "final_table1": save_table_as_dict(safe_parse_table(data["final_table1"])) if data.get("final_table1") else None,
-            "final_table2": save_table_as_dict(safe_parse_table(data["final_table2"])) if data.get("final_table2") else None,
+            "table_gosp": parse("table_gosp"),
+            "diagnosis": parse("diagnosis"),
+            "ward_table": parse("ward_table"),
+            "final_table1": parse("final_table1"),
+            "final_table2": parse("final_table2"),
         }
     }
     
     return processed_json
 
-def process_file_to_structured_format(in_path, out_path):
+def process_file_to_structured_format(in_path, out_path, writer=None, errors=None):
     """
     Processes a file by converting it to a structured format.
+    Paths ending with `.gz`, `.xz` or `.bz2` are decompressed/compressed on the fly.
     
     Args:
         in_path: Path to the input JSON file
         out_path: Path to save the processed file
+        writer: Optional sink (e.g. a PackWriter or JsonlShardWriter). If given, the result is written
+            to it under the file name of `out_path` instead of a separate file
+        errors: ErrorCollector the failure is recorded in (stage 'structured_format'; a new one if None)
+
+    Returns:
+        bool: True if successful, False otherwise
     """
+    errors = errors if errors is not None else ErrorCollector()
     try:
         # Load data from file
-        with open(in_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        with open_file(in_path, 'rb') as file:
+            data = json_load(file)
         
         # Apply data processing function
         processed_data = process_data_to_structured_format(data)
         
         # Save result to file
-        with open(out_path, 'w', encoding='utf-8') as file:
-            json.dump(processed_data, file, ensure_ascii=False, indent=4)
+        if writer is not None:
+            writer.write(strip_compression_suffix(os.path.basename(out_path)), processed_data)
+        else:
+            with open_file(out_path, 'w') as file:
+                json_dump_pretty(processed_data, file)
             
         return True
     except Exception as e:
-        print(f"Error processing file {in_path}: {str(e)}")
+        errors.record(in_path, 'structured_format', e)
         return False
         
-def process_folder_to_structured_format(input_folder, output_folder):
+def _structure_document(source, name, table_cache_size=None):
+    """
+    Converts one feature document of a source to the structured format (per-document
+    step of `process_folder_to_structured_format`, also run in worker processes).
+
+    Returns:
+        tuple: (structured record, (process id, TableCache.info() of the process) or None if caching is off)
+    """
+    cache = None
+    if table_cache_size:
+        cache = enable_table_cache(table_cache_size)  # Keeps the cache of the calling process in serial runs
+    data = source.load_json(name)
+    with timed('stage.structured_format'):
+        record = process_data_to_structured_format(data)
+    return record, (os.getpid(), cache.info()) if cache is not None else None
+
+def _structured_name(file_name):
+    return strip_compression_suffix(os.path.basename(file_name))
+
+def process_folder_to_structured_format(input_folder, output_folder, output_format='json', shard_size=10000,
+                                        compress=False, profile=False, profile_sample=None, error_log=None,
+                                        workers=1, incremental=False, table_cache_size=None, io_concurrency=None):
     """
     Processes all files in a folder, converting them to structured format.
-    Handles exceptions for individual files and prints processing statistics.
-    Only error messages are displayed during processing.
+    Errors of individual files are collected (see src.utils.errors) and summarized
+    by cause after processing, together with the processing statistics.
     Uses tqdm for progress visualization.
     
     Args:
-        input_folder: Input directory with JSON files
-        output_folder: Output directory for processed files
+        input_folder: Input directory, pack or zip/tar archive with JSON files
+        output_folder: Output directory for processed files, or a `.pack` path
+        output_format: 'json' - one file per document, 'jsonl' - JSON Lines shards
+        shard_size: Records per shard for the 'jsonl' format
+        compress: Output compression: None, True (gzip), 'gz', 'xz' or 'bz2'
+        profile: Collect stage, parser and I/O timers and counters (see src.utils.profiling)
+        profile_sample: Position of one file in the processing order to run under
+            cProfile and tracemalloc (requires profile=True)
+        error_log: Optional JSON Lines file that error records are appended to
+        workers: Number of worker processes for the conversion (see src.utils.parallel)
+        incremental: Skip files whose structured output already exists
+        table_cache_size: Cache up to this many parsed tables by subtree hash, so tables repeated
+            across documents are parsed once (see src.utils.table_utils.TableCache); off if None.
+            With workers > 1 every worker keeps its own cache, and the statistics are summed
+        io_concurrency: Prefetch up to this many file reads asynchronously, overlapping reads and
+            writes with the conversion (see src.utils.prefetch). For slow network filesystems;
+            serial runs only
         
     Returns:
-        dict: Statistics of processing (total, success, errors)
+        dict: Statistics of processing (total, success, errors, skipped, error_causes - errors
+            aggregated by cause, see src.utils.errors), plus 'profile' if profiling and
+            'table_cache' (hits, misses, size and maxsize, summed over the caches of all processes,
+            and their number as caches) if the cache is on
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_folder, exist_ok=True)
-    
-    # Get list of files to process
-    files = [f for f in os.listdir(input_folder) if f.endswith('.json')]
-    
-    # Counters for statistics
-    total_files = len(files)
-    success_count = 0
-    error_count = 0
-    
-    # Process each file with progress bar
-    for file_name in tqdm(files, desc="Converting to structured format", unit="file"):
-        in_path = os.path.join(input_folder, file_name)
-        out_path = os.path.join(output_folder, file_name)
+    with profiling(enabled=profile) as profiler, ErrorCollector(error_log) as errors, \
+            open_source(input_folder) as source, table_cache(table_cache_size):
+        # Get list of files to process
+        files = source.list_names('.json')
         
-        if process_file_to_structured_format(in_path, out_path):
-            success_count += 1
-        else:
-            error_count += 1
+        # Counters for statistics
+        total_files = len(files)
+        success_count = 0
+        error_count = 0
+
+        if incremental:
+            done = existing_names(output_folder, output_format)
+            files = [f for f in files if _structured_name(f) not in done]
+        skipped_count = total_files - len(files)
+        
+        # Latest cache statistics of every process that converted documents
+        caches = {}
+        with open_sink(output_folder, output_format, shard_size, compress) as sink:
+            structure = partial(_structure_document, table_cache_size=table_cache_size)
+            results = process_documents(structure, source, input_folder, files, workers, sample=profile_sample,
+                                        io_concurrency=io_concurrency)
+            # Process each file with progress bar
+            for file_name, processed_data, error in tqdm(results, total=len(files),
+                                                         desc="Converting to structured format", unit="file"):
+                try:
+                    if error is not None:
+                        raise error
+                    processed_data, cache_info = processed_data
+                    if cache_info is not None:
+                        caches[cache_info[0]] = cache_info[1]
+                    sink.write(_structured_name(file_name), processed_data)
+                    count('documents')
+                    success_count += 1
+                except Exception as e:
+                    errors.record(file_name, 'structured_format', e)
+                    error_count += 1
     
     # Print statistics
     print(f"\nProcessing complete!")
     print(f"Total files: {total_files}")
     print(f"Successfully processed: {success_count}")
+    if skipped_count:
+        print(f"Skipped (already converted): {skipped_count}")
     print(f"Errors: {error_count}")
+    errors.print_summary()
     
-    return {
+    stats = {
         "total": total_files,
         "success": success_count,
-        "errors": error_count
-    } 
\ No newline at end of file
+        "errors": error_count,
+        "skipped": skipped_count,
+        "error_causes": errors.summary()
+    }
+    if table_cache_size:
+        stats["table_cache"] = {key: sum(info[key] for info in caches.values())
+                                for key in ('hits', 'misses', 'size', 'maxsize')}
+        stats["table_cache"]["caches"] = len(caches)
+    if profiler is not None:
+        stats["profile"] = profiler.as_dict()
+    return stats 
\ No newline at end of file
@@ -1,10 +1,22 @@
 import json
 import os
-import pandas as pd
-import numpy as np
 import re
 import ast
-from tqdm import tqdm
+from src.utils.lazy import lazy_import, lazy_function
+from src.io.storage import open_source
+from src.io.selective import load_fields
+from src.io.table_types import type_patients_table
+from src.io.checkpoint import Checkpoint, checkpoint_path, fingerprint, DEFAULT_CHECKPOINT_EVERY
+from src.utils.errors import ErrorCollector
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+tqdm = lazy_function('tqdm', 'tqdm')
+
+# Fields of the structured records read by the table builders (see src.io.selective)
+PATIENT_FIELDS = ('id', 'document_id', 'sex', 'birth_date', 'type_gosp', 'way_gosp', 'anamnez', 'conditions',
+                  'tables.final_table1')
+WARD_LIST_FIELDS = ('ward_list',)
 
 def extract_number(filename):
     """
@@ -56,164 +68,264 @@ def filter_dataframe_by_patterns(df, column, patterns, operator='AND'):
     # Split the DataFrame based on the mask and return both parts
     return df[mask], df[~mask]
 
-def create_patients_table(folder_path, start_id=0):
+def patient_row(data, id_card, file_name):
+    """
+    Builds the row of the patients table for one structured record
+    
+    Parameters:
+    data (dict): Structured record (only the PATIENT_FIELDS are read)
+    id_card (int): ID of the patient card
+    file_name (str): Name of the record
+    
+    Returns:
+    dict: Row of the patients table
+    """
+    patient_info = {
+        'id_card': id_card,
+        'patient_id': data.get('id'),
+        'document_id': data.get('document_id'),
+        'source_file': file_name,
+        'sex': data.get('sex'),
+        'birth_date': data.get('birth_date'),
+        'type_gosp': data.get('type_gosp'),
+        'way_gosp': data.get('way_gosp')
+    }
+    
+    # Extract nested information
+    if 'anamnez' in data:
+        patient_info['disease_history'] = data['anamnez'].get('disease_history')
+        patient_info['life_history'] = data['anamnez'].get('life_history')
+    
+    if 'conditions' in data:
+        patient_info['condition_state'] = data['conditions'].get('Состояние')
+        patient_info['condition_complaints'] = data['conditions'].get('Жалобы')
+        patient_info['objective_status'] = data['conditions'].get('Объективный статус')
+    
+    if 'tables' in data and 'final_table1' in data['tables']:
+        patient_info['disease_character'] = data['tables']['final_table1'].get('Характер основного заболевания')
+        patient_info['hospitalization_outcome'] = data['tables']['final_table1'].get('Исход госпитализации')
+        patient_info['treatment_result'] = data['tables']['final_table1'].get('Результат обращения')
+        patient_info['cancer_suspicion'] = data['tables']['final_table1'].get('Признак подозрения на злокачественное новообразование')
+        patient_info['individual_post'] = data['tables']['final_table1'].get('Признак развертывания индивидуального поста')
+    
+    return patient_info
+
+def ward_list_rows(data, id_card, file_name, start_entry_id=0):
+    """
+    Builds the rows of the ward_list table for one structured record
+    
+    Parameters:
+    data (dict): Structured record (only the WARD_LIST_FIELDS are read)
+    id_card (int): ID of the patient card
+    file_name (str): Name of the record
+    start_entry_id (int): ID of the first entry
+    
+    Returns:
+    list: Rows of the ward_list table, one per non-NaN value
+    """
+    rows = []
+    if 'ward_list' in data:
+        ward_list_df = pd.DataFrame.from_dict(data['ward_list'])
+        
+        # Process each non-NaN value in ward_list
+        for col in ward_list_df.columns:
+            # Iterate over rows with index
+            for row_idx, value in ward_list_df[col].items():
+                if pd.notna(value):
+                    rows.append({
+                        'id': start_entry_id + len(rows),
+                        'id_card': id_card,
+                        'source_file': file_name,
+                        'column_name': col,
+                        'row_index': row_idx,  # Use the actual DataFrame row index
+                        'value': value
+                    })
+    return rows
+
+def create_patients_table(folder_path, start_id=0, errors=None, exclude=None, typed=False, categories=None):
     """
     Creates the main patients table from JSON files in a folder
     
     Parameters:
-    folder_path (str): Path to the folder with JSON files
+    folder_path (str): Path to the folder (or pack) with JSON files
     start_id (int): Starting ID for patients
+    errors (ErrorCollector): Collector for errors of individual files (a new one if None).
+                             Errors aggregated by cause are also stored in the result's attrs['errors']
+    exclude (collection): Names of files to leave out, e.g. duplicates found by src.io.dedup.find_duplicates.
+                          The other files keep the id_card of their position, so tables stay joinable
+    typed (bool): Return the typed, memory-compact table: birth_date as datetime64, low-cardinality
+                  fields as categoricals, interned free text (see src.io.table_types); the memory
+                  before and after is printed and stored in attrs['memory']
+    categories (SharedCategories): Category dictionaries shared with other typed tables
+                                   (new dictionaries if None)
     
     Returns:
     pd.DataFrame: DataFrame with patient information
     """
     patients_data = []
-    json_files = sorted(
-        [f for f in os.listdir(folder_path) if f.endswith('.json')],
-        key=extract_number
-    )
+    errors = errors if errors is not None else ErrorCollector()
+    source = open_source(folder_path)
+    json_files = sorted(source.list_names('.json'), key=extract_number)
     
+    exclude = exclude or ()
     for i, file_name in enumerate(tqdm(json_files, desc="Processing patients")):
         id_card = start_id + i
-        file_path = os.path.join(folder_path, file_name)
+        if file_name in exclude:
+            continue
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            patient_info = {
-                'id_card': id_card,
-                'patient_id': data.get('id'),
-                'source_file': file_name,
-                'sex': data.get('sex'),
-                'birth_date': data.get('birth_date'),
-                'type_gosp': data.get('type_gosp'),
-                'way_gosp': data.get('way_gosp')
-            }
-            
-            # Extract nested information
-            if 'anamnez' in data:
-                patient_info['disease_history'] = data['anamnez'].get('disease_history')
-                patient_info['life_history'] = data['anamnez'].get('life_history')
-            
-            if 'conditions' in data:
-                patient_info['condition_state'] = data['conditions'].get('Состояние')
-                patient_info['condition_complaints'] = data['conditions'].get('Жалобы')
-                patient_info['objective_status'] = data['conditions'].get('Объективный статус')
-            
-            if 'tables' in data and 'final_table1' in data['tables']:
-                patient_info['disease_character'] = data['tables']['final_table1'].get('Характер основного заболевания')
-                patient_info['hospitalization_outcome'] = data['tables']['final_table1'].get('Исход госпитализации')
-                patient_info['treatment_result'] = data['tables']['final_table1'].get('Результат обращения')
-                patient_info['cancer_suspicion'] = data['tables']['final_table1'].get('Признак подозрения на злокачественное новообразование')
-                patient_info['individual_post'] = data['tables']['final_table1'].get('Признак развертывания индивидуального поста')
-            
-            patients_data.append(patient_info)
-            
+            data = load_fields(source, file_name, PATIENT_FIELDS)
+            patients_data.append(patient_row(data, id_card, file_name))
         except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+            errors.record(file_name, 'patients_table', e)
     
-    return pd.DataFrame(patients_data)
+    source.close()
+    errors.print_summary()
+    result_df = pd.DataFrame(patients_data)
+    if typed:
+        result_df = type_patients_table(result_df, categories)
+    result_df.attrs['errors'] = errors.summary()
+    return result_df
 
-def create_ward_list_table(folder_path, start_entry_id=0, start_card_id=0):
+def create_ward_list_table(folder_path, start_entry_id=0, start_card_id=0, errors=None, exclude=None):
     """
     Creates the ward_list table from JSON files in a folder
     
     Parameters:
-    folder_path (str): Path to the folder with JSON files
+    folder_path (str): Path to the folder (or pack) with JSON files
     start_entry_id (int): Starting ID for entries
     start_card_id (int): Starting ID for patients
+    errors (ErrorCollector): Collector for errors of individual files (a new one if None).
+                             Errors aggregated by cause are also stored in the result's attrs['errors']
+    exclude (collection): Names of files to leave out, e.g. duplicates found by src.io.dedup.find_duplicates.
+                          The other files keep the id_card of their position, so tables stay joinable
     
     Returns:
     pd.DataFrame: DataFrame with ward_list information
     """
     ward_list_data = []
-    json_files = sorted(
-        [f for f in os.listdir(folder_path) if f.endswith('.json')],
-        key=extract_number
-    )
+    errors = errors if errors is not None else ErrorCollector()
+    source = open_source(folder_path)
+    json_files = sorted(source.list_names('.json'), key=extract_number)
     
+    exclude = exclude or ()
     entry_id = start_entry_id
     for i, file_name in enumerate(tqdm(json_files, desc="Processing ward_list")):
         id_card = start_card_id + i
-        file_path = os.path.join(folder_path, file_name)
+        if file_name in exclude:
+            continue
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if 'ward_list' in data:
-                ward_list_df = pd.DataFrame.from_dict(data['ward_list'])
-                
-                # Process each non-NaN value in ward_list
-                for col in ward_list_df.columns:
-                    # Iterate over rows with index
-                    for row_idx, value in ward_list_df[col].items():
-                        if pd.notna(value):
-                            ward_list_data.append({
-                                'id': entry_id,
-                                'id_card': id_card,
-                                'source_file': file_name,
-                                'column_name': col,
-                                'row_index': row_idx,  # Use the actual DataFrame row index
-                                'value': value
-                            })
-                            entry_id += 1
-            
+            data = load_fields(source, file_name, WARD_LIST_FIELDS)
+            rows = ward_list_rows(data, id_card, file_name, entry_id)
+            ward_list_data.extend(rows)
+            entry_id += len(rows)
         except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+            errors.record(file_name, 'ward_list_table', e)
     
-    return pd.DataFrame(ward_list_data)
+    source.close()
+    errors.print_summary()
+    result_df = pd.DataFrame(ward_list_data)
+    result_df.attrs['errors'] = errors.summary()
+    return result_df
 
-def create_table_generic(folder_path, table_accessor, start_table_id=0, start_card_id=0, id_column_name='table_id'):
+def create_table_generic(folder_path, table_accessor, start_table_id=0, start_card_id=0, id_column_name='table_id',
+                         errors=None, checkpoint_dir=None, checkpoint_every=None, resume=False, exclude=None,
+                         fields=None):
     """
     Universal function for creating tables from JSON files
     
     Parameters:
-    folder_path (str): Path to the folder with JSON files
+    folder_path (str): Path to the folder (or pack) with JSON files
     table_accessor (str): Code to access the table (e.g., "pd.DataFrame.from_dict(data['tables']['table_gosp'])")
     start_table_id (int): Starting ID for the table
     start_card_id (int): Starting ID for patients
     id_column_name (str): Column name for the table ID
+    errors (ErrorCollector): Collector for errors of individual files (a new one if None).
+                             Errors aggregated by cause are also stored in the result's attrs['errors']
+    checkpoint_dir (str): Directory for checkpoints; the tables collected so far are flushed
+                          there as pickled parts at every checkpoint (see src.io.checkpoint)
+    checkpoint_every (int): Write a checkpoint after every N files (default 1000)
+    resume (bool): Continue from the last checkpoint in checkpoint_dir, if there is one
+    exclude (collection): Names of files to leave out, e.g. duplicates found by src.io.dedup.find_duplicates.
+                          The other files keep the id_card of their position, so tables stay joinable
+    fields (list): Paths the accessor reads, e.g. ['tables.table_gosp']; only these are loaded
+                   from each record (see src.io.selective). None loads whole records
     
     Returns:
     pd.DataFrame: DataFrame with combined tables
     """
+    errors = errors if errors is not None else ErrorCollector()
     tables = []
-    json_files = sorted(
-        [f for f in os.listdir(folder_path) if f.endswith('.json')],
-        key=extract_number
-    )
+    source = open_source(folder_path)
+    json_files = sorted(source.list_names('.json'), key=extract_number)
     
+    exclude = exclude or ()
     table_id = start_table_id
-    for i, file_name in enumerate(tqdm(json_files, desc=f"Processing {table_accessor}")):
+    start = 0
+    parts = []
+    checkpoint = None
+    if checkpoint_dir is not None:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoint = Checkpoint(checkpoint_path(checkpoint_dir, 'create_table_generic'), 'create_table_generic',
+                                fingerprint([table_accessor, str(start_table_id), str(start_card_id)] + json_files
+                                            + sorted(exclude)),
+                                checkpoint_every or DEFAULT_CHECKPOINT_EVERY, errors)
+        state = checkpoint.load() if resume else None
+        if state is not None:
+            start = state['position']
+            table_id = state['table_id']
+            parts = state['parts']
+            print(f"Resuming after {start} of {len(json_files)} files")
+    elif resume or checkpoint_every:
+        raise ValueError("checkpoint_dir is required for checkpoints")
+    
+    progress = tqdm(json_files[start:], desc=f"Processing {table_accessor}", initial=start, total=len(json_files))
+    for i, file_name in enumerate(progress, start=start):
         id_card = start_card_id + i
-        file_path = os.path.join(folder_path, file_name)
         
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        if file_name not in exclude:
+            try:
+                data = load_fields(source, file_name, fields)
             
-            # Get table data using eval
-            locals_dict = {'pd': pd, 'data': data}
-            table_df = eval(table_accessor, globals(), locals_dict)
+                # Get table data using eval
+                locals_dict = {'pd': pd, 'data': data}
+                table_df = eval(table_accessor, globals(), locals_dict)
             
-            # If the table is not empty, add IDs
-            if not table_df.empty:
-                table_df['id_card'] = id_card
-                table_df[id_column_name] = table_id
-                table_df['source_file'] = file_name
+                # If the table is not empty, add IDs
+                if not table_df.empty:
+                    table_df['id_card'] = id_card
+                    table_df[id_column_name] = table_id
+                    table_df['source_file'] = file_name
                 
-                tables.append(table_df)
-                table_id += 1
+                    tables.append(table_df)
+                    table_id += 1
             
-        except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+            except Exception as e:
+                errors.record(file_name, 'table_generic', e)
+        
+        # Flush the tables collected since the last checkpoint as a new part
+        if checkpoint is not None and checkpoint.due(i + 1) and i + 1 < len(json_files):
+            if tables:
+                part = f"part-{len(parts):05d}.pkl"
+                pd.concat(tables, ignore_index=True).to_pickle(os.path.join(checkpoint_dir, part))
+                parts.append(part)
+                tables = []
+            checkpoint.save({'position': i + 1, 'table_id': table_id, 'parts': parts})
     
+    source.close()
+    errors.print_summary()
+    tables = [pd.read_pickle(os.path.join(checkpoint_dir, part)) for part in parts] + tables
     if tables:
-        return pd.concat(tables, ignore_index=True)
+        result_df = pd.concat(tables, ignore_index=True)
     else:
-        return pd.DataFrame()
+        result_df = pd.DataFrame()
+    result_df.attrs['errors'] = errors.summary()
+    if checkpoint is not None:
+        checkpoint.clear()
+        for part in parts:
+            os.remove(os.path.join(checkpoint_dir, part))
+    return result_df
 
 def expand_table_column(df, table_column, parser_func):
     """
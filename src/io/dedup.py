@@ -0,0 +1,200 @@
+"""
+Deduplication of documents across batches.
+
+The upstream export resends the same discharge summaries in several batches.
+A document is a duplicate if either
+- its normalized content hash was seen before (checked on the raw bytes,
+  before any parsing), or
+- its (patient id, document id) key was seen before (checked once the id
+  fields are available, e.g. after a resend with a new export timestamp).
+
+`SeenSet` keeps both kinds of keys and can be persisted as a JSON Lines file
+(one line per accepted document, appended as it is accepted), so later batches
+are checked against everything ingested before:
+
+    {"hash": "<blake2b hex>", "key": ["<patient id>", "<document id>"]}
+"""
+import hashlib
+import json
+import os
+import re
+from contextlib import nullcontext
+
+from src.io.backends import json_loads
+
+_BETWEEN_TAGS = re.compile(rb'>\s+<')
+
+
+def content_hash(content):
+    """
+    Returns the normalized content hash of a document.
+    The byte order mark, line endings and whitespace between XML tags do not
+    change the hash.
+
+    Args:
+        content: Raw document bytes (XML or JSON)
+
+    Returns:
+        str: Hex digest
+    """
+    if content.startswith(b'\xef\xbb\xbf'):
+        content = content[3:]
+    content = _BETWEEN_TAGS.sub(b'><', content.replace(b'\r\n', b'\n')).strip()
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+def document_key(patient_id, document_id):
+    """
+    Returns the identity key of a document, or None if an id is missing.
+
+    Args:
+        patient_id: Patient id (see src.parsers.patient_parser.get_id)
+        document_id: Document id (see src.parsers.base_parser.get_document_id)
+
+    Returns:
+        tuple or None: (patient_id, document_id) as strings
+    """
+    if patient_id in (None, '') or document_id in (None, ''):
+        return None
+    return str(patient_id), str(document_id)
+
+
+def raw_document_key(data):
+    """
+    Returns the identity key of a converted CDA document.
+
+    Args:
+        data: Document JSON data
+
+    Returns:
+        tuple or None: See `document_key`
+    """
+    from src.parsers.base_parser import get_document_id
+    from src.parsers.patient_parser import get_id
+
+    try:
+        return document_key(get_id(data), get_document_id(data))
+    except (KeyError, TypeError):
+        return None
+
+
+class SeenSet:
+    """
+    Content hashes and identity keys of the documents accepted so far.
+
+    Args:
+        path: Optional JSON Lines file; existing entries are loaded and new ones appended
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.hashes = set()
+        self.keys = set()
+        self.entries = 0
+        self._file = None
+        if path:
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as file:
+                    for line in file:
+                        if line.strip():
+                            self._remember(json.loads(line))
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def _remember(self, entry):
+        self.entries += 1
+        if entry.get('hash'):
+            self.hashes.add(entry['hash'])
+        if entry.get('key'):
+            self.keys.add(tuple(entry['key']))
+
+    def duplicate_of(self, content_hash=None, key=None):
+        """
+        Checks a document against the seen set.
+
+        Args:
+            content_hash: Normalized content hash (see `content_hash`)
+            key: Identity key (see `document_key`)
+
+        Returns:
+            str or None: 'content' or 'id' if the document is a duplicate, otherwise None
+        """
+        if content_hash is not None and content_hash in self.hashes:
+            return 'content'
+        if key is not None and key in self.keys:
+            return 'id'
+        return None
+
+    def add(self, content_hash=None, key=None):
+        """
+        Records an accepted document (and appends it to the file, if persisted).
+        """
+        entry = {'hash': content_hash, 'key': list(key) if key is not None else None}
+        self._remember(entry)
+        if self._file is not None:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def __len__(self):
+        return self.entries
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def find_duplicates(source, names, seen):
+    """
+    Finds the duplicate records of a source in processing order and records
+    the others in the seen set. The content hash is checked on the raw bytes,
+    so content duplicates are never parsed; the remaining records are loaded
+    for their 'id' and 'document_id' fields.
+
+    Args:
+        source: Open source of feature or structured records (see src.io.storage)
+        names: Record names in processing order
+        seen: SeenSet
+
+    Returns:
+        dict: Name -> reason ('content' or 'id') for every duplicate
+    """
+    duplicates = {}
+    for name in names:
+        content = source.read_bytes(name)
+        digest = content_hash(content)
+        reason = seen.duplicate_of(digest)
+        key = None
+        if reason is None:
+            record = json_loads(content)
+            key = document_key(record.get('id'), record.get('document_id')) if isinstance(record, dict) else None
+            reason = seen.duplicate_of(key=key)
+        if reason is None:
+            seen.add(digest, key)
+        else:
+            duplicates[name] = reason
+    return duplicates
+
+
+def open_seen_set(dedup):
+    """
+    Opens the seen set for a `dedup` argument of the folder functions.
+
+    Args:
+        dedup: None/False - no deduplication, True - within the run only,
+            str - path of a persisted seen set (JSON Lines)
+
+    Returns:
+        SeenSet or contextlib.nullcontext: Context manager yielding the seen set, or None if disabled
+    """
+    if not dedup:
+        return nullcontext()
+    return SeenSet(dedup if isinstance(dedup, (str, os.PathLike)) else None)
@@ -2,96 +2,233 @@
 Module for converting XML and JSON files.
 """
 import os
-import json
-import xml.etree.ElementTree as ET
-from tqdm import tqdm
+from src.io.backends import parse_xml, json_dump_pretty
+from src.io.storage import open_source, open_sink, existing_names
+from src.io.compression import open_file, strip_compression_suffix
+from src.io.dedup import open_seen_set, content_hash, raw_document_key
+from src.utils.errors import ErrorCollector
+from src.utils.parallel import process_documents
+from src.utils.profiling import profiling, timed, count
+from src.utils.lazy import lazy_function
+
+tqdm = lazy_function('tqdm', 'tqdm')
+
+
+def elem_to_dict(elem):
+    """
+    Converts parsed XML element to Python dictionary.
+
+    Args:
+        elem: XML element
+
+    Returns:
+        dict: Element as a dictionary
+    """
+    d = {}
+    for child in elem:
+        if not isinstance(child.tag, str):
+            continue  # Comments, processing instructions and entities (lxml)
+        if child.tag not in d:
+            d[child.tag] = elem_to_dict(child)
+        else:
+            if not isinstance(d[child.tag], list):
+                d[child.tag] = [d[child.tag]]
+            d[child.tag].append(elem_to_dict(child))
+    d.update({k: v for k, v in elem.attrib.items()})
+    if elem.text and elem.text.strip():
+        d['text'] = elem.text.strip()
+    else:
+        d.pop('text', None)  # Remove empty text fields
+    return d
+
+
+def xml_to_dict(xml_data):
+    """
+    Parses XML document content into a Python dictionary.
+
+    The XML parser backend is selected in src.io.backends.
+
+    Args:
+        xml_data: XML content as str or bytes, or a binary stream that is parsed incrementally
+
+    Returns:
+        dict: Document as a dictionary
+    """
+    with timed('xml.parse'):
+        root = parse_xml(xml_data)
+    with timed('xml.to_dict'):
+        return elem_to_dict(root)
 
 
 def xml_to_json(xml_file_path, json_file_path):
     """
     Converts XML file to JSON.
+    Paths ending with `.gz`, `.xz` or `.bz2` are decompressed/compressed on the fly.
     
     Args:
         xml_file_path: Path to the XML file
         json_file_path: Path where the JSON file will be saved
     """
-    # Read XML data from file
-    with open(xml_file_path, 'r', encoding='utf-8') as file:
-        xml_data = file.read()
-
-    # Parse XML data
-    root = ET.fromstring(xml_data)
-
-    # Function to convert parsed XML element to Python dictionary
-    def elem_to_dict(elem):
-        d = {}
-        for child in elem:
-            if child.tag not in d:
-                d[child.tag] = elem_to_dict(child)
-            else:
-                if not isinstance(d[child.tag], list):
-                    d[child.tag] = [d[child.tag]]
-                d[child.tag].append(elem_to_dict(child))
-        d.update({k: v for k, v in elem.attrib.items()})
-        if elem.text and elem.text.strip():
-            d['text'] = elem.text.strip()
-        else:
-            d.pop('text', None)  # Remove empty text fields
-        return d
+    # Parse XML data while streaming it from the file
+    with open_file(xml_file_path, 'rb') as file:
+        json_data = xml_to_dict(file)
+
+    # Save the dictionary to JSON file
+    with open_file(json_file_path, 'w') as json_file:
+        json_dump_pretty(json_data, json_file)
+
+def _convert_document(source, name):
+    """
+    Parses one XML document of a source into a dictionary (per-document step of
+    `process_files_in_directory`, also run in worker processes).
+    """
+    with timed('stage.xml_to_json'):
+        with source.open(name) as stream:
+            return xml_to_dict(stream)
+
+
+def _hash_document(source, name):
+    """
+    Returns the normalized content hash of one document of a source (dedup pre-pass
+    of `process_files_in_directory`).
+    """
+    return content_hash(source.read_bytes(name))
+
+
+def _output_name(filename):
+    """
+    Returns the JSON name for an XML document name.
+    Archive members may live in subfolders, outputs are written flat.
+    """
+    return strip_compression_suffix(os.path.basename(filename)).replace('.xml', '.json')
 
-    # Convert the root element to a dictionary and save to JSON file
-    with open(json_file_path, 'w', encoding='utf-8') as json_file:
-        json_data = elem_to_dict(root)
-        json.dump(json_data, json_file, ensure_ascii=False, indent=4)
 
-def process_files_in_directory(input_directory, output_directory):
+def process_files_in_directory(input_directory, output_directory, compress=None, profile=False, profile_sample=None,
+                               error_log=None, workers=1, incremental=False, output_format='json', shard_size=10000,
+                               dedup=None, io_concurrency=None):
     """
     Processes all XML files in the specified directory and converts them to JSON.
-    Handles exceptions for individual files and prints processing statistics.
-    Only error messages are displayed during processing.
+    Errors of individual files are collected (see src.utils.errors) and summarized
+    by cause after processing, together with the processing statistics.
     Uses tqdm for progress visualization.
     
     Args:
-        input_directory: Input directory with XML files
-        output_directory: Output directory for JSON files
+        input_directory: Input directory, pack or zip/tar archive with XML files
+        output_directory: Output directory for JSON files, or a `.pack` path
+        compress: Compression of the written JSON files: None, True (gzip), 'gz', 'xz' or 'bz2'.
+            Compressed inputs (`.xml.gz`, ...) are detected automatically
+        profile: Collect stage timers and counters (see src.utils.profiling)
+        profile_sample: Position of one file in the processing order to run under
+            cProfile and tracemalloc (requires profile=True)
+        error_log: Optional JSON Lines file that error records are appended to
+        workers: Number of worker processes for parsing (see src.utils.parallel)
+        incremental: Skip files whose JSON output already exists
+        output_format: 'json' - one file per document, 'jsonl' - JSON Lines shards
+        shard_size: Records per shard for the 'jsonl' format
+        dedup: Skip duplicate documents (see src.io.dedup): True - within this run, or the path of
+            a persisted seen set to also skip documents converted by earlier runs. Content duplicates
+            are dropped before parsing, (patient id, document id) duplicates before writing
+        io_concurrency: Prefetch up to this many file reads asynchronously, overlapping reads and
+            writes with parsing (see src.utils.prefetch). For slow network filesystems; serial runs only
         
     Returns:
-        dict: Statistics of processing (total, success, errors)
+        dict: Statistics of processing (total, success, errors, skipped, duplicates, error_causes - errors
+            aggregated by cause, see src.utils.errors), plus 'profile' if profiling
     """
-    # Create output directory if it doesn't exist
-    os.makedirs(output_directory, exist_ok=True)
+    with profiling(enabled=profile) as profiler, ErrorCollector(error_log) as errors, \
+            open_source(input_directory) as source, open_seen_set(dedup) as seen:
+        # Get list of XML files
+        xml_files = source.list_names('.xml')
 
-    # Get list of XML files
-    xml_files = [f for f in os.listdir(input_directory) if f.endswith('.xml')]
-    
-    # Counters for statistics
-    total_files = len(xml_files)
-    success_count = 0
-    error_count = 0
-
-    # Iterate through each file in the input directory with progress bar
-    for filename in tqdm(xml_files, desc="Processing XML files", unit="file"):
-        # Construct full paths for XML and JSON files
-        path_xml = os.path.join(input_directory, filename)
-        path_json = os.path.join(
-            output_directory, filename.replace('.xml', '.json'))
-
-        try:
-            # Convert XML to JSON
-            xml_to_json(path_xml, path_json)
-            success_count += 1
-        except Exception as e:
-            error_count += 1
-            print(f"Error processing file {filename}: {str(e)}")
+        # Counters for statistics
+        total_files = len(xml_files)
+        success_count = 0
+        error_count = 0
+
+        if incremental:
+            done = existing_names(output_directory, output_format)
+            xml_files = [f for f in xml_files if _output_name(f) not in done]
+        skipped_count = total_files - len(xml_files)
+
+        # Drop content duplicates before parsing, keeping the hashes of the others. Later copies of
+        # a document first seen in this run are kept as fallbacks until the first copy is written
+        duplicate_count = 0
+        hashes = {}
+        fallbacks = {}
+        if seen is not None:
+            with timed('stage.dedup'):
+                first_copies = {}
+                digests = process_documents(_hash_document, source, input_directory, xml_files,
+                                            io_concurrency=io_concurrency)
+                for filename, digest, error in digests:
+                    if error is not None:
+                        error_count += 1
+                        errors.record(filename, 'dedup', error)
+                    elif seen.duplicate_of(digest):
+                        duplicate_count += 1
+                    elif digest in first_copies:
+                        duplicate_count += 1
+                        fallbacks.setdefault(digest, []).append(filename)
+                    else:
+                        first_copies[digest] = filename
+            hashes = {filename: digest for digest, filename in first_copies.items()}
+            xml_files = [f for f in xml_files if f in hashes]
+
+        with open_sink(output_directory, output_format, shard_size, compress) as sink:
+            pending = xml_files
+            sample = profile_sample
+            while pending:
+                retries = []
+                results = process_documents(_convert_document, source, input_directory, pending,
+                                            workers, sample=sample, io_concurrency=io_concurrency)
+                # Iterate through each file in the input directory with progress bar
+                for filename, data, error in tqdm(results, total=len(pending), desc="Processing XML files", unit="file"):
+                    try:
+                        if error is not None:
+                            raise error
+                        key = None
+                        if seen is not None:
+                            key = raw_document_key(data)
+                            if seen.duplicate_of(key=key):
+                                duplicate_count += 1
+                                continue
+                        sink.write(_output_name(filename), data)
+                        if seen is not None:
+                            seen.add(hashes[filename], key)
+                        count('documents')
+                        success_count += 1
+                    except Exception as e:
+                        error_count += 1
+                        errors.record(filename, 'xml_to_json', e)
+                        # Convert the next copy of the same content instead
+                        copies = fallbacks.get(hashes.get(filename))
+                        if copies:
+                            fallback = copies.pop(0)
+                            hashes[fallback] = hashes[filename]
+                            duplicate_count -= 1
+                            retries.append(fallback)
+                pending = retries
+                sample = None
     
     # Print statistics
     print(f"\nProcessing complete!")
     print(f"Total files: {total_files}")
     print(f"Successfully processed: {success_count}")
+    if skipped_count:
+        print(f"Skipped (already converted): {skipped_count}")
+    if duplicate_count:
+        print(f"Skipped (duplicates): {duplicate_count}")
     print(f"Errors: {error_count}")
+    errors.print_summary()
     
-    return {
+    stats = {
         "total": total_files,
         "success": success_count,
-        "errors": error_count
-    } 
\ No newline at end of file
+        "errors": error_count,
+        "skipped": skipped_count,
+        "duplicates": duplicate_count,
+        "error_causes": errors.summary()
+    }
+    if profiler is not None:
+        stats["profile"] = profiler.as_dict()
+    return stats
@@ -0,0 +1,325 @@
+"""
+Sharded JSON Lines storage.
+
+Records are written as compact JSON, one per line, into rotating shard files
+`part-00000.jsonl`, `part-00001.jsonl`, ... (optionally compressed as
+`part-00000.jsonl.gz`, `.jsonl.xz` or `.jsonl.bz2`). Every line has the form
+
+    {"name":"file_1.json","data":{...}}
+
+so the name a record would have as a separate file is kept, and can be read
+without parsing the rest of the line.
+"""
+import os
+import re
+import json
+from src.io.compression import open_file, normalize_compression
+from src.io.backends import json_loads, json_dumps_compact
+from src.utils.profiling import timed, count
+
+SHARD_PATTERN = re.compile(r'^part-(\d+)\.jsonl(\.gz|\.xz|\.bz2)?$')
+NAME_PATTERN = re.compile(rb'^\{"name":("(?:[^"\\]|\\.)*")')
+
+
+def list_shards(directory):
+    """
+    Returns shard file names of a directory in shard order.
+
+    Args:
+        directory: Directory to look in
+
+    Returns:
+        list: Shard file names
+    """
+    if not os.path.isdir(directory):
+        return []
+    shards = [f for f in os.listdir(directory) if SHARD_PATTERN.match(f)]
+    return sorted(shards, key=lambda f: int(SHARD_PATTERN.match(f).group(1)))
+
+
+def is_jsonl_shards(path):
+    """
+    Checks whether a directory contains JSON Lines shards.
+
+    Args:
+        path: Path to check
+
+    Returns:
+        bool: True if the directory has at least one shard
+    """
+    return bool(list_shards(path))
+
+
+class JsonlShardWriter:
+    """
+    Streams records into rotating JSON Lines shards.
+
+    Args:
+        directory: Output directory
+        shard_size: Maximum number of records per shard
+        compress: None/False, True (gzip), 'gz', 'xz' or 'bz2' - shard compression
+        resume_state: State returned by `sync`. Shards are cut back to it, dropping
+            everything written after that checkpoint, and writing continues in the
+            last shard
+    """
+
+    def __init__(self, directory, shard_size=10000, compress=False, resume_state=None):
+        if shard_size < 1:
+            raise ValueError("shard_size must be positive")
+        self.directory = directory
+        self.shard_size = shard_size
+        self.suffix = normalize_compression(compress)
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue after existing shards instead of overwriting them
+        existing = list_shards(directory)
+        self._next_shard = int(SHARD_PATTERN.match(existing[-1]).group(1)) + 1 if existing else 0
+        self._file = None
+        self._path = None
+        self._count = 0
+
+        if resume_state is not None:
+            self._next_shard = resume_state['next_shard']
+            for name in existing:
+                if int(SHARD_PATTERN.match(name).group(1)) >= self._next_shard:
+                    os.remove(os.path.join(directory, name))
+            if resume_state['path'] is not None:
+                self._path = os.path.join(directory, resume_state['path'])
+                with open(self._path, 'ab') as file:
+                    file.truncate(resume_state['size'])
+                self._count = resume_state['count']
+
+    def _rotate(self):
+        """
+        Closes the current shard and opens the next one.
+        """
+        if self._file is not None:
+            self._file.close()
+        self._path = os.path.join(self.directory, f"part-{self._next_shard:05d}.jsonl{self.suffix}")
+        self._file = open_file(self._path, 'wb')
+        self._next_shard += 1
+        self._count = 0
+
+    def write(self, name, record):
+        """
+        Appends a record.
+
+        Args:
+            name: Record name (file name it would have in a directory)
+            record: JSON-serializable object
+
+        Returns:
+            int: Number of uncompressed bytes written
+        """
+        if self._count >= self.shard_size or self._path is None:
+            self._rotate()
+        elif self._file is None:
+            # Continue the current shard after `sync`; compressed shards get a new stream member
+            self._file = open_file(self._path, 'ab')
+        with timed('json.dump'):
+            line = '{"name":' + json.dumps(name, ensure_ascii=False) + ',"data":' + \
+                json_dumps_compact(record) + '}\n'
+            payload = line.encode('utf-8')
+        with timed('io.write'):
+            self._file.write(payload)
+        self._count += 1
+        count('bytes_written', len(payload))
+        return len(payload)
+
+    def sync(self):
+        """
+        Closes the current shard so everything written so far is complete on disk.
+        The next write appends to the same shard.
+
+        Returns:
+            dict: State to resume from (next shard number, current shard with its record count and size)
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            with open(self._path, 'rb') as file:
+                os.fsync(file.fileno())
+        if self._path is None:
+            return {'next_shard': self._next_shard, 'path': None, 'count': 0, 'size': 0}
+        return {'next_shard': self._next_shard, 'path': os.path.basename(self._path),
+                'count': self._count, 'size': os.path.getsize(self._path)}
+
+    def close(self):
+        """
+        Closes the current shard.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonlShardSource:
+    """
+    Reads records from a directory of JSON Lines shards.
+
+    The first call that needs record names scans all shards once and remembers
+    the shard and offset of every line. One shard is kept open at a time, so
+    reads in write order only move forward through each shard, which is cheap
+    for compressed shards as well.
+
+    Args:
+        directory: Directory with shards
+    """
+
+    # Reads move the position of the open shard (see src.utils.prefetch)
+    concurrent_reads = False
+    # Reading in list_names order is one forward pass; other orders rewind compressed shards
+    sequential_reads = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._entries = None
+        self._file = None
+        self._shard = None
+
+    def _build_index(self):
+        """
+        Scans shards and maps each record name to (shard, offset).
+        """
+        self._entries = {}
+        for shard in list_shards(self.directory):
+            offset = 0
+            with open_file(os.path.join(self.directory, shard), 'rb') as file:
+                for line in file:
+                    match = NAME_PATTERN.match(line)
+                    if match:
+                        name = json.loads(match.group(1))
+                        self._entries.pop(name, None)
+                        self._entries[name] = (shard, offset)
+                    offset += len(line)
+
+    def list_names(self, suffix=''):
+        """
+        Returns record names with the given suffix in write order.
+
+        Args:
+            suffix: Name suffix, e.g. '.json'
+
+        Returns:
+            list: Record names
+        """
+        if self._entries is None:
+            self._build_index()
+        return [name for name in self._entries if name.endswith(suffix)]
+
+    def read_line(self, name):
+        """
+        Returns the raw JSON Lines entry of a record.
+
+        Args:
+            name: Record name
+
+        Returns:
+            bytes: Line with the record envelope
+        """
+        if self._entries is None:
+            self._build_index()
+        shard, offset = self._entries[name]
+        with timed('io.read'):
+            if self._shard != shard:
+                self.close()
+                self._file = open_file(os.path.join(self.directory, shard), 'rb')
+                self._shard = shard
+            self._file.seek(offset)
+            line = self._file.readline()
+        count('bytes_read', len(line))
+        return line
+
+    def read_bytes(self, name):
+        """
+        Returns the JSON bytes of a record, without the envelope.
+
+        Args:
+            name: Record name
+
+        Returns:
+            bytes: Serialized record
+        """
+        line = self.read_line(name)
+        start = NAME_PATTERN.match(line).end() + len(b',"data":')
+        return line[start:line.rstrip().rindex(b'}')]
+
+    def load_json(self, name):
+        """
+        Loads a record.
+
+        Args:
+            name: Record name
+
+        Returns:
+            Parsed JSON object
+        """
+        line = self.read_line(name)
+        with timed('json.load'):
+            return json_loads(line)['data']
+
+    def _iter_lines(self):
+        """
+        Yields (name, line) for the last written record of every name, reading every shard sequentially.
+        """
+        if self._entries is None:
+            self._build_index()
+        for shard in list_shards(self.directory):
+            offset = 0
+            with open_file(os.path.join(self.directory, shard), 'rb') as file:
+                for line in file:
+                    match = NAME_PATTERN.match(line)
+                    if match:
+                        name = json.loads(match.group(1))
+                        if self._entries.get(name) == (shard, offset):
+                            yield name, line
+                    offset += len(line)
+
+    def iter_bytes(self, names=None):
+        """
+        Yields the JSON bytes of records (without the envelope) in write order,
+        reading every shard sequentially.
+
+        Args:
+            names: Only yield these records (default: all)
+
+        Yields:
+            tuple: (name, bytes)
+        """
+        wanted = set(names) if names is not None else None
+        for name, line in self._iter_lines():
+            if wanted is None or name in wanted:
+                count('bytes_read', len(line))
+                start = NAME_PATTERN.match(line).end() + len(b',"data":')
+                yield name, line[start:line.rstrip().rindex(b'}')]
+
+    def __iter__(self):
+        """
+        Iterates over (name, record) pairs reading every shard sequentially.
+        Records that were written again later are skipped, so every name is
+        yielded once, with its last written record, as `list_names` and `load_json` see it.
+        """
+        for _, line in self._iter_lines():
+            entry = json_loads(line)
+            yield entry['name'], entry['data']
+
+    def close(self):
+        """
+        Closes the open shard handle.
+        """
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
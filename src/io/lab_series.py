@@ -0,0 +1,259 @@
+"""
+Per-parameter time series of lab results in CSR layout.
+
+Queries like "patients whose hemoglobin dropped by more than 20% during the
+stay" compare the results of every patient with each other, which is slow
+as row-wise DataFrame filtering. `ParameterSeries` holds the numeric results
+of one parameter as two contiguous arrays, `times` and `values`, sorted by
+patient and time, with an `offsets` array: the results of the i-th patient
+(`cards[i]`) are offsets[i]:offsets[i + 1]. Every query is computed for all
+patients at once with segmented NumPy reductions and returns one value per
+patient, aligned with `cards`:
+
+    hb = store.series('Гемоглобин').window(patients['admission_date'], patients['discharge_date'],
+                                           cards=patients['id_card'])
+    hb.cards[hb.max_drop(relative=True) > 0.2]     # fell 20% below an earlier result
+    hb.cards[hb.change(relative=True) < -0.2]      # last result 20% below the first
+
+Times are the research dates (see src.io.lab_store); results without a
+number or a date are left out, and every patient in a series has at least
+one result.
+"""
+from src.utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+
+def _timedelta(within):
+    """
+    Returns a window length as timedelta64[s]; numbers are days.
+    """
+    if isinstance(within, np.timedelta64):
+        return within.astype('timedelta64[s]')
+    return np.timedelta64(int(round(within * 86400)), 's')
+
+
+def _bounds(bound, cards, series_cards, counts):
+    """
+    Expands a window bound to one datetime64[s] value per observation;
+    NaT (also for cards without a bound) means no bound.
+    """
+    bound = np.asarray(bound, dtype='datetime64[s]')
+    if bound.ndim == 0:
+        per_card = np.full(len(series_cards), bound)
+    elif cards is None:
+        per_card = bound
+    else:
+        positions = pd.Index(np.asarray(cards, dtype=np.int64)).get_indexer(series_cards)
+        per_card = np.append(bound, np.datetime64('NaT'))[positions]
+    return np.repeat(per_card, counts)
+
+
+class ParameterSeries:
+    """
+    Time series of one parameter for all patients (see the module docstring).
+
+    Args:
+        parameter: Parameter name
+        cards: Sorted int64 id_card of the patients
+        offsets: int64 array of len(cards) + 1; the results of cards[i] are offsets[i]:offsets[i + 1]
+        times: datetime64[s] times, sorted within each patient
+        values: float64 values
+    """
+
+    def __init__(self, parameter, cards, offsets, times, values):
+        self.parameter = parameter
+        self.cards = cards
+        self.offsets = offsets
+        self.times = times
+        self.values = values
+
+    @classmethod
+    def from_observations(cls, parameter, id_card, times, values):
+        """
+        Builds a series from observations sorted by id_card and time (as the rows
+        of a parameter in a LabStore are). Observations without a value or time are dropped.
+
+        Args:
+            parameter: Parameter name
+            id_card: Array-like of id_card
+            times: Array-like of datetime64 times
+            values: Array-like of float values
+
+        Returns:
+            ParameterSeries: The series
+        """
+        id_card = np.asarray(id_card, dtype=np.int64)
+        times = np.asarray(times, dtype='datetime64[s]')
+        values = np.asarray(values, dtype=np.float64)
+        keep = ~np.isnan(values) & ~np.isnat(times)
+        id_card, times, values = id_card[keep], times[keep], values[keep]
+        cards, starts = np.unique(id_card, return_index=True)
+        return cls(parameter, cards, np.append(starts, len(id_card)).astype(np.int64), times, values)
+
+    def __len__(self):
+        return len(self.cards)
+
+    @property
+    def counts(self):
+        """
+        np.ndarray: Number of results of each patient
+        """
+        return np.diff(self.offsets)
+
+    def _segments(self):
+        """
+        Returns the patient position of every observation.
+        """
+        return np.repeat(np.arange(len(self.cards)), self.counts)
+
+    def _reduce(self, ufunc, values=None):
+        """
+        Reduces values (default: the series values) per patient with a ufunc.
+        """
+        values = self.values if values is None else values
+        if not len(self.cards):
+            return np.empty(0, dtype=values.dtype)
+        return ufunc.reduceat(values, self.offsets[:-1])
+
+    def first(self):
+        """
+        np.ndarray: Earliest value of each patient
+        """
+        return self.values[self.offsets[:-1]]
+
+    def last(self):
+        """
+        np.ndarray: Latest value of each patient
+        """
+        return self.values[self.offsets[1:] - 1]
+
+    def min(self):
+        """
+        np.ndarray: Smallest value of each patient
+        """
+        return self._reduce(np.minimum)
+
+    def max(self):
+        """
+        np.ndarray: Largest value of each patient
+        """
+        return self._reduce(np.maximum)
+
+    def mean(self):
+        """
+        np.ndarray: Mean value of each patient
+        """
+        return self._reduce(np.add) / self.counts
+
+    def change(self, relative=False):
+        """
+        Change from the earliest to the latest value of each patient.
+
+        Args:
+            relative: Divide by the earliest value (NaN where it is not positive)
+
+        Returns:
+            np.ndarray: float64 changes, negative for a decrease
+        """
+        first = self.first()
+        delta = self.last() - first
+        if not relative:
+            return delta
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(first > 0, delta / first, np.nan)
+
+    def _running_peak(self):
+        """
+        Returns, for every observation, the largest value of its patient up to it.
+        """
+        n = len(self.values)
+        order = np.argsort(self.values, kind='stable')
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        # Keys of later patients exceed those of earlier ones, so the running maximum restarts at each patient
+        base = self._segments().astype(np.int64) * n
+        return self.values[order[np.maximum.accumulate(base + rank) - base]]
+
+    def _window_peak(self, within):
+        """
+        Returns, for every observation, the largest value of its patient within `within` before it.
+        """
+        segments = self._segments()
+        peak = self.values.copy()
+        for lag in range(1, int(self.counts.max(initial=0))):
+            later = np.arange(lag, len(self.values))
+            earlier = later - lag
+            close = (segments[later] == segments[earlier]) & (self.times[later] - self.times[earlier] <= within)
+            if not close.any():
+                break  # Times are sorted, so larger lags are farther apart
+            later, earlier = later[close], earlier[close]
+            peak[later] = np.maximum(peak[later], self.values[earlier])
+        return peak
+
+    def max_drop(self, relative=False, within=None):
+        """
+        Largest fall of each patient's value below an earlier value.
+
+        Args:
+            relative: Divide each fall by the earlier value (NaN where it is not positive)
+            within: Only compare with results at most this long before (days or timedelta64);
+                any earlier result of the stay if None
+
+        Returns:
+            np.ndarray: float64 falls, 0 for patients whose value never fell
+        """
+        if within is None:
+            peak = self._running_peak()
+        else:
+            peak = self._window_peak(_timedelta(within))
+        drop = peak - self.values
+        if relative:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                drop = np.where(peak > 0, drop / peak, np.nan)
+        return self._reduce(np.fmax, drop)
+
+    def window(self, start=None, end=None, cards=None):
+        """
+        Keeps the results with start <= time <= end, e.g. those of the stay.
+
+        Args:
+            start: First time to keep - a datetime64 scalar, or an array with one value per card
+            end: Last time to keep, like start
+            cards: id_card the start/end arrays are aligned with (e.g. the patients table's id_card);
+                if None, the arrays are aligned with `self.cards`. Cards missing from `cards`
+                and NaT bounds leave that side unbounded
+
+        Returns:
+            ParameterSeries: The series of the kept results; patients without any are dropped
+        """
+        counts = self.counts
+        keep = np.ones(len(self.values), dtype=bool)
+        if start is not None:
+            lower = _bounds(start, cards, self.cards, counts)
+            keep &= np.isnat(lower) | (self.times >= lower)
+        if end is not None:
+            upper = _bounds(end, cards, self.cards, counts)
+            keep &= np.isnat(upper) | (self.times <= upper)
+        return ParameterSeries.from_observations(self.parameter, np.repeat(self.cards, counts)[keep],
+                                                 self.times[keep], self.values[keep])
+
+    def to_frame(self):
+        """
+        Returns the per-patient summary of the series.
+
+        Returns:
+            pd.DataFrame: id_card, count, first, last, min, max, mean, change and max_drop
+        """
+        return pd.DataFrame({
+            'id_card': self.cards,
+            'count': self.counts,
+            'first': self.first(),
+            'last': self.last(),
+            'min': self.min(),
+            'max': self.max(),
+            'mean': self.mean(),
+            'change': self.change(),
+            'max_drop': self.max_drop(),
+        })
@@ -0,0 +1,497 @@
+"""
+Long-format, columnar store of research and lab results.
+
+`compute_full_wards` keeps the research tables of a document as raw table JSON
+nested by ward and research title, and `get_table_1` (src.parsers.lab_parser)
+returns one DataFrame per document, so comparing a parameter across patients
+means parsing every table again. `LabStore` flattens all of them into one
+row per result:
+
+    id_card, ward, research, research_date, parameter, value, qualifier, unit, raw
+
+`raw` is the result cell as written ('5.2 ммоль/л', '6.9 10^9/л', '<0.5',
+'1 000', 'отрицательно'); `value` is its number (NaN if it has none) and
+`unit` the rest of the cell, or the unit column of the table if it has one.
+Censored results ('<0.5', '> 1000') keep their bound in `value` and their
+comparison in `qualifier` ('<', '>', '≤' or '≥'; missing for exact results).
+They are not measurements, so `query`, `cards` and `series` leave them out
+unless asked for them. Research titles ('Общий анализ крови от 26.07.2021')
+are split into the research name and `research_date`.
+
+The values are split from the units in one vectorized pass over the distinct
+result strings, which repeat a lot across a corpus, and the text columns are
+stored as categorical codes. Rows are sorted by parameter, id_card and date,
+with an offsets index over the parameters, so all results of a parameter are
+one contiguous slice:
+
+    store = create_lab_store('structured')
+    store.query('Гемоглобин', high=100)     # rows of the results up to 100
+    store.cards('Гемоглобин', high=100)     # id_card of the patients with such a result
+    store.series('Гемоглобин')              # per-patient time series, see src.io.lab_series
+    store.save('tables/labs.npz')
+"""
+import re
+
+from src.io.dataset_process import WARD_LIST_FIELDS, extract_number
+from src.io.lab_series import ParameterSeries
+from src.io.selective import load_fields
+from src.io.storage import open_source
+from src.utils.dates import parse_dates
+from src.utils.errors import ErrorCollector
+from src.utils.lazy import lazy_import, lazy_function
+from src.utils.profiling import count, timed
+from src.utils.table_utils import parse_table_as_dict, save_table_as_dict
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+tqdm = lazy_function('tqdm', 'tqdm')
+
+# Columns of the store, in order
+LAB_COLUMNS = ('id_card', 'ward', 'research', 'research_date', 'parameter', 'value', 'qualifier', 'unit', 'raw')
+# Text columns, stored as codes into sorted category arrays
+CATEGORICAL_COLUMNS = ('ward', 'research', 'parameter', 'qualifier', 'unit', 'raw')
+# Headers of the result column of research tables (otherwise the first column after the parameter)
+RESULT_HEADERS = ('Результат', 'Значение')
+
+# Optional qualifier of a censored result, the number at the start of a result (digits may be grouped
+# by thousands with spaces, '1 000'), then the unit: after a space, or directly if it does not continue
+# the number ('50с', not '1.2-3.4')
+_RESULT = (r'^\s*(?:([<>≤≥])(=?)\s*)?([-+]?(?:\d{1,3}(?:[ \u00a0]\d{3})+(?![\d^])|\d+)(?:[.,]\d+)?)'
+           r'(?:(?:\s+|(?=[^\d.,\s]))(?![-–])(.+?))?\s*$')
+# Qualifiers with '=' are stored as their single-character form
+_INCLUSIVE = {'<': '≤', '>': '≥'}
+_TITLE = r'^(.*?)\s+от\s+(\d{2}\.\d{2}\.\d{4}(?:\s+\d{2}:\d{2}(?::\d{2})?)?)\s*$'
+_UNIT_HEADER = re.compile(r'^\s*ед', re.IGNORECASE)
+
+_FORMAT_VERSION = 2
+
+
+def split_values(raw):
+    """
+    Splits result strings into numbers, qualifiers and units. The regular
+    expression runs once per distinct string.
+
+    Args:
+        raw: Array-like of result strings (None for missing)
+
+    Returns:
+        tuple: (float64 values, NaN without a number; object array of qualifiers ('<', '>', '≤', '≥'),
+            None for exact results; object array of units, None without one)
+    """
+    codes, uniques = pd.factorize(np.asarray(raw, dtype=object))
+    parts = pd.Series(uniques, dtype=object).str.extract(_RESULT)
+    number = parts[2].str.replace(r'[ \u00a0]', '', regex=True).str.replace(',', '.', regex=False)
+    numbers = pd.to_numeric(number, errors='coerce').to_numpy(np.float64)
+    qualifiers = parts[0].where(parts[1] != '=', parts[0].map(_INCLUSIVE)).to_numpy(dtype=object)
+    qualifiers = np.where(pd.isna(qualifiers), None, qualifiers)
+    units = parts[3].to_numpy(dtype=object)
+    units = np.where(pd.isna(units), None, units)
+    # Code -1 (missing) takes the appended last element
+    values = np.append(numbers, np.nan)[codes]
+    return values, np.append(qualifiers, None)[codes], np.append(units, None)[codes]
+
+
+def split_research_titles(titles):
+    """
+    Splits research titles of the form '<research> от dd.mm.yyyy[ hh:mm]' into names and dates.
+
+    Args:
+        titles: Array-like of titles
+
+    Returns:
+        tuple: (object array of names - the whole title if it has no date; datetime64[s] dates, NaT if none)
+    """
+    codes, uniques = pd.factorize(np.asarray(titles, dtype=object))
+    parts = pd.Series(uniques, dtype=object).str.extract(_TITLE)
+    names = parts[0].fillna(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    dates = parse_dates(parts[1].to_numpy(dtype=object))
+    return np.append(names, None)[codes], np.append(dates, np.datetime64('NaT'))[codes]
+
+
+def _result_columns(columns):
+    """
+    Picks the parameter, result and unit columns of a table's column dict.
+
+    Returns:
+        tuple or None: (parameters, results, units or None), None if the table has no result column
+    """
+    names = list(columns)
+    if len(names) < 2:
+        return None
+    unit = next((name for name in names[1:] if _UNIT_HEADER.match(str(name))), None)
+    result = next((name for name in names[1:] if name in RESULT_HEADERS), None)
+    if result is None:
+        result = next((name for name in names[1:] if name != unit), None)
+    if result is None:
+        return None
+    return columns[names[0]], columns[result], columns[unit] if unit is not None else None
+
+
+def _categorical(values):
+    """
+    Returns (int32 codes, sorted category array) of a column; -1 marks missing values.
+    """
+    codes, categories = pd.factorize(np.asarray(values, dtype=object), sort=True)
+    return codes.astype(np.int32), np.asarray(categories, dtype=object)
+
+
+class LabStoreBuilder:
+    """
+    Collects research and lab tables and builds a `LabStore` from them.
+
+    Tables are only parsed into column lists while they are added; the
+    splitting, typing and sorting run once over all rows in `build`.
+    """
+
+    def __init__(self):
+        self._cards = []
+        self._wards = []
+        self._titles = []
+        self._sizes = []
+        self._parameters = []
+        self._raw = []
+        self._units = []
+
+    def add_table(self, id_card, table, ward=None, research=None):
+        """
+        Adds one table: the first column holds the parameters, the result column
+        (see RESULT_HEADERS) the results, and a column whose header starts with
+        'Ед' the units.
+
+        Args:
+            id_card: ID of the patient card
+            table: DataFrame (e.g. of get_table_1) or column dict (parse_table_as_dict)
+            ward: Ward name
+            research: Research title, optionally with ' от dd.mm.yyyy'
+
+        Returns:
+            int: Number of rows added
+        """
+        columns = save_table_as_dict(table) if isinstance(table, pd.DataFrame) else table
+        selected = _result_columns(columns)
+        if selected is None:
+            count('lab_store.tables_without_results')
+            return 0
+        parameters, results, units = selected
+        size = len(parameters)
+        self._cards.append(id_card)
+        self._wards.append(ward)
+        self._titles.append(research)
+        self._sizes.append(size)
+        self._parameters.extend(parameters)
+        self._raw.extend(results)
+        self._units.extend(units if units is not None else [None] * size)
+        return size
+
+    def add_record(self, id_card, record):
+        """
+        Adds the research tables of a structured or feature record ('ward_list').
+        Tables that cannot be parsed are skipped (counted as 'lab_store.unparsed_tables').
+
+        Args:
+            id_card: ID of the patient card
+            record: Record (only 'ward_list' is read)
+
+        Returns:
+            int: Number of rows added
+        """
+        added = 0
+        for ward, researches in (record.get('ward_list') or {}).items():
+            for research, table in (researches or {}).items():
+                if not table:
+                    continue
+                try:
+                    columns = parse_table_as_dict(table)
+                except ValueError:
+                    count('lab_store.unparsed_tables')
+                    continue
+                added += self.add_table(id_card, columns, ward, research)
+        return added
+
+    def build(self):
+        """
+        Builds the store from the tables added so far.
+
+        Returns:
+            LabStore: The store
+        """
+        with timed('lab_store.build'):
+            sizes = np.asarray(self._sizes, dtype=np.int64)
+            id_card = np.repeat(np.asarray(self._cards, dtype=np.int64), sizes)
+            wards = np.repeat(np.asarray(self._wards, dtype=object), sizes)
+            names, dates = split_research_titles(self._titles)
+            research = np.repeat(names, sizes)
+            research_date = np.repeat(dates, sizes)
+            parameter = np.asarray(self._parameters, dtype=object)
+            raw = np.asarray(self._raw, dtype=object)
+            # Cells that are not strings (numbers of DataFrame tables) are kept as their text
+            missing = pd.isna(raw)
+            raw = np.where(missing, None, raw.astype(str)).astype(object)
+            value, qualifier, unit = split_values(raw)
+            given = np.asarray(self._units, dtype=object)
+            given_mask = ~pd.isna(given)
+            unit[given_mask] = given[given_mask]
+
+            keep = ~missing & ~pd.isna(parameter)
+            columns = {
+                'id_card': id_card[keep],
+                'ward': wards[keep],
+                'research': research[keep],
+                'research_date': research_date[keep],
+                'parameter': parameter[keep],
+                'value': value[keep],
+                'qualifier': qualifier[keep],
+                'unit': unit[keep],
+                'raw': raw[keep],
+            }
+            return LabStore.from_columns(columns)
+
+
+class LabStore:
+    """
+    Research and lab results in long format (see the module docstring).
+
+    Columns are NumPy arrays: id_card int64, research_date datetime64[s],
+    value float64, and int32 codes (-1 for missing) into sorted category
+    arrays for the text columns (qualifier included). Rows are sorted by parameter, id_card and
+    research_date; the rows of the i-th parameter are offsets[i]:offsets[i + 1].
+
+    Use `from_columns`, `LabStoreBuilder`, `create_lab_store` or `load` to build one.
+    """
+
+    def __init__(self, arrays, categories):
+        self.arrays = arrays
+        self.categories = categories
+        self.offsets = np.searchsorted(arrays['parameter'], np.arange(len(categories['parameter']) + 1))
+        self._parameter_codes = {name: code for code, name in enumerate(categories['parameter'])}
+        self.attrs = {}
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Builds a store from decoded columns.
+
+        Args:
+            columns: Dict of equal-length array-likes for all LAB_COLUMNS
+
+        Returns:
+            LabStore: The store
+        """
+        arrays, categories = {}, {}
+        for column in CATEGORICAL_COLUMNS:
+            arrays[column], categories[column] = _categorical(columns[column])
+        arrays['id_card'] = np.asarray(columns['id_card'], dtype=np.int64)
+        arrays['research_date'] = np.asarray(columns['research_date'], dtype='datetime64[s]')
+        arrays['value'] = np.asarray(columns['value'], dtype=np.float64)
+        # Missing parameters (code -1) never occur: the builder drops them
+        order = np.lexsort((arrays['research_date'], arrays['id_card'], arrays['parameter']))
+        return cls({column: arrays[column][order] for column in LAB_COLUMNS}, categories)
+
+    def __len__(self):
+        return len(self.arrays['value'])
+
+    @property
+    def parameters(self):
+        """
+        list: Names of all parameters, sorted
+        """
+        return list(self.categories['parameter'])
+
+    def rows(self, parameter):
+        """
+        Returns the rows of a parameter.
+
+        Args:
+            parameter: Parameter name
+
+        Returns:
+            slice: Rows of the parameter (empty if it is unknown)
+        """
+        code = self._parameter_codes.get(parameter)
+        if code is None:
+            return slice(0, 0)
+        return slice(int(self.offsets[code]), int(self.offsets[code + 1]))
+
+    def column(self, name, rows=slice(None)):
+        """
+        Returns a column, decoding the text columns.
+
+        Args:
+            name: One of LAB_COLUMNS
+            rows: Rows to return (slice, index array or boolean mask)
+
+        Returns:
+            np.ndarray: Values; None for missing text
+        """
+        values = self.arrays[name][rows]
+        if name not in CATEGORICAL_COLUMNS:
+            return values
+        return np.append(self.categories[name], None)[values]
+
+    def series(self, parameter, unit=None):
+        """
+        Returns the exact numeric results of a parameter as per-patient time series
+        (see src.io.lab_series). Censored results and results without a number or
+        research date are left out.
+
+        Args:
+            parameter: Parameter name
+            unit: Only results with this unit (results in different units are not comparable)
+
+        Returns:
+            ParameterSeries: The series
+        """
+        rows = self._matching(parameter, None, None, unit, censored=False)
+        return ParameterSeries.from_observations(parameter, self.arrays['id_card'][rows],
+                                                 self.arrays['research_date'][rows], self.arrays['value'][rows])
+
+    def to_frame(self, rows=slice(None)):
+        """
+        Returns rows of the store as a DataFrame with categorical text columns.
+
+        Args:
+            rows: Rows to return (slice, index array or boolean mask); all by default
+
+        Returns:
+            pd.DataFrame: Table with LAB_COLUMNS
+        """
+        data = {}
+        for column in LAB_COLUMNS:
+            values = self.arrays[column][rows]
+            if column in CATEGORICAL_COLUMNS:
+                values = pd.Categorical.from_codes(values, categories=pd.Index(self.categories[column], dtype=object))
+            data[column] = values
+        return pd.DataFrame(data)
+
+    def _matching(self, parameter, low, high, unit, censored):
+        """
+        Returns the indices of the rows of a parameter whose value is in [low, high] and unit matches;
+        censored results only if `censored`.
+        """
+        rows = self.rows(parameter)
+        values = self.arrays['value'][rows]
+        mask = ~np.isnan(values)
+        if not censored:
+            mask &= self.arrays['qualifier'][rows] == -1
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        if unit is not None:
+            code = np.flatnonzero(self.categories['unit'] == unit)
+            mask &= self.arrays['unit'][rows] == (code[0] if len(code) else -2)
+        return rows.start + np.flatnonzero(mask)
+
+    def query(self, parameter, low=None, high=None, unit=None, censored=False):
+        """
+        Selects the results of a parameter with a numeric value in a range.
+
+        Args:
+            parameter: Parameter name
+            low: Smallest value to include (no bound if None)
+            high: Largest value to include (no bound if None)
+            unit: Only results with this unit
+            censored: Also select censored results ('<0.5'), compared by their bound
+
+        Returns:
+            pd.DataFrame: Matching rows (see `to_frame`)
+        """
+        return self.to_frame(self._matching(parameter, low, high, unit, censored))
+
+    def cards(self, parameter, low=None, high=None, unit=None, censored=False):
+        """
+        Returns the patient cards with at least one matching result (see `query`).
+
+        Returns:
+            np.ndarray: Sorted unique id_card values
+        """
+        return np.unique(self.arrays['id_card'][self._matching(parameter, low, high, unit, censored)])
+
+    def save(self, path):
+        """
+        Writes the store as a compressed NumPy archive (no pickled objects).
+
+        Args:
+            path: Target .npz file
+        """
+        arrays = {f'column.{name}': values for name, values in self.arrays.items()}
+        for name, values in self.categories.items():
+            arrays[f'categories.{name}'] = np.asarray(values, dtype=str)
+        np.savez_compressed(path, version=_FORMAT_VERSION, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads a store written by `save`.
+
+        Args:
+            path: .npz file
+
+        Returns:
+            LabStore: The store
+        """
+        with np.load(path, allow_pickle=False) as archive:
+            if int(archive['version']) != _FORMAT_VERSION:
+                raise ValueError(f"Unsupported lab store version {int(archive['version'])}")
+            arrays = {name: archive[f'column.{name}'] for name in LAB_COLUMNS}
+            categories = {name: archive[f'categories.{name}'].astype(object) for name in CATEGORICAL_COLUMNS}
+        return cls(arrays, categories)
+
+    @classmethod
+    def from_records(cls, records, start_card_id=0, errors=None):
+        """
+        Builds a store from structured records, e.g. `iter_records(path, fields=WARD_LIST_FIELDS)`.
+        The id_card of a record is its position in `records` plus `start_card_id`,
+        as in `iter_table_rows`.
+
+        Args:
+            records: Iterable of (name, record)
+            start_card_id: ID of the first patient card
+            errors: Optional ErrorCollector; failed records are recorded and skipped instead of raising
+
+        Returns:
+            LabStore: The store
+        """
+        builder = LabStoreBuilder()
+        for position, (name, record) in enumerate(records):
+            try:
+                builder.add_record(start_card_id + position, record)
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors.record(name, 'lab_store', e)
+        return builder.build()
+
+
+def create_lab_store(folder_path, start_card_id=0, errors=None, exclude=None):
+    """
+    Creates the lab store from the structured records of a folder. The id_card
+    of a record is its position among the records, as in the tables of
+    src.io.dataset_process, so the store joins with them.
+
+    Args:
+        folder_path: Path to the folder (or pack) with JSON files
+        start_card_id: ID of the first patient card
+        errors: Collector for errors of individual files (a new one if None).
+            Errors aggregated by cause are also stored in the result's attrs['errors']
+        exclude: Names of files to leave out; the other files keep the id_card of their position
+
+    Returns:
+        LabStore: The store
+    """
+    errors = errors if errors is not None else ErrorCollector()
+    builder = LabStoreBuilder()
+    exclude = exclude or ()
+    with open_source(folder_path) as source:
+        json_files = sorted(source.list_names('.json'), key=extract_number)
+        for i, file_name in enumerate(tqdm(json_files, desc="Processing lab results")):
+            if file_name in exclude:
+                continue
+            try:
+                builder.add_record(start_card_id + i, load_fields(source, file_name, WARD_LIST_FIELDS))
+            except Exception as e:
+                errors.record(file_name, 'lab_store', e)
+    errors.print_summary()
+    store = builder.build()
+    store.attrs['errors'] = errors.summary()
+    return store
@@ -0,0 +1,306 @@
+"""
+Packed corpus format.
+
+A pack stores many small documents in two files:
+- `<name>.pack` - append-only data file with the raw document bytes
+- `<name>.pack.idx` - append-only offset index, one `offset<TAB>length<TAB>name` line per document
+
+Documents are addressed by their file name (e.g. `file_12.json`), so a pack can be
+used wherever a directory of files is expected. Writing a document that already
+exists appends a new copy; the index entry written last wins.
+"""
+import io
+import os
+import mmap
+from src.io.backends import json_loads, json_dumps_compact
+from src.utils.profiling import timed, count
+
+PACK_SUFFIX = '.pack'
+INDEX_SUFFIX = '.idx'
+# Index lines are kept in memory and written, after the data they point to, in batches of this size
+INDEX_BATCH = 1024
+
+
+def is_pack(path):
+    """
+    Checks whether the path points to a pack.
+
+    Args:
+        path: Path to check
+
+    Returns:
+        bool: True if the path has the pack suffix and is not a directory
+    """
+    return str(path).endswith(PACK_SUFFIX) and not os.path.isdir(path)
+
+
+def _read_index(index_path, data_size=None):
+    """
+    Reads the offset index of a pack.
+
+    Args:
+        index_path: Path to the index file
+        data_size: Size of the data file; entries that point past its end
+            (left by an interrupted writer) are dropped
+
+    Returns:
+        dict: Mapping of name -> (offset, length) in insertion order
+    """
+    entries = {}
+    if not os.path.exists(index_path):
+        return entries
+
+    with open(index_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.endswith('\n'):
+                break  # Incomplete last line left by an interrupted writer
+            parts = line.rstrip('\n').split('\t', 2)
+            if len(parts) != 3:
+                continue
+            offset, length, name = int(parts[0]), int(parts[1]), parts[2]
+            if data_size is not None and offset + length > data_size:
+                continue
+            # Re-insert so that a rewritten document moves to its new position
+            entries.pop(name, None)
+            entries[name] = (offset, length)
+    return entries
+
+
+class PackWriter:
+    """
+    Appends documents to a pack.
+
+    Index lines are buffered in memory and only written once the data they point
+    to has been flushed, so the index on disk never points past the end of the data.
+
+    Args:
+        path: Path to the pack data file (should end with `.pack`)
+        resume_state: State returned by `sync`. Data and index are truncated to it,
+            dropping everything written after that checkpoint
+    """
+
+    def __init__(self, path, resume_state=None):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if resume_state is not None:
+            for file_path, size in ((path, resume_state['data_size']), (self.index_path, resume_state['index_size'])):
+                with open(file_path, 'ab') as file:
+                    file.truncate(size)
+
+        self._data = open(path, 'ab')
+        self._index = open(self.index_path, 'a', encoding='utf-8')
+        self._offset = self._data.seek(0, os.SEEK_END)
+        self._pending = []
+
+    def write_bytes(self, name, payload):
+        """
+        Appends raw document bytes under the given name.
+
+        Args:
+            name: Document name (file name it would have in a directory)
+            payload: Document content as bytes
+
+        Returns:
+            int: Number of bytes written
+        """
+        with timed('io.write'):
+            self._data.write(payload)
+            self._pending.append(f"{self._offset}\t{len(payload)}\t{name}\n")
+            if len(self._pending) >= INDEX_BATCH:
+                self._write_index()
+        self._offset += len(payload)
+        count('bytes_written', len(payload))
+        return len(payload)
+
+    def write(self, name, record):
+        """
+        Appends a JSON document under the given name.
+
+        Args:
+            name: Document name
+            record: JSON-serializable object
+
+        Returns:
+            int: Number of bytes written
+        """
+        with timed('json.dump'):
+            payload = json_dumps_compact(record).encode('utf-8')
+        return self.write_bytes(name, payload)
+
+    def _write_index(self):
+        """
+        Flushes the data file, then writes the buffered index lines.
+        """
+        self._data.flush()
+        self._index.writelines(self._pending)
+        self._index.flush()
+        self._pending = []
+
+    def sync(self):
+        """
+        Flushes the data and index files to disk.
+
+        Returns:
+            dict: State to resume from (sizes of the data and index files)
+        """
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        self._write_index()
+        os.fsync(self._index.fileno())
+        return {'data_size': self._offset, 'index_size': self._index.tell()}
+
+    def close(self):
+        """
+        Flushes and closes the data and index files.
+        The data file is flushed first so the index never points past its end.
+        """
+        if self._data.closed:
+            return
+        self._data.flush()
+        os.fsync(self._data.fileno())
+        self._write_index()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PackReader:
+    """
+    Memory-mapped read access to a pack.
+
+    Args:
+        path: Path to the pack data file
+    """
+
+    # Reads are slices of the memory map, safe from several threads (see src.utils.prefetch)
+    concurrent_reads = True
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._entries = _read_index(path + INDEX_SUFFIX, size)
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def names(self):
+        """
+        Returns document names in the order they were written.
+
+        Returns:
+            list: Document names
+        """
+        return list(self._entries)
+
+    def list_names(self, suffix=''):
+        """
+        Returns document names with the given suffix.
+
+        Args:
+            suffix: Name suffix to filter by, e.g. '.json'
+
+        Returns:
+            list: Matching document names
+        """
+        return [name for name in self._entries if name.endswith(suffix)]
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def read_bytes(self, name):
+        """
+        Returns the raw bytes of a document.
+
+        Args:
+            name: Document name
+
+        Returns:
+            bytes: Document content
+
+        Raises:
+            KeyError: If the document is not in the pack
+        """
+        offset, length = self._entries[name]
+        with timed('io.read'):
+            data = self._mmap[offset:offset + length] if length else b''
+        count('bytes_read', length)
+        return data
+
+    def open(self, name):
+        """
+        Opens a document as a binary stream.
+
+        Args:
+            name: Document name
+
+        Returns:
+            io.BytesIO: Stream over the document bytes
+        """
+        return io.BytesIO(self.read_bytes(name))
+
+    def load_json(self, name):
+        """
+        Loads a JSON document from the pack.
+
+        Args:
+            name: Document name
+
+        Returns:
+            Parsed JSON object
+        """
+        data = self.read_bytes(name)
+        with timed('json.load'):
+            return json_loads(data)
+
+    def __iter__(self):
+        """
+        Iterates over (name, bytes) pairs in file order, which reads the data file sequentially.
+        """
+        for name, (offset, length) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            yield name, self._mmap[offset:offset + length] if length else b''
+
+    def close(self):
+        """
+        Releases the memory map and the file handle.
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def pack_directory(directory, pack_path, suffix='.json'):
+    """
+    Packs all files with the given suffix from a directory into a pack.
+
+    Args:
+        directory: Directory with files
+        pack_path: Path of the pack to append to
+        suffix: Suffix of files to pack
+
+    Returns:
+        int: Number of packed files
+    """
+    files = sorted(f for f in os.listdir(directory) if f.endswith(suffix))
+    with PackWriter(pack_path) as writer:
+        for file_name in files:
+            with open(os.path.join(directory, file_name), 'rb') as file:
+                writer.write_bytes(file_name, file.read())
+    return len(files)
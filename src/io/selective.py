@@ -0,0 +1,272 @@
+"""
+Selective JSON loading.
+
+Most consumers of the feature and structured records need a handful of fields,
+but `json.loads` builds the whole document, including the large `ward_list`
+and the anamnesis texts. `select_json` only decodes the values of the
+requested paths.
+
+Documents written with indentation (as `json_dump_pretty` writes them) are not
+scanned token by token. JSON strings cannot contain raw line breaks, so in an
+object whose members are indented by N spaces a line starting with exactly N
+spaces and a quote is one of its keys, and a line with exactly N spaces and a
+closing bracket ends a container value. A requested key is therefore found
+with one byte search in its parent's range, and its value ends at the end of
+its line or at its closing line. Only that byte range is decoded (with the
+JSON backend of src.io.backends); everything else, however large, is never
+turned into objects.
+
+Compact documents (packs, JSON Lines shard records, `json_dumps_compact`
+output) have no such line structure. They are scanned member by member:
+keys are matched as whole strings, and strings, numbers and literals are
+skipped with one regular expression each, so long texts are never decoded.
+The scan stops once all requested keys have been read. A container value
+(object or array) cannot be skipped that cheaply: finding its end needs a
+Python step per bracket, and measured on the structured records that costs
+3-6 times more than decoding the whole document with the C decoders of
+orjson or the json module. So the first container the scan would have to
+skip, or to read as a whole, ends it, and the document is decoded as a whole
+and pruned, which gives the same result. Requests for the leading scalar
+fields of a record (id, sex, birth_date, ...) are answered by the scan;
+requests that need the tables or the ward list are decoded in full. Records
+of one corpus share their key order, so once the scan for a field
+specification has ended at a container, later compact documents are decoded
+in full right away. Documents that fit neither layout are decoded in full as
+well.
+
+The result has the shape of the full document, pruned to the requested paths,
+so code written against `json.load` output keeps working:
+
+    select_json(text, ['id', 'anamnez.disease_history', ('tables', 'final_table1')])
+    -> {'id': ..., 'anamnez': {'disease_history': ...}, 'tables': {'final_table1': ...}}
+
+Paths are dotted strings or tuples of keys. Missing keys are left out.
+"""
+import json
+import re
+
+from src.io.backends import json_loads
+from src.utils.profiling import timed
+
+_INDENT = re.compile(rb'\{\n( +)"')
+_CLOSING = {ord('{'): b'}', ord('['): b']'}
+_NEWLINE = ord('\n')
+_COMMA = ord(',')
+
+# Compact layout: a string, a member up to its value, the end of a number or literal
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_MEMBER = re.compile(rb'\s*("[^"\\]*(?:\\.[^"\\]*)*")\s*:\s*')
+_SCALAR_END = re.compile(rb'[\s,\]}]')
+_SEPARATOR = re.compile(rb'\s*([,}])')
+_OPENING = frozenset(b'[{')
+_QUOTE = ord('"')
+_BRACE = ord('{')
+
+# Compiled field specifications by their tuple of paths
+_compiled_fields = {}
+# Ids of compiled specifications whose compact scan ended at a container (see the module docstring)
+_compact_aborted = set()
+# Byte patterns of a key line: non-ASCII kept as is, or escaped
+_key_patterns = {}
+
+
+class _DecodeAll(Exception):
+    """
+    Raised when a document does not have the layout the byte search relies on.
+    """
+
+
+def compile_fields(fields):
+    """
+    Turns a field specification into a key tree.
+
+    Args:
+        fields: Iterable of paths - dotted strings ('tables.final_table1') or tuples of keys
+
+    Returns:
+        dict: Key -> subtree, None where the whole value is wanted
+    """
+    key = tuple(tuple(path) if not isinstance(path, str) else path for path in fields)
+    tree = _compiled_fields.get(key)
+    if tree is not None:
+        return tree
+    tree = {}
+    for path in key:
+        parts = path.split('.') if isinstance(path, str) else list(path)
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                break  # A shorter path already takes the whole value
+            node = node.setdefault(part, child)
+        else:
+            node[parts[-1]] = None
+    _compiled_fields[key] = tree
+    return tree
+
+
+def _patterns(key):
+    patterns = _key_patterns.get(key)
+    if patterns is None:
+        encodings = dict.fromkeys([json.dumps(key, ensure_ascii=False), json.dumps(key)])
+        patterns = _key_patterns[key] = [encoded.encode('utf-8') + b': ' for encoded in encodings]
+    return patterns
+
+
+def _select_indented(text, start, end, tree, indent, unit):
+    """
+    Reads the requested members of the object in text[start:end], whose members
+    are indented by `indent` spaces (`unit` more per nesting level).
+    """
+    margin = b'\n' + b' ' * indent
+    result = {}
+    for key, subtree in tree.items():
+        for pattern in _patterns(key):
+            position = text.find(margin + pattern, start, end)
+            if position != -1:
+                break
+        else:
+            continue  # Missing key
+        i = position + len(margin) + len(pattern)
+        closing = _CLOSING.get(text[i])
+        if closing is None:
+            # Scalar or string: the value ends with its line
+            value_end = text.find(b'\n', i, end)
+            if value_end == -1:
+                raise _DecodeAll
+            if text[value_end - 1] == _COMMA:
+                value_end -= 1
+        elif text[i + 1:i + 2] == closing:
+            value_end = i + 2
+        elif text[i + 1] == _NEWLINE:
+            value_end = text.find(margin + closing, i, end)
+            if value_end == -1:
+                raise _DecodeAll
+            value_end += len(margin) + 1
+            if subtree is not None and closing == b'}':
+                result[key] = _select_indented(text, i, value_end, subtree, indent + unit, unit)
+                continue
+        else:
+            raise _DecodeAll  # Inline container
+        result[key] = json_loads(text[i:value_end])
+    return result
+
+
+def _skip_compact(text, i):
+    """
+    Returns the end of the string, number or literal starting at text[i].
+    Containers raise _DecodeAll (see the module docstring).
+    """
+    first = text[i]
+    if first == _QUOTE:
+        match = _STRING.match(text, i)
+        if match is None:
+            raise _DecodeAll
+        return match.end()
+    if first in _OPENING:
+        raise _DecodeAll
+    match = _SCALAR_END.search(text, i)
+    return match.start() if match is not None else len(text)
+
+
+def _select_compact(text, i, tree):
+    """
+    Reads the requested members of the compact object starting at text[i].
+
+    Returns:
+        tuple: (result, end of the object, or None if the scan stopped after the last requested key)
+    """
+    result = {}
+    remaining = len(tree)
+    position = i + 1
+    if text[position:position + 1] == b'}':
+        return result, position + 1
+    while True:
+        member = _MEMBER.match(text, position)
+        if member is None:
+            raise _DecodeAll
+        raw_key = member.group(1)
+        key = raw_key[1:-1].decode('utf-8') if b'\\' not in raw_key else json.loads(raw_key)
+        start = member.end()
+        end = None
+        if key in tree and key not in result:
+            subtree = tree[key]
+            if subtree is not None and text[start] == _BRACE:
+                result[key], end = _select_compact(text, start, subtree)
+            else:
+                end = _skip_compact(text, start)
+                result[key] = json_loads(text[start:end])
+            remaining -= 1
+            if not remaining:
+                return result, None
+        if end is None:
+            end = _skip_compact(text, start)
+        separator = _SEPARATOR.match(text, end)
+        if separator is None:
+            raise _DecodeAll
+        position = separator.end()
+        if separator.group(1) == b'}':
+            return result, position
+
+
+def prune(data, tree):
+    """
+    Prunes a decoded document to a key tree (see `compile_fields`).
+    """
+    result = {}
+    for key, subtree in tree.items():
+        if key in data:
+            value = data[key]
+            result[key] = prune(value, subtree) if subtree is not None and isinstance(value, dict) else value
+    return result
+
+
+def select_json(content, fields):
+    """
+    Parses only the requested paths of a JSON object.
+
+    Args:
+        content: JSON document as str or UTF-8 bytes (the top level must be an object)
+        fields: Paths to materialize, see `compile_fields`
+
+    Returns:
+        dict: The document pruned to the requested paths
+    """
+    with timed('json.select'):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        elif not isinstance(content, bytes):
+            content = bytes(content)
+        if content.startswith(b'\xef\xbb\xbf'):
+            content = content[3:]
+        tree = compile_fields(fields)
+        indent = _INDENT.match(content)
+        try:
+            if indent is not None:
+                unit = len(indent.group(1))
+                return _select_indented(content, 0, len(content), tree, unit, unit)
+            if content[:1] == b'{' and tree and id(tree) not in _compact_aborted:
+                try:
+                    return _select_compact(content, 0, tree)[0]
+                except _DecodeAll:
+                    _compact_aborted.add(id(tree))
+        except (_DecodeAll, IndexError, UnicodeDecodeError):
+            pass
+        return prune(json_loads(content), tree)
+
+
+def load_fields(source, name, fields=None):
+    """
+    Loads a record of a source, materializing only the requested paths.
+
+    Args:
+        source: Open source (see src.io.storage)
+        name: Record name
+        fields: Paths to materialize (see `compile_fields`); None loads the whole record
+
+    Returns:
+        dict: Record, pruned to the requested paths
+    """
+    if fields is None:
+        return source.load_json(name)
+    return select_json(source.read_bytes(name), fields)
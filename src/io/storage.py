@@ -0,0 +1,214 @@
+"""
+Uniform access to document collections.
+
+Folder-processing functions read their input through a source and write their
+output through a sink, so the same code works for plain directories, packs,
+JSON Lines shards and (for reading) zip/tar archives.
+"""
+import os
+from src.io.pack import PACK_SUFFIX, INDEX_SUFFIX, is_pack, _read_index, PackReader, PackWriter
+from src.io.jsonl import is_jsonl_shards, JsonlShardSource, JsonlShardWriter
+from src.io.archive import is_archive, ArchiveSource
+from src.io.compression import open_file, strip_compression_suffix, normalize_compression
+from src.io.backends import json_loads, json_dumps_pretty
+from src.utils.profiling import timed, count, counted
+
+TMP_SUFFIX = '.tmp'
+
+
+class DirectorySource:
+    """
+    Reads documents stored as separate files in a directory.
+    Files compressed with gzip, xz or bzip2 (`.json.gz`, `.xml.xz`, ...) are
+    decompressed on the fly.
+
+    Args:
+        directory: Path to the directory
+    """
+
+    # Documents may be read from several threads at once (see src.utils.prefetch)
+    concurrent_reads = True
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def list_names(self, suffix=''):
+        """
+        Returns names of files with the given suffix, ignoring compression suffixes.
+
+        Args:
+            suffix: File name suffix, e.g. '.json' (also matches 'a.json.gz')
+
+        Returns:
+            list: File names in directory listing order
+        """
+        return [f for f in os.listdir(self.directory) if strip_compression_suffix(f).endswith(suffix)]
+
+    def path(self, name):
+        """
+        Returns the full path of a document.
+        """
+        return os.path.join(self.directory, name)
+
+    def open(self, name):
+        """
+        Opens a document as a decompressed binary stream.
+        """
+        return counted(open_file(self.path(name), 'rb'))
+
+    def read_bytes(self, name):
+        """
+        Returns the (decompressed) bytes of a document.
+        """
+        with timed('io.read'), open_file(self.path(name), 'rb') as file:
+            data = file.read()
+        count('bytes_read', len(data))
+        return data
+
+    def load_json(self, name):
+        """
+        Loads a JSON document.
+        """
+        data = self.read_bytes(name)
+        with timed('json.load'):
+            return json_loads(data)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class DirectorySink:
+    """
+    Writes each document to its own file in a directory.
+
+    Args:
+        directory: Path to the output directory
+        compress: None/False, True (gzip), 'gz', 'xz' or 'bz2'. The compression
+            suffix is appended to every written file name
+    """
+
+    def __init__(self, directory, compress=None):
+        self.directory = directory
+        self.suffix = normalize_compression(compress)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        """
+        Returns the full path of a document, including the compression suffix.
+        """
+        return os.path.join(self.directory, name + self.suffix)
+
+    def write(self, name, record):
+        """
+        Writes a JSON document.
+
+        Args:
+            name: File name
+            record: JSON-serializable object
+
+        Returns:
+            int: Number of uncompressed bytes written
+        """
+        with timed('json.dump'):
+            payload = json_dumps_pretty(record).encode('utf-8')
+        # Write under a temporary name, so an interrupted run never leaves a truncated document
+        # (the compression suffix stays last, so the temporary file is compressed the same way)
+        tmp_path = os.path.join(self.directory, name + TMP_SUFFIX + self.suffix)
+        with timed('io.write'):
+            with open_file(tmp_path, 'wb') as file:
+                file.write(payload)
+            os.replace(tmp_path, self.path(name))
+        count('bytes_written', len(payload))
+        return len(payload)
+
+    def sync(self):
+        """
+        Every document is closed after writing, so there is nothing to flush.
+
+        Returns:
+            dict: Empty state - documents written after a checkpoint are simply rewritten on resume
+        """
+        return {}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_source(path):
+    """
+    Opens a document collection for reading.
+
+    Args:
+        path: Directory, pack path, directory with JSON Lines shards or zip/tar archive
+
+    Returns:
+        DirectorySource, PackReader, JsonlShardSource or ArchiveSource: Source object
+    """
+    if is_pack(path):
+        return PackReader(path)
+    if is_archive(path) and not os.path.isdir(path):
+        return ArchiveSource(path)
+    if is_jsonl_shards(path):
+        return JsonlShardSource(path)
+    return DirectorySource(path)
+
+
+def open_sink(path, output_format='json', shard_size=10000, compress=False, resume_state=None):
+    """
+    Opens a document collection for writing.
+    Paths ending with `.pack` are written as a pack, anything else as a directory.
+
+    Args:
+        path: Output directory or pack path
+        output_format: 'json' - one indented file per document,
+            'jsonl' - compact JSON Lines shards in the output directory
+        shard_size: Records per shard for the 'jsonl' format
+        compress: None/False, True (gzip), 'gz', 'xz' or 'bz2' - compression of
+            the written files or shards (packs are not compressed)
+        resume_state: State returned by the sink's `sync()` at a checkpoint; output
+            written after it is discarded (see src.io.checkpoint)
+
+    Returns:
+        DirectorySink, PackWriter or JsonlShardWriter: Sink object
+    """
+    if output_format not in ('json', 'jsonl'):
+        raise ValueError("output_format must be 'json' or 'jsonl'")
+    if str(path).endswith(PACK_SUFFIX):
+        return PackWriter(path, resume_state=resume_state)
+    if output_format == 'jsonl':
+        return JsonlShardWriter(path, shard_size=shard_size, compress=compress, resume_state=resume_state)
+    return DirectorySink(path, compress=compress)
+
+
+def existing_names(path, output_format='json'):
+    """
+    Returns the names of documents already written to an output, for incremental runs.
+
+    Args:
+        path: Output directory or pack path
+        output_format: 'json' or 'jsonl', as passed to `open_sink`
+
+    Returns:
+        set: Document names (without compression suffixes); empty if the output does not exist
+    """
+    if str(path).endswith(PACK_SUFFIX):
+        data_size = os.path.getsize(path) if os.path.exists(path) else 0
+        return set(_read_index(path + INDEX_SUFFIX, data_size))
+    if not os.path.isdir(path):
+        return set()
+    if output_format == 'jsonl':
+        return set(JsonlShardSource(path).list_names())
+    names = (strip_compression_suffix(f) for f in os.listdir(path))
+    return {name for name in names if not name.endswith(TMP_SUFFIX)}
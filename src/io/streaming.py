@@ -0,0 +1,221 @@
+"""
+Streaming (generator) API for the processing pipeline.
+
+The folder functions (`process_files_in_directory`, `save_features`,
+`process_folder_to_structured_format`, the table builders of
+src.io.dataset_process) run one stage over a whole folder, and the next stage
+starts from its output on disk. The generators here pass one document at a
+time through any chain of stages instead:
+
+    with open_sink('out/structured') as sink:
+        for name, record in iter_structured(iter_features(iter_documents('data/xml'))):
+            sink.write(name, record)
+
+    rows = iter_table_rows(iter_structured(iter_features(iter_documents('data/xml'))), 'patients')
+    patients = pd.DataFrame(rows)
+
+Every generator takes the next item from its input only when its own consumer
+asks for the next result, so a chain holds one document at a time, however
+large the corpus, and a slow consumer slows reading down instead of letting
+results pile up in memory.
+
+Items are (name, value) pairs, the name being the document name (the `.json`
+name for converted XML documents, as `process_files_in_directory` writes
+them). By default the first failing document raises; with an ErrorCollector
+(src.utils.errors) failures are recorded under the stage names of the folder
+functions and the document is skipped.
+"""
+import os
+from contextlib import contextmanager
+
+from src.io.data_processor import extract_features, process_data_to_structured_format
+from src.io.dataset_process import (PATIENT_FIELDS, WARD_LIST_FIELDS, extract_number, patient_row,
+                                    ward_list_rows)
+from src.io.file_converter import _convert_document, _output_name
+from src.io.selective import load_fields
+from src.io.storage import open_source
+from src.utils.lazy import lazy_import
+from src.utils.profiling import timed
+
+pd = lazy_import('pandas')
+
+# Tables of `iter_table_rows` besides 'patients' and 'ward_list' (keys of a structured record's 'tables')
+RECORD_TABLES = ('table_gosp', 'diagnosis', 'ward_table', 'final_table1', 'final_table2')
+# Error stages of the table builders
+TABLE_STAGES = {'patients': 'patients_table', 'ward_list': 'ward_list_table'}
+
+
+@contextmanager
+def _opened(source):
+    """
+    Yields an open source for a path (closing it afterwards) or an already open source.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open_source(source) as opened:
+            yield opened
+    else:
+        yield source
+
+
+def _handle(errors, name, stage, exc):
+    """
+    Raises the exception of a failed document, or records it if there is a collector.
+    """
+    if errors is None:
+        raise exc
+    errors.record(name, stage, exc)
+
+
+def iter_documents(source, names=None, errors=None):
+    """
+    Parses the XML documents of a source one at a time.
+
+    Args:
+        source: Path (folder, archive, pack or JSON Lines shards, see src.io.storage) or open source
+        names: Document names to parse, in order; all '.xml' documents if None
+        errors: Optional ErrorCollector; failed documents are recorded and skipped instead of raising
+
+    Yields:
+        tuple: (JSON name, document dictionary)
+    """
+    with _opened(source) as opened:
+        if names is None:
+            names = opened.list_names('.xml')
+        for name in names:
+            try:
+                data = _convert_document(opened, name)
+            except Exception as e:
+                _handle(errors, name, 'xml_to_json', e)
+                continue
+            yield _output_name(name), data
+
+
+def iter_records(source, names=None, fields=None, errors=None):
+    """
+    Loads the JSON records of a source one at a time (converted documents,
+    feature or structured records written by the folder functions).
+
+    Args:
+        source: Path or open source (see src.io.storage)
+        names: Record names to load, in order; all '.json' records sorted by number if None
+        fields: Paths to materialize (see src.io.selective); None loads whole records
+        errors: Optional ErrorCollector; failed records are recorded and skipped instead of raising
+
+    Yields:
+        tuple: (name, record)
+    """
+    with _opened(source) as opened:
+        if names is None:
+            names = sorted(opened.list_names('.json'), key=extract_number)
+        for name in names:
+            try:
+                record = load_fields(opened, name, fields)
+            except Exception as e:
+                _handle(errors, name, 'load', e)
+                continue
+            yield name, record
+
+
+def iter_features(documents, errors=None):
+    """
+    Extracts the features of documents one at a time (see `extract_features`).
+
+    Args:
+        documents: Iterable of (name, document dictionary), e.g. `iter_documents(...)`
+        errors: Optional ErrorCollector; failed documents are recorded and skipped instead of raising
+
+    Yields:
+        tuple: (name, feature record)
+    """
+    for name, data in documents:
+        try:
+            with timed('stage.extract_features'):
+                features = extract_features(data)
+        except Exception as e:
+            _handle(errors, name, 'extract_features', e)
+            continue
+        yield name, features
+
+
+def iter_structured(features, errors=None):
+    """
+    Converts feature records to the structured format one at a time
+    (see `process_data_to_structured_format`).
+
+    Args:
+        features: Iterable of (name, feature record), e.g. `iter_features(...)`
+        errors: Optional ErrorCollector; failed records are recorded and skipped instead of raising
+
+    Yields:
+        tuple: (name, structured record)
+    """
+    for name, data in features:
+        try:
+            with timed('stage.structured_format'):
+                record = process_data_to_structured_format(data)
+        except Exception as e:
+            _handle(errors, name, 'structured_format', e)
+            continue
+        yield name, record
+
+
+def table_fields(table):
+    """
+    Returns the paths of a structured record that `iter_table_rows` reads for a table,
+    to pass as `fields` of `iter_records`.
+
+    Args:
+        table: 'patients', 'ward_list' or one of RECORD_TABLES
+
+    Returns:
+        tuple: Paths (see src.io.selective)
+    """
+    if table == 'patients':
+        return PATIENT_FIELDS
+    if table == 'ward_list':
+        return WARD_LIST_FIELDS
+    if table in RECORD_TABLES:
+        return (f'tables.{table}',)
+    raise ValueError(f"table must be 'patients', 'ward_list' or one of {RECORD_TABLES}")
+
+
+def iter_table_rows(records, table='patients', start_card_id=0, start_id=0, errors=None):
+    """
+    Builds table rows from structured records one record at a time.
+
+    The rows are those of the table builders of src.io.dataset_process
+    (`create_patients_table`, `create_ward_list_table`, and `create_table_generic`
+    with the accessors of the pipeline's 'tables' stage), so `pd.DataFrame(rows)`
+    gives the same table. The id_card of a record is its position in `records`
+    plus `start_card_id`; documents skipped by earlier generators do not take a
+    position.
+
+    Args:
+        records: Iterable of (name, structured record), e.g. `iter_structured(...)` or `iter_records(...)`
+        table: 'patients', 'ward_list' or one of RECORD_TABLES
+        start_card_id: ID of the first patient card
+        start_id: First entry ID of 'ward_list', first table ID of the RECORD_TABLES (column '<table>_id')
+        errors: Optional ErrorCollector; failed records are recorded and skipped instead of raising
+
+    Yields:
+        dict: Table row
+    """
+    table_fields(table)  # Raises ValueError for unknown tables
+    next_id = start_id
+    for position, (name, data) in enumerate(records):
+        id_card = start_card_id + position
+        try:
+            if table == 'patients':
+                rows = [patient_row(data, id_card, name)]
+            elif table == 'ward_list':
+                rows = ward_list_rows(data, id_card, name, next_id)
+                next_id += len(rows)
+            else:
+                rows = pd.DataFrame.from_dict(data['tables'][table]).to_dict('records')
+                for row in rows:
+                    row.update({'id_card': id_card, f'{table}_id': next_id, 'source_file': name})
+                next_id += bool(rows)
+        except Exception as e:
+            _handle(errors, name, TABLE_STAGES.get(table, 'table_generic'), e)
+            continue
+        yield from rows
@@ -0,0 +1,324 @@
+"""
+Typed, memory-compact dataset tables.
+
+`create_patients_table` builds every column from Python objects, so each value
+of `sex` or `treatment_result` is a separate string object, and `birth_date`
+stays the raw HL7 string. The typed mode converts such a table:
+
+- `birth_date` becomes datetime64 (parsed with src.utils.dates, unparsable values become NaT);
+- low-cardinality fields become categoricals whose category lists come from a
+  `SharedCategories` dictionary, so the codes of a value are the same in every
+  table and batch typed with it;
+- repeated free text (anamnesis, complaints) is interned, so equal texts are
+  stored once.
+
+Values of the final table fields are lists of the selected options; in the
+typed table they are joined with '; '.
+
+`table_memory` measures what a table really holds: object values shared by
+several cells are counted once (`DataFrame.memory_usage(deep=True)` counts
+them per cell, which would hide the effect of interning).
+"""
+import json
+import os
+import sys
+from itertools import chain
+
+from src.utils.dates import parse_dates, age_in_years, days_between
+from src.utils.lazy import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+# Low-cardinality columns of the patients table, stored as categoricals
+PATIENT_CATEGORICAL_COLUMNS = ('sex', 'type_gosp', 'way_gosp', 'condition_state', 'disease_character',
+                               'hospitalization_outcome', 'treatment_result', 'cancer_suspicion', 'individual_post')
+# Free-text columns of the patients table, interned
+PATIENT_TEXT_COLUMNS = ('disease_history', 'life_history', 'condition_complaints', 'objective_status')
+# Date columns of the patients table, parsed to datetime64
+PATIENT_DATE_COLUMNS = ('birth_date',)
+# Columns of table_gosp with the dates of the stay
+ADMISSION_COLUMN = 'Дата поступления'
+DISCHARGE_COLUMN = 'Дата выписки'
+
+LIST_SEPARATOR = '; '
+
+
+def _scalar(value):
+    """
+    Turns a list of selected options into one string; other values are kept.
+    """
+    if isinstance(value, (list, tuple)):
+        return LIST_SEPARATOR.join(str(item) for item in value) if value else None
+    return value
+
+
+def _factorize(values):
+    """
+    Returns (codes, distinct values) of a column; -1 marks missing values.
+    """
+    values = np.asarray(values, dtype=object)
+    try:
+        return pd.factorize(values)
+    except TypeError:
+        # Lists are not hashable; factorize them as tuples (joined per distinct value by the callers)
+        hashable = np.empty(len(values), dtype=object)
+        hashable[:] = [tuple(value) if type(value) is list else value for value in values]
+        return pd.factorize(hashable)
+
+
+class SharedCategories:
+    """
+    Category dictionaries shared by typed tables.
+
+    Every column has an append-only list of categories: a value keeps the code it
+    got first, and new values are appended. Tables of several batches typed with
+    the same dictionaries therefore agree on all codes; `align` gives them
+    identical category lists, so they can be concatenated without losing the
+    categorical dtype.
+
+    Args:
+        path: Optional JSON file with the dictionaries; loaded if it exists, written by `save`
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.categories = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.categories = json.load(file)
+        self._codes = {column: {value: code for code, value in enumerate(values)}
+                       for column, values in self.categories.items()}
+
+    def categorical(self, column, values):
+        """
+        Encodes values of a column, extending its dictionary with new values.
+
+        Args:
+            column: Column name (the dictionary to use)
+            values: Iterable of values; None and NaN become missing
+
+        Returns:
+            pd.Categorical: Values with the column's full category list
+        """
+        known = self._codes.setdefault(column, {})
+        categories = self.categories.setdefault(column, [])
+        local_codes, uniques = _factorize(values)
+        # Map the codes of the distinct values to the shared codes
+        shared = np.empty(len(uniques) + 1, dtype=np.int32)
+        shared[-1] = -1
+        for i, value in enumerate(uniques):
+            value = _scalar(value)
+            if value is None:
+                # An empty list of options
+                shared[i] = -1
+                continue
+            code = known.get(value)
+            if code is None:
+                code = known[value] = len(categories)
+                categories.append(value)
+            shared[i] = code
+        return pd.Categorical.from_codes(shared[local_codes], categories=pd.Index(categories, dtype=object))
+
+    def align(self, df):
+        """
+        Gives the categorical columns of a table the current category lists.
+        Codes do not change, since dictionaries only grow.
+
+        Args:
+            df: Table typed with these dictionaries
+
+        Returns:
+            pd.DataFrame: The same table with aligned categories
+        """
+        df = df.copy()
+        for column, categories in self.categories.items():
+            if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = pd.Categorical.from_codes(df[column].cat.codes.to_numpy(),
+                                                       categories=pd.Index(categories, dtype=object))
+        return df
+
+    def save(self, path=None):
+        """
+        Writes the dictionaries as JSON.
+
+        Args:
+            path: Target file (default: the path given to the constructor)
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path to save the categories to")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.categories, file, ensure_ascii=False, indent=2)
+
+
+def intern_strings(values):
+    """
+    Interns the strings of a column, so equal texts share one object.
+
+    Args:
+        values: Iterable of values
+
+    Returns:
+        pd.Series: Object series with interned strings; other values are kept
+    """
+    codes, uniques = _factorize(values)
+    distinct = np.empty(len(uniques) + 1, dtype=object)
+    for i, value in enumerate(uniques):
+        value = _scalar(value)
+        distinct[i] = sys.intern(value) if type(value) is str else value
+    distinct[-1] = None
+    return pd.Series(distinct[codes], dtype=object)
+
+
+def _as_dates(column):
+    """
+    Returns a column as datetime64[s] values, parsing it unless it already holds dates.
+    """
+    if column.dtype.kind == 'M':
+        return column.to_numpy().astype('datetime64[s]')
+    return parse_dates(column.to_numpy(dtype=object))
+
+
+class _ObjectCounter:
+    """
+    Sums the sizes of distinct objects by identity, across columns.
+    """
+
+    def __init__(self):
+        self.seen = np.empty(0, dtype=np.int64)
+        self.alive = []  # Keeps counted objects alive, so their ids are not reused
+
+    def size(self, values):
+        """
+        Bytes of the objects among values (and of the items of lists) not counted before.
+        """
+        values = np.asarray(values, dtype=object)
+        if not len(values):
+            return 0
+        self.alive.append(values)
+        ids, first = np.unique(np.fromiter(map(id, values), dtype=np.int64, count=len(values)),
+                               return_index=True)
+        new = ~np.isin(ids, self.seen, assume_unique=True)
+        self.seen = np.union1d(self.seen, ids[new])
+        objects = values[first[new]]
+        total = sum(map(sys.getsizeof, objects))
+        nested = [value for value in objects if type(value) in (list, tuple)]
+        if nested:
+            items = np.empty(sum(map(len, nested)), dtype=object)
+            items[:] = list(chain.from_iterable(nested))
+            total += self.size(items)
+        return total
+
+
+def table_memory(df):
+    """
+    Measures the memory of a table, counting every distinct object once.
+
+    Args:
+        df: DataFrame
+
+    Returns:
+        dict: {'total': bytes, 'columns': {column: bytes}}
+    """
+    counter = _ObjectCounter()
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories.to_numpy(dtype=object)
+            size = series.cat.codes.to_numpy().nbytes + categories.nbytes + counter.size(categories)
+        elif series.dtype.kind in 'biufcmM':
+            size = series.to_numpy().nbytes
+        else:
+            values = series.to_numpy(dtype=object)
+            size = values.nbytes + counter.size(values)
+        columns[column] = size
+    columns['index'] = df.index.memory_usage()
+    return {'total': sum(columns.values()), 'columns': columns}
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def type_patients_table(df, categories=None, report=True):
+    """
+    Converts a patients table (see create_patients_table) to the typed, compact form.
+
+    Args:
+        df: Patients table
+        categories: SharedCategories to encode the categorical columns with (new dictionaries if None)
+        report: Print the memory before and after
+
+    Returns:
+        pd.DataFrame: Typed table; attrs['memory'] holds the byte counts before and after
+            (see `table_memory`), other attrs are kept
+    """
+    categories = categories if categories is not None else SharedCategories()
+    before = table_memory(df)
+
+    typed = df.copy()
+    for column in PATIENT_DATE_COLUMNS:
+        if column in typed.columns:
+            typed[column] = _as_dates(typed[column])
+    for column in PATIENT_CATEGORICAL_COLUMNS:
+        if column in typed.columns:
+            typed[column] = categories.categorical(column, typed[column].to_numpy(dtype=object))
+    for column in PATIENT_TEXT_COLUMNS:
+        if column in typed.columns:
+            typed[column] = intern_strings(typed[column].to_numpy(dtype=object)).set_axis(typed.index)
+
+    after = table_memory(typed)
+    typed.attrs['memory'] = {'before': before['total'], 'after': after['total']}
+    if report:
+        saved = 1 - after['total'] / before['total'] if before['total'] else 0
+        print(f"Patients table memory: {_format_bytes(before['total'])} -> {_format_bytes(after['total'])} "
+              f"({saved:.0%} less)")
+    return typed
+
+
+def add_stay_columns(patients, table_gosp):
+    """
+    Adds the dates of the stay and the derived measures to a patients table:
+    admission_date and discharge_date (datetime64, from table_gosp),
+    age_at_admission (completed years) and length_of_stay (days), as float64
+    NumPy columns with NaN where a date is missing.
+
+    All dates are parsed column-wise (see src.utils.dates). If a card has
+    several rows in table_gosp, the earliest admission and the latest discharge
+    are used.
+
+    Args:
+        patients: Patients table (see create_patients_table), plain or typed
+        table_gosp: Table of the 'table_gosp' tables (create_table_generic, or tables/table_gosp.csv
+            of the pipeline) with id_card and the admission/discharge columns
+
+    Returns:
+        pd.DataFrame: Copy of the patients table with the four columns added
+    """
+    stays = pd.DataFrame({
+        'id_card': table_gosp['id_card'].to_numpy(),
+        'admission_date': _as_dates(table_gosp[ADMISSION_COLUMN]) if ADMISSION_COLUMN in table_gosp
+        else np.full(len(table_gosp), np.datetime64('NaT'), dtype='datetime64[s]'),
+        'discharge_date': _as_dates(table_gosp[DISCHARGE_COLUMN]) if DISCHARGE_COLUMN in table_gosp
+        else np.full(len(table_gosp), np.datetime64('NaT'), dtype='datetime64[s]'),
+    })
+    stays = stays.groupby('id_card').agg({'admission_date': 'min', 'discharge_date': 'max'})
+    stays = stays.reindex(patients['id_card'].to_numpy())
+
+    result = patients.copy()
+    admission = stays['admission_date'].to_numpy().astype('datetime64[s]')
+    discharge = stays['discharge_date'].to_numpy().astype('datetime64[s]')
+    result['admission_date'] = admission
+    result['discharge_date'] = discharge
+    result['age_at_admission'] = age_in_years(_as_dates(patients['birth_date']), admission)
+    result['length_of_stay'] = days_between(admission, discharge)
+    return result
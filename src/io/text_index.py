@@ -0,0 +1,456 @@
+"""
+Persisted full-text inverted index over the anamnesis and condition texts.
+
+`filter_dataframe_by_patterns` runs a regular expression over every text of
+the patients table for every query. `TextIndex` tokenizes and stems the
+texts once (see src.utils.text) and keeps, per term, the sorted array of its
+occurrences, each encoded as one int64:
+
+    id_card << 24 | field << 20 | position
+
+so a term query is one array lookup, AND/OR are intersections and unions of
+sorted id_card arrays, and a phrase matches where the occurrences of its
+terms follow each other (the keys of the n-th term, minus n, intersect).
+Queries return sorted id_card arrays:
+
+    index = create_text_index('structured', 'tables/text_index')
+    index.search('одышка AND (кашель OR "боли за грудиной")')
+    index.search('курит', fields=['life_history'])
+
+The index is updated incrementally: `add` buffers the texts of new (or
+changed) cards, and `commit` writes them as a new segment. Each segment is a
+compressed NumPy archive, listed in `index.json` in the order written; a
+card in a later segment replaces its entries in the earlier ones. `compact`
+merges all segments into one.
+"""
+import json
+import os
+import re
+from itertools import chain
+
+from src.io.dataset_process import extract_number, patient_row
+from src.io.selective import load_fields
+from src.io.storage import open_source
+from src.utils.errors import ErrorCollector
+from src.utils.lazy import lazy_import, lazy_function
+from src.utils.profiling import timed
+from src.utils.text import normalize
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+tqdm = lazy_function('tqdm', 'tqdm')
+
+# Text columns of the patients table that are indexed, in field code order
+TEXT_FIELDS = ('disease_history', 'life_history', 'condition_complaints', 'objective_status')
+# Paths of the structured records read for the TEXT_FIELDS (see src.io.selective)
+TEXT_RECORD_FIELDS = ('anamnez.disease_history', 'anamnez.life_history', 'conditions.Жалобы',
+                      'conditions.Объективный статус')
+
+_FIELD_SHIFT = 20
+_CARD_SHIFT = 24
+_MAX_POSITION = (1 << _FIELD_SHIFT) - 1
+_FORMAT_VERSION = 1
+
+_QUERY_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+
+
+class _Segment:
+    """
+    Immutable part of the index: sorted terms, and the sorted occurrence keys of
+    the i-th term at keys[offsets[i]:offsets[i + 1]]. `cards` are the cards it holds.
+    """
+
+    def __init__(self, terms, offsets, keys, cards, file_name=None):
+        self.terms = terms
+        self.offsets = offsets
+        self.keys = keys
+        self.cards = cards
+        self.file_name = file_name
+        self._codes = {term: code for code, term in enumerate(terms)}
+
+    @classmethod
+    def build(cls, terms, keys, cards):
+        """
+        Builds a segment from parallel arrays of terms and occurrence keys.
+        """
+        codes, uniques = pd.factorize(np.asarray(terms, dtype=object), sort=True)
+        order = np.lexsort((keys, codes))
+        offsets = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        return cls(np.asarray(uniques, dtype=object), offsets.astype(np.int64), keys[order],
+                   np.unique(np.asarray(cards, dtype=np.int64)))
+
+    def occurrences(self, term):
+        """
+        Returns the sorted occurrence keys of a term.
+        """
+        code = self._codes.get(term)
+        if code is None:
+            return self.keys[:0]
+        return self.keys[self.offsets[code]:self.offsets[code + 1]]
+
+    def expanded(self):
+        """
+        Returns (terms, keys) with one term per key.
+        """
+        return np.repeat(self.terms, np.diff(self.offsets)), self.keys
+
+    def without(self, cards):
+        """
+        Returns the segment without the entries of the given cards.
+        """
+        if not len(cards) or not np.isin(self.cards, cards).any():
+            return self
+        terms, keys = self.expanded()
+        keep = ~np.isin(keys >> _CARD_SHIFT, cards)
+        segment = _Segment.build(terms[keep], keys[keep], self.cards[~np.isin(self.cards, cards)])
+        segment.file_name = self.file_name
+        return segment
+
+    def save(self, path):
+        """
+        Writes the segment. The keys of every term are stored as gaps to the
+        previous key, which compress far better than the keys themselves.
+        """
+        starts = self.offsets[:-1][np.diff(self.offsets) > 0]
+        gaps = np.diff(self.keys, prepend=self.keys[:1])
+        gaps[starts] = 0
+        if len(gaps) and gaps.max() < 1 << 32:
+            gaps = gaps.astype(np.uint32)
+        np.savez_compressed(path, terms=np.asarray(self.terms, dtype=str), offsets=self.offsets,
+                            first_keys=self.keys[starts], gaps=gaps, cards=self.cards)
+
+    @classmethod
+    def load(cls, path, file_name):
+        with np.load(path, allow_pickle=False) as archive:
+            offsets = archive['offsets']
+            counts = np.diff(offsets)
+            keys = np.cumsum(archive['gaps'].astype(np.int64))
+            starts = offsets[:-1][counts > 0]
+            keys += np.repeat(archive['first_keys'] - keys[starts], counts[counts > 0])
+            return cls(archive['terms'].astype(object), offsets, keys, archive['cards'], file_name)
+
+
+def _batch(cards, texts):
+    """
+    Tokenizes the texts of cards into parallel (terms, keys) arrays. Every
+    distinct text is normalized once; its terms are copied to the cards that
+    have it with array indexing.
+
+    Args:
+        cards: Array-like of id_card
+        texts: Dict field -> array-like of texts aligned with cards
+
+    Returns:
+        tuple: (object array of terms, int64 array of keys, int64 array of cards)
+    """
+    cards = np.asarray(cards, dtype=np.int64)
+    terms, keys = [np.empty(0, dtype=object)], [np.empty(0, dtype=np.int64)]
+    for field_code, field in enumerate(TEXT_FIELDS):
+        if field not in texts:
+            continue
+        codes, uniques = pd.factorize(np.asarray(texts[field], dtype=object))
+        term_lists = [normalize(text if isinstance(text, str) else None)[:_MAX_POSITION + 1] for text in uniques]
+        # Missing texts (code -1) take the appended empty entry
+        lengths = np.array([len(text_terms) for text_terms in term_lists] + [0], dtype=np.int64)
+        starts = np.append(np.cumsum(lengths[:-1]) - lengths[:-1], 0)
+        flat = np.empty(int(lengths.sum()), dtype=object)
+        flat[:] = list(chain.from_iterable(term_lists))
+
+        row_lengths = lengths[codes]
+        positions = np.arange(int(row_lengths.sum())) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+        terms.append(flat[np.repeat(starts[codes], row_lengths) + positions])
+        keys.append(np.repeat(cards << _CARD_SHIFT, row_lengths) | field_code << _FIELD_SHIFT | positions)
+    return np.concatenate(terms), np.concatenate(keys), cards
+
+
+def _parse_query(query):
+    """
+    Parses a query into a tree of ('or', [...]), ('and', [...]) and ('phrase', [terms]) nodes.
+    OR binds weaker than AND; adjacent terms are joined with AND.
+    """
+    tokens = _QUERY_TOKEN.findall(query)
+    position = 0
+
+    def expression():
+        nonlocal position
+        branches = [conjunction()]
+        while position < len(tokens) and tokens[position] == 'OR':
+            position += 1
+            branches.append(conjunction())
+        return ('or', branches)
+
+    def conjunction():
+        nonlocal position
+        parts = []
+        while position < len(tokens) and tokens[position] not in ('OR', ')'):
+            token = tokens[position]
+            position += 1
+            if token == 'AND':
+                continue
+            if token == '(':
+                parts.append(expression())
+                if position >= len(tokens) or tokens[position] != ')':
+                    raise ValueError(f"Unbalanced parentheses in query: {query!r}")
+                position += 1
+                continue
+            terms = normalize(token.strip('"'))
+            if terms:
+                parts.append(('phrase', terms))
+        if not parts:
+            raise ValueError(f"Empty operand in query: {query!r}")
+        return ('and', parts)
+
+    tree = expression()
+    if position != len(tokens):
+        raise ValueError(f"Unbalanced parentheses in query: {query!r}")
+    return tree
+
+
+class TextIndex:
+    """
+    Inverted index over the TEXT_FIELDS of patient cards (see the module docstring).
+
+    Args:
+        path: Optional index directory; an existing index is loaded, and `commit` writes to it
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.segments = []
+        self._pending = []
+        # Texts of the cards passed to `add` since the last batch, by id_card (the last add of a card wins)
+        self._added = {}
+        self._next_segment = 1
+        if path and os.path.exists(os.path.join(path, 'index.json')):
+            with open(os.path.join(path, 'index.json'), 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            if meta.get('version') != _FORMAT_VERSION or tuple(meta.get('fields', ())) != TEXT_FIELDS:
+                raise ValueError(f"Incompatible text index at {path}")
+            self._next_segment = meta['next_segment']
+            for file_name in meta['segments']:
+                self._append(_Segment.load(os.path.join(path, file_name), file_name))
+
+    def _append(self, segment):
+        """
+        Adds a segment, dropping its cards from the earlier segments.
+        """
+        self.segments = [older.without(segment.cards) for older in self.segments]
+        self.segments.append(segment)
+
+    def add(self, id_card, texts):
+        """
+        Adds a card, replacing its earlier entries. Searchable at once; persisted by `commit`.
+
+        Args:
+            id_card: ID of the patient card
+            texts: Dict field -> text for the TEXT_FIELDS (missing fields and None are empty)
+        """
+        self._added.pop(id_card, None)
+        self._added[id_card] = texts
+
+    def _batch_added(self):
+        """
+        Tokenizes the cards passed to `add` since the last batch as one pending batch.
+        """
+        if self._added:
+            texts = list(self._added.values())
+            self._pending.append(_batch(list(self._added), {field: [card_texts.get(field) for card_texts in texts]
+                                                            for field in TEXT_FIELDS}))
+            self._added = {}
+
+    def add_table(self, df):
+        """
+        Adds the cards of a patients table (see create_patients_table), plain or typed.
+        If a card has several rows, the last one is used.
+
+        Args:
+            df: Table with id_card and the TEXT_FIELDS columns
+        """
+        df = df.drop_duplicates('id_card', keep='last')
+        self._batch_added()
+        self._pending.append(_batch(df['id_card'].to_numpy(), {field: df[field].to_numpy(dtype=object)
+                                                               for field in TEXT_FIELDS if field in df.columns}))
+
+    def _flush(self):
+        """
+        Turns the pending cards into an (unsaved) segment; of a card added several
+        times, the last texts are kept.
+        """
+        self._batch_added()
+        if not self._pending:
+            return
+        with timed('text_index.flush'):
+            terms = np.concatenate([batch_terms for batch_terms, _, _ in self._pending])
+            keys = np.concatenate([batch_keys for _, batch_keys, _ in self._pending])
+            cards = np.concatenate([batch_cards for _, _, batch_cards in self._pending])
+            if len(self._pending) > 1:
+                # The cards of a batch are distinct: a card's entries come from the last batch that has it
+                batch_sizes = [len(batch_cards) for _, _, batch_cards in self._pending]
+                card_batches = np.repeat(np.arange(len(self._pending)), batch_sizes)
+                key_batches = np.repeat(np.arange(len(self._pending)),
+                                        [len(batch_keys) for _, batch_keys, _ in self._pending])
+                cards, last = np.unique(cards[::-1], return_index=True)
+                winners = cards * len(self._pending) + card_batches[::-1][last]
+                keep = np.isin((keys >> _CARD_SHIFT) * len(self._pending) + key_batches, winners)
+                terms, keys = terms[keep], keys[keep]
+            self._append(_Segment.build(terms, keys, cards))
+            self._pending = []
+
+    def commit(self):
+        """
+        Writes the cards added since the last commit as a new segment
+        (nothing to do for an index without a path).
+        """
+        self._flush()
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        for segment in self.segments:
+            if segment.file_name is None:
+                segment.file_name = f'segment_{self._next_segment:06d}.npz'
+                self._next_segment += 1
+                segment.save(os.path.join(self.path, segment.file_name))
+        self._write_meta()
+
+    def _write_meta(self):
+        """
+        Atomically replaces index.json.
+        """
+        meta = {'version': _FORMAT_VERSION, 'fields': list(TEXT_FIELDS), 'next_segment': self._next_segment,
+                'segments': [segment.file_name for segment in self.segments]}
+        tmp_path = os.path.join(self.path, 'index.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, os.path.join(self.path, 'index.json'))
+
+    def compact(self):
+        """
+        Merges all segments into one (written, and the old files removed, if the index has a path).
+        """
+        self._flush()
+        if len(self.segments) < 2:
+            return
+        parts = [segment.expanded() for segment in self.segments]
+        merged = _Segment.build(np.concatenate([terms for terms, _ in parts]),
+                                np.concatenate([keys for _, keys in parts]),
+                                np.concatenate([segment.cards for segment in self.segments]))
+        old_files = [segment.file_name for segment in self.segments if segment.file_name]
+        self.segments = [merged]
+        if self.path:
+            self.commit()
+            for file_name in old_files:
+                os.remove(os.path.join(self.path, file_name))
+
+    @property
+    def cards(self):
+        """
+        np.ndarray: Sorted id_card of all indexed cards
+        """
+        self._flush()
+        if not self.segments:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([segment.cards for segment in self.segments]))
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _phrase(self, segment, terms, field_codes):
+        """
+        Returns the sorted cards of a segment where the terms occur in sequence in one field.
+        """
+        matches = segment.occurrences(terms[0])
+        for offset, term in enumerate(terms[1:], start=1):
+            if not len(matches):
+                break
+            matches = np.intersect1d(matches, segment.occurrences(term) - offset, assume_unique=True)
+        if field_codes is not None:
+            matches = matches[np.isin((matches >> _FIELD_SHIFT) & 0xF, field_codes)]
+        cards = matches >> _CARD_SHIFT
+        # Keys are sorted, so equal cards are adjacent
+        return cards[np.append(True, cards[1:] != cards[:-1])] if len(cards) else cards
+
+    def _evaluate(self, segment, node, field_codes):
+        kind, parts = node
+        if kind == 'phrase':
+            return self._phrase(segment, parts, field_codes)
+        result = self._evaluate(segment, parts[0], field_codes)
+        for part in parts[1:]:
+            if kind == 'and':
+                if not len(result):
+                    break
+                result = np.intersect1d(result, self._evaluate(segment, part, field_codes), assume_unique=True)
+            else:
+                result = np.union1d(result, self._evaluate(segment, part, field_codes))
+        return result
+
+    def search(self, query, fields=None):
+        """
+        Finds the cards matching a query. Words are matched by their stems
+        (src.utils.text), so 'боль' also finds 'боли' and 'болями'.
+
+        Query syntax: words, "quoted phrases" (words in this order, in one field),
+        AND (also implied between adjacent operands), OR (binds weaker than AND)
+        and parentheses, e.g. 'одышка AND (кашель OR "боли за грудиной")'.
+
+        Args:
+            query: Query string
+            fields: Only search these of the TEXT_FIELDS (all if None)
+
+        Returns:
+            np.ndarray: Sorted id_card of the matching cards
+
+        Raises:
+            ValueError: If the query is malformed or names an unknown field
+        """
+        field_codes = None
+        if fields is not None:
+            unknown = set(fields) - set(TEXT_FIELDS)
+            if unknown:
+                raise ValueError(f"Unknown text fields: {sorted(unknown)}; expected some of {TEXT_FIELDS}")
+            field_codes = [TEXT_FIELDS.index(field) for field in fields]
+        tree = _parse_query(query)
+        self._flush()
+        with timed('text_index.search'):
+            results = [self._evaluate(segment, tree, field_codes) for segment in self.segments]
+        if not results:
+            return np.empty(0, dtype=np.int64)
+        # A card is held by one segment only
+        return np.sort(np.concatenate(results))
+
+
+def create_text_index(folder_path, index_path=None, start_card_id=0, errors=None, exclude=None):
+    """
+    Indexes the texts of the structured records of a folder. The id_card of a
+    record is its position among the records, as in the tables of
+    src.io.dataset_process. With an existing index at index_path, the records are
+    added to it (cards indexed before are replaced), e.g. for a new batch with
+    its own start_card_id.
+
+    Args:
+        folder_path: Path to the folder (or pack) with JSON files
+        index_path: Index directory to load and commit to (an in-memory index if None)
+        start_card_id: ID of the first patient card
+        errors: Collector for errors of individual files (a new one if None)
+        exclude: Names of files to leave out; the other files keep the id_card of their position
+
+    Returns:
+        TextIndex: The index
+    """
+    errors = errors if errors is not None else ErrorCollector()
+    index = TextIndex(index_path)
+    exclude = exclude or ()
+    with open_source(folder_path) as source:
+        json_files = sorted(source.list_names('.json'), key=extract_number)
+        for i, file_name in enumerate(tqdm(json_files, desc="Indexing texts")):
+            if file_name in exclude:
+                continue
+            try:
+                row = patient_row(load_fields(source, file_name, TEXT_RECORD_FIELDS), start_card_id + i, file_name)
+                index.add(row['id_card'], row)
+            except Exception as e:
+                errors.record(file_name, 'text_index', e)
+    errors.print_summary()
+    index.commit()
+    return index
@@ -8,38 +8,46 @@ This module provides parsers for:
 - Laboratory test results
 - Final medical reports
 """
+from src.utils.lazy import lazy_exports
 
-# Base parser functionality
-from src.parsers.base_parser import get_full_path, SUB_PATH
+# Re-exports are imported on first access, so importing the package stays cheap
+_EXPORTS = {
+    # Base parser functionality
+    'get_full_path': 'src.parsers.base_parser',
+    'SUB_PATH': 'src.parsers.base_parser',
+    'get_document_id': 'src.parsers.base_parser',
+    # Section layout resolution
+    'resolve_layout': 'src.parsers.layout',
+    'document_layout': 'src.parsers.layout',
+    'layout_fingerprint': 'src.parsers.layout',
+    'layout_cache_info': 'src.parsers.layout',
+    'clear_layout_cache': 'src.parsers.layout',
+    # Patient data parsers
+    'get_sex': 'src.parsers.patient_parser',
+    'get_age': 'src.parsers.patient_parser',
+    'get_id': 'src.parsers.patient_parser',
+    'get_amnez_d': 'src.parsers.patient_parser',
+    'get_amnez_life': 'src.parsers.patient_parser',
+    'get_condition': 'src.parsers.patient_parser',
+    'parse_conditions_as_key_value': 'src.parsers.patient_parser',
+    'get_structured_condition': 'src.parsers.patient_parser',
+    # Hospitalization data parsers
+    'get_gosp_info': 'src.parsers.hosp_parser',
+    'get_diagnosis': 'src.parsers.hosp_parser',
+    # Ward/department data parsers
+    'get_ward_table': 'src.parsers.ward_parser',
+    'get_ward_list': 'src.parsers.ward_parser',
+    'get_ward_name': 'src.parsers.ward_parser',
+    'get_research_list': 'src.parsers.ward_parser',
+    'get_research_name': 'src.parsers.ward_parser',
+    'get_research_table': 'src.parsers.ward_parser',
+    'compute_full_wards': 'src.parsers.ward_parser',
+    # Final report parsers
+    'get_final_table1': 'src.parsers.final_parser',
+    'get_final_table2': 'src.parsers.final_parser',
+    # Laboratory data parsers
+    'get_table_1': 'src.parsers.lab_parser',
+}
 
-# Patient data parsers
-from src.parsers.patient_parser import (
-    get_sex,
-    get_age,
-    get_id,
-    get_amnez_d,
-    get_amnez_life,
-    get_condition,
-    parse_conditions_as_key_value,
-    get_structured_condition
-)
-
-# Hospitalization data parsers
-from src.parsers.hosp_parser import get_gosp_info, get_diagnosis
-
-# Ward/department data parsers
-from src.parsers.ward_parser import (
-    get_ward_table,
-    get_ward_list,
-    get_ward_name,
-    get_research_list,
-    get_research_name,
-    get_research_table,
-    compute_full_wards
-)
-
-# Final report parsers
-from src.parsers.final_parser import get_final_table1, get_final_table2
-
-# Laboratory data parsers
-from src.parsers.lab_parser import get_table_1 
\ No newline at end of file
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
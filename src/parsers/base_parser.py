@@ -16,4 +16,21 @@ def get_full_path(short_path):
     Returns:
         list: Full path to the section
     """
-    return SUB_PATH + short_path 
\ No newline at end of file
+    return SUB_PATH + short_path 
+
+def get_document_id(data):
+    """
+    Extracts the document ID from data.
+
+    Args:
+        data: Document JSON data
+
+    Returns:
+        str or None: Document ID extension, None if the document has no ID
+    """
+    section_fields = find_section_by_optimized_path(data, ['id'])
+    if isinstance(section_fields, list):
+        section_fields = section_fields[0]
+    if not isinstance(section_fields, dict):
+        return None
+    return section_fields.get('extension')
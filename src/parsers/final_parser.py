@@ -4,6 +4,7 @@ Parser for final tables.
 from src.utils.helpers import find_section_by_optimized_path
 from src.utils.table_utils import parse_table_2
 from src.parsers.base_parser import SUB_PATH
+from src.parsers.layout import section_index
 
 
 def get_final_table1(data, type='table'):
@@ -17,7 +18,7 @@ def get_final_table1(data, type='table'):
     Returns:
         DataFrame or dict: Final table 1
     """
-    short_path_to_section = ['component', 4, 
+    short_path_to_section = ['component', section_index(data, 'final'), 
                             'section', 
                             'text']
 
@@ -38,7 +39,7 @@ def get_final_table2(data, type='table'):
     Returns:
         DataFrame or dict: Final table 2
     """
-    short_path_to_section = ['component', 4,
+    short_path_to_section = ['component', section_index(data, 'final'),
                             'section',
                             'component', 
                             'section', 'text']
@@ -4,6 +4,7 @@ Parser for hospitalization information.
 from src.utils.helpers import find_section_by_optimized_path
 from src.utils.table_utils import parse_table, parse_table_2, parse_table_wtheader
 from src.parsers.base_parser import SUB_PATH
+from src.parsers.layout import entry_index, section_index
 
 
 def get_gosp_info(data, type='table'):
@@ -24,14 +25,14 @@ def get_gosp_info(data, type='table'):
     if type == 'table':
         table = parse_table(section_fields)
 
-    short_path_to_section = ['entry', 2, 
+    short_path_to_section = ['entry', entry_index(data, 'hosp_type'), 
                             'observation', 
                             'value']
     
     section_fields = find_section_by_optimized_path(data, SUB_PATH + short_path_to_section)
     type_gosp = section_fields['displayName']
 
-    short_path_to_section = ['entry', 3, 
+    short_path_to_section = ['entry', entry_index(data, 'hosp_way'), 
                             'observation', 
                             'value']
     
@@ -51,7 +52,7 @@ def get_diagnosis(data, type='table'):
     Returns:
         DataFrame or dict: Diagnosis table
     """
-    short_path_to_section = ['component', 1, 
+    short_path_to_section = ['component', section_index(data, 'condition'), 
                             'section', 
                             'component', 
                             'section', 
@@ -0,0 +1,220 @@
+"""
+Section layout resolution for parsers.
+
+The parsers address sections by position (e.g. the final tables are
+`component[4]`, the hospitalization type is `entry[2]`). Templates of
+different hospitals may order the sections differently, so the positions are
+resolved per document layout instead of being hard-coded:
+
+1. The layout fingerprint of a document is the sequence of section codes and
+   titles of the structured body components, plus the observation codes of
+   its entries.
+2. On the first document with a given fingerprint each logical field is
+   searched by code (or by a title keyword), falling back to the standard
+   position when nothing matches.
+3. The resolved positions are kept in a bounded LRU cache by fingerprint, so
+   every later document of the same template costs one dictionary lookup.
+
+Documents without section codes or titles resolve to the standard positions.
+Inside `document_layout(data)` the layout of the document is resolved once
+for all the parsers called on it; outside, every call computes the
+fingerprint again. No reference to a document is kept after its block ends.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from src.parsers.base_parser import SUB_PATH
+from src.utils.helpers import find_section_by_optimized_path
+from src.utils.profiling import count
+
+PREFIX = '{urn:hl7-org:v3}'
+
+# Structured body sections: field -> (standard position, section codes, lowercase title keywords)
+SECTION_FIELDS = {
+    'disease_anamnesis': (0, ('ANAM',), ('анамнез заболевания',)),
+    'condition': (1, ('STATECUR',), ('состояние при поступлении', 'объективный статус')),
+    'life_anamnesis': (2, ('LANAM',), ('анамнез жизни',)),
+    'departments': (3, ('DEPART',), ('отделени',)),
+    'final': (4, ('SUM',), ('итоги госпитализации', 'исход госпитализации')),
+}
+
+# Observation entries of the structured body: field -> (standard position, observation codes)
+ENTRY_FIELDS = {
+    'hosp_type': (2, ('4003',)),
+    'hosp_way': (3, ('4004',)),
+}
+
+# Fingerprints include section titles, so the number of distinct layouts is not bounded by the templates
+LAYOUT_CACHE_SIZE = 1024
+
+# Resolved positions by layout fingerprint, least recently used first
+_layouts = OrderedDict()
+_stats = {'hits': 0, 'misses': 0}
+# The document of the active `document_layout` block and its positions
+_current = (None, None)
+
+
+def _code(element):
+    code = element.get(PREFIX + 'code') if isinstance(element, dict) else None
+    return code.get('code') if isinstance(code, dict) else None
+
+
+def _title(section):
+    title = section.get(PREFIX + 'title')
+    if isinstance(title, dict):  # Element text is stored under 'text' (see src.io.file_converter)
+        title = title.get('text')
+    return title if isinstance(title, str) else None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def layout_fingerprint(data):
+    """
+    Computes the layout fingerprint of a document.
+
+    Args:
+        data: Document JSON data
+
+    Returns:
+        tuple: ((section code, title) per component, observation code per entry)
+    """
+    body = find_section_by_optimized_path(data, SUB_PATH)
+    if not isinstance(body, dict):
+        return (), ()
+    sections = []
+    for component in _as_list(body.get(PREFIX + 'component')):
+        section = component.get(PREFIX + 'section') if isinstance(component, dict) else None
+        sections.append((_code(section), _title(section)) if isinstance(section, dict) else (None, None))
+    entries = []
+    for entry in _as_list(body.get(PREFIX + 'entry')):
+        observation = entry.get(PREFIX + 'observation') if isinstance(entry, dict) else None
+        entries.append(_code(observation))
+    return tuple(sections), tuple(entries)
+
+
+def _find(items, codes, keywords=()):
+    """
+    Returns the position of the first item matching a code, then of the first
+    title containing a keyword, or None.
+    """
+    for i, (code, _) in enumerate(items):
+        if code in codes:
+            return i
+    for i, (_, title) in enumerate(items):
+        if title and any(keyword in title.lower() for keyword in keywords):
+            return i
+    return None
+
+
+def _resolve(fingerprint):
+    sections, entries = fingerprint
+    positions = {}
+    for field, (default, codes, keywords) in SECTION_FIELDS.items():
+        found = _find(sections, codes, keywords)
+        positions[field] = default if found is None else found
+    entry_items = [(code, None) for code in entries]
+    for field, (default, codes) in ENTRY_FIELDS.items():
+        found = _find(entry_items, codes)
+        positions[field] = default if found is None else found
+    return positions
+
+
+def resolve_layout(data):
+    """
+    Returns the positions of the logical fields in a document.
+
+    Args:
+        data: Document JSON data
+
+    Returns:
+        dict: Field name (see SECTION_FIELDS and ENTRY_FIELDS) -> position
+    """
+    current_data, positions = _current
+    if current_data is data:
+        return positions
+
+    fingerprint = layout_fingerprint(data)
+    positions = _layouts.get(fingerprint)
+    if positions is None:
+        positions = _layouts[fingerprint] = _resolve(fingerprint)
+        if len(_layouts) > LAYOUT_CACHE_SIZE:
+            _layouts.popitem(last=False)
+        _stats['misses'] += 1
+        count('layout.misses')
+    else:
+        _layouts.move_to_end(fingerprint)
+        _stats['hits'] += 1
+        count('layout.hits')
+    return positions
+
+
+@contextmanager
+def document_layout(data):
+    """
+    Resolves the layout of a document once for all the parsers called inside the block.
+
+    Args:
+        data: Document JSON data
+
+    Yields:
+        dict: Field name -> position, as returned by `resolve_layout`
+    """
+    global _current
+    previous = _current
+    positions = resolve_layout(data)
+    _current = (data, positions)
+    try:
+        yield positions
+    finally:
+        _current = previous
+
+
+def section_index(data, field):
+    """
+    Returns the component position of a structured body section.
+
+    Args:
+        data: Document JSON data
+        field: Key of SECTION_FIELDS
+
+    Returns:
+        int: Position in the structured body component list
+    """
+    return resolve_layout(data)[field]
+
+
+def entry_index(data, field):
+    """
+    Returns the position of a structured body observation entry.
+
+    Args:
+        data: Document JSON data
+        field: Key of ENTRY_FIELDS
+
+    Returns:
+        int: Position in the structured body entry list
+    """
+    return resolve_layout(data)[field]
+
+
+def layout_cache_info():
+    """
+    Returns statistics of the layout cache.
+
+    Returns:
+        dict: {'layouts': number of cached fingerprints, 'maxsize': int, 'hits': int, 'misses': int}
+    """
+    return {'layouts': len(_layouts), 'maxsize': LAYOUT_CACHE_SIZE, **_stats}
+
+
+def clear_layout_cache():
+    """
+    Forgets all resolved layouts and resets the statistics.
+    """
+    global _current
+    _layouts.clear()
+    _stats.update(hits=0, misses=0)
+    _current = (None, None)
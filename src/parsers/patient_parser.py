@@ -3,6 +3,7 @@ Parser for patient information.
 """
 from src.utils.helpers import find_section_by_optimized_path
 from src.parsers.base_parser import SUB_PATH
+from src.parsers.layout import section_index
 
 
 def get_sex(data):
@@ -31,7 +32,7 @@ def get_age(data):
         data: Document JSON data
         
     Returns:
-        str: Patient birth date
+        str: Patient birth date as the raw HL7 TS value (parse columns of them with src.utils.dates)
     """
     short_path_to_section = ['recordTarget', 
                             'patientRole', 
@@ -68,7 +69,7 @@ def get_amnez_d(data):
     Returns:
         str: Disease anamnesis
     """
-    short_path_to_section = ['component', 0, 
+    short_path_to_section = ['component', section_index(data, 'disease_anamnesis'), 
                             'section', 
                             'text']
     
@@ -85,7 +86,7 @@ def get_amnez_life(data):
     Returns:
         str: Life anamnesis
     """
-    short_path_to_section = ['component', 2,
+    short_path_to_section = ['component', section_index(data, 'life_anamnesis'),
                             'section', 
                             'text']
     
@@ -102,7 +103,7 @@ def get_condition(data):
     Returns:
         list: Patient condition
     """
-    short_path_to_section = ['component', 1, 
+    short_path_to_section = ['component', section_index(data, 'condition'), 
                             'section', 
                             'text', 
                             'content']
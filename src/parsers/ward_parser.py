@@ -4,6 +4,7 @@ Parser for department information.
 from src.utils.helpers import find_section_by_optimized_path
 from src.utils.table_utils import parse_table, parse_table_2, parse_table_wtheader
 from src.parsers.base_parser import SUB_PATH
+from src.parsers.layout import section_index
 
 
 def get_ward_table(data, type='table'):
@@ -17,7 +18,7 @@ def get_ward_table(data, type='table'):
     Returns:
         DataFrame or dict: Department table
     """
-    short_path_to_section = ['component', 3, 
+    short_path_to_section = ['component', section_index(data, 'departments'), 
                             'section', 
                             'text']
 
@@ -37,7 +38,7 @@ def get_ward_list(data):
     Returns:
         list: List of departments
     """
-    short_path_to_section = ['component', 3, 
+    short_path_to_section = ['component', section_index(data, 'departments'), 
                             'section', 
                             'component']
 
@@ -0,0 +1,399 @@
+"""
+In-memory document service.
+
+`parse_document` turns the bytes of one CDA document into the structured record
+(or the feature record / raw dictionary) without touching the disk.
+`DocumentPool` runs it in warm worker processes, and `serve` exposes the pool
+over a local HTTP server that groups concurrent requests into batches and
+reports latency percentiles.
+
+Usage:
+    python -m src.service [--host 127.0.0.1] [--port 8080] [--workers 4]
+        [--batch-size 16] [--batch-wait-ms 2]
+
+Endpoints:
+    POST /parse[?stage=structured|features|json]  body: XML document -> JSON record
+    GET  /stats                                   request counts, batch sizes and latency percentiles
+    GET  /health
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from src.io.backends import json_dumps_compact
+from src.io.data_processor import extract_features, process_data_to_structured_format
+from src.io.file_converter import xml_to_dict
+from src.parsers.layout import clear_layout_cache
+from src.utils.errors import error_location
+from src.utils.lazy import lazy_function
+
+ProcessPoolExecutor = lazy_function('concurrent.futures', 'ProcessPoolExecutor')
+
+PARSE_STAGES = ('json', 'features', 'structured')
+
+
+def parse_document(xml_data, stage='structured'):
+    """
+    Parses one CDA document fully in memory.
+
+    Args:
+        xml_data: XML document as bytes or str
+        stage: 'json' - document dictionary, 'features' - output of `extract_features`,
+            'structured' - output of `process_data_to_structured_format`
+
+    Returns:
+        dict: Record of the requested stage
+    """
+    if stage not in PARSE_STAGES:
+        raise ValueError(f"stage must be one of {PARSE_STAGES}")
+    record = xml_to_dict(xml_data)
+    if stage == 'json':
+        return record
+    record = extract_features(record)
+    if stage == 'features':
+        return record
+    return process_data_to_structured_format(record)
+
+
+def warm_up():
+    """
+    Imports the lazily loaded dependencies and runs one synthetic document through
+    every stage, so that the first real request does not pay for imports and
+    path compilation.
+    """
+    from src.utils.synthetic_cda import generate_document
+
+    parse_document(generate_document(0).encode('utf-8'))
+
+
+def _error_record(exc):
+    """
+    Describes a failed parse for the caller.
+    """
+    parser = getattr(exc, 'failed_call', None)
+    return {
+        'error_type': type(exc).__name__,
+        'message': str(exc),
+        'parser': parser[len('parser.'):] if parser and parser.startswith('parser.') else parser,
+        'location': error_location(exc),
+    }
+
+
+def parse_batch(documents, stage='structured'):
+    """
+    Parses several documents, returning an outcome for each instead of raising.
+
+    Args:
+        documents: List of XML documents (bytes or str)
+        stage: See `parse_document`
+
+    Returns:
+        list: (record, error) pairs - error is None or a dict with error_type, message, parser, location
+    """
+    outcomes = []
+    for xml_data in documents:
+        try:
+            outcomes.append((parse_document(xml_data, stage), None))
+        except Exception as e:
+            outcomes.append((None, _error_record(e)))
+    # Long-running workers start every batch with an empty layout cache
+    clear_layout_cache()
+    return outcomes
+
+
+class DocumentPool:
+    """
+    Pool of warm worker processes for `parse_document`.
+
+    Args:
+        workers: Number of worker processes; 0 parses in the calling process
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._executor = None
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up)
+            # Start all workers now instead of on the first requests
+            for future in [self._executor.submit(time.sleep, 0) for _ in range(workers)]:
+                future.result()
+        else:
+            warm_up()
+
+    def submit_batch(self, documents, stage='structured'):
+        """
+        Parses a batch of documents in one worker.
+
+        Args:
+            documents: List of XML documents
+            stage: See `parse_document`
+
+        Returns:
+            concurrent.futures.Future: Resolves to the result of `parse_batch`
+        """
+        if self._executor is None:
+            future = Future()
+            future.set_result(parse_batch(documents, stage))
+            return future
+        return self._executor.submit(parse_batch, documents, stage)
+
+    def parse(self, xml_data, stage='structured'):
+        """
+        Parses one document in a worker.
+
+        Returns:
+            dict: Record of the requested stage
+
+        Raises:
+            ValueError: If the document cannot be parsed
+        """
+        record, error = self.submit_batch([xml_data], stage).result()[0]
+        if error is not None:
+            raise ValueError(f"{error['error_type']}: {error['message']}")
+        return record
+
+    def parse_many(self, documents, stage='structured', batch_size=16):
+        """
+        Parses many documents, spreading batches over all workers.
+
+        Returns:
+            list: (record, error) pairs in input order
+        """
+        futures = [self.submit_batch(documents[i:i + batch_size], stage)
+                   for i in range(0, len(documents), batch_size)]
+        return [outcome for future in futures for outcome in future.result()]
+
+    def close(self):
+        """
+        Shuts the worker processes down.
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class LatencyTracker:
+    """
+    Keeps the latencies of the most recent requests and reports percentiles.
+
+    Args:
+        window: Number of recent requests to keep
+    """
+
+    def __init__(self, window=10000):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def add(self, seconds, failed=False):
+        with self._lock:
+            self._latencies.append(seconds)
+            self.requests += 1
+            self.errors += failed
+
+    def percentiles(self, points=(50, 90, 99)):
+        """
+        Returns latency percentiles in milliseconds.
+
+        Returns:
+            dict: {'p50': ..., 'p90': ..., 'p99': ..., 'max': ...}, empty if there were no requests
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return {}
+        result = {f'p{p}': round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 3)
+                  for p in points}
+        result['max'] = round(latencies[-1] * 1000, 3)
+        return result
+
+
+class RequestBatcher:
+    """
+    Groups concurrent requests into batches for the pool.
+
+    A batch is sent when it has `batch_size` documents or when `batch_wait`
+    seconds have passed since its first document arrived.
+
+    Args:
+        pool: DocumentPool
+        batch_size: Maximum documents per batch
+        batch_wait: Maximum time to wait for more documents, in seconds
+    """
+
+    def __init__(self, pool, batch_size=16, batch_wait=0.002):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.batches = 0
+        self.batched_documents = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, xml_data, stage='structured'):
+        """
+        Queues a document.
+
+        Returns:
+            concurrent.futures.Future: Resolves to a (record, error) pair
+        """
+        future = Future()
+        self._queue.put((xml_data, stage, future))
+        return future
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Stop after this batch
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        self.batches += 1
+        self.batched_documents += len(batch)
+        # One pool task per stage in the batch
+        by_stage = {}
+        for item in batch:
+            by_stage.setdefault(item[1], []).append(item)
+        for stage, items in by_stage.items():
+            pool_future = self.pool.submit_batch([xml_data for xml_data, _, _ in items], stage)
+            pool_future.add_done_callback(lambda done, items=items: self._resolve(done, items))
+
+    @staticmethod
+    def _resolve(pool_future, items):
+        try:
+            outcomes = pool_future.result()
+        except Exception as e:
+            outcomes = [(None, _error_record(e))] * len(items)
+        for (_, _, future), outcome in zip(items, outcomes):
+            future.set_result(outcome)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+def _make_handler(batcher, tracker):
+    class DocumentHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True  # Headers and body are separate writes
+
+        def _send(self, status, payload):
+            body = payload.encode('utf-8') if isinstance(payload, str) else payload
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == '/health':
+                self._send(200, '{"status":"ok"}')
+            elif path == '/stats':
+                self._send(200, json.dumps({
+                    'requests': tracker.requests,
+                    'errors': tracker.errors,
+                    'batches': batcher.batches,
+                    'mean_batch_size': round(batcher.batched_documents / batcher.batches, 2) if batcher.batches else 0,
+                    'latency_ms': tracker.percentiles(),
+                }))
+            else:
+                self._send(404, '{"error":"not found"}')
+
+        def do_POST(self):
+            start = time.perf_counter()
+            url = urlparse(self.path)
+            if url.path != '/parse':
+                self._send(404, '{"error":"not found"}')
+                return
+            stage = parse_qs(url.query).get('stage', ['structured'])[0]
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            if stage not in PARSE_STAGES:
+                self._send(400, json.dumps({'error': f"stage must be one of {PARSE_STAGES}"}))
+                return
+
+            record, error = batcher.submit(body, stage).result()
+            if error is None:
+                self._send(200, json_dumps_compact(record))
+            else:
+                self._send(422, json.dumps({'error': error}, ensure_ascii=False))
+            tracker.add(time.perf_counter() - start, failed=error is not None)
+
+        def log_message(self, format, *args):
+            pass  # Per-request logging would dominate the latency
+
+    return DocumentHandler
+
+
+def serve(host='127.0.0.1', port=8080, workers=2, batch_size=16, batch_wait=0.002, ready=None):
+    """
+    Runs the HTTP document service until interrupted.
+
+    Args:
+        host: Interface to bind (local only by default)
+        port: Port to listen on (0 picks a free port)
+        workers: Worker processes; 0 parses in the server process
+        batch_size: Maximum documents per batch
+        batch_wait: Maximum time a request waits for others to fill its batch, in seconds
+        ready: Optional callback called with the bound (host, port) once the server accepts requests
+    """
+    with DocumentPool(workers) as pool:
+        batcher = RequestBatcher(pool, batch_size, batch_wait)
+        tracker = LatencyTracker()
+        server = ThreadingHTTPServer((host, port), _make_handler(batcher, tracker))
+        server.daemon_threads = True
+        if ready is not None:
+            ready(server.server_address[:2])
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            batcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m src.service', description="Local HTTP document parsing service")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to bind")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes (0 - parse in the server process)")
+    parser.add_argument('--batch-size', type=int, default=16, help="Maximum documents per batch")
+    parser.add_argument('--batch-wait-ms', type=float, default=2.0, help="Maximum wait for a batch to fill")
+    args = parser.parse_args(argv)
+
+    def ready(address):
+        print(f"Serving on http://{address[0]}:{address[1]} with {args.workers} workers", flush=True)
+
+    serve(args.host, args.port, args.workers, args.batch_size, args.batch_wait_ms / 1000, ready)
+
+
+if __name__ == '__main__':
+    main()
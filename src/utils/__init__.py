@@ -4,26 +4,43 @@ Module with utilities for data parsing and analysis.
 This module provides:
 - Tools for analyzing JSON data
 - Table parsing and manipulation utilities
+- Vectorized parsing of HL7 timestamps and table dates
+- Tokenization and stemming of Russian text
 - Helper functions for data exploration
 """
+from src.utils.lazy import lazy_exports
 
-# Table utilities
-from src.utils.table_utils import (
-    parse_table,
-    parse_table_2,
-    parse_table_wtheader,
-    convert_table_to_dataframe,
-    safe_parse_table,
-    save_table_as_dict,
-    build_dataframe_from_jsons
-)
+# Re-exports are imported on first access, so importing the package stays cheap
+_EXPORTS = {
+    # Table utilities
+    'parse_table': 'src.utils.table_utils',
+    'parse_table_2': 'src.utils.table_utils',
+    'parse_table_wtheader': 'src.utils.table_utils',
+    'convert_table_to_dataframe': 'src.utils.table_utils',
+    'safe_parse_table': 'src.utils.table_utils',
+    'save_table_as_dict': 'src.utils.table_utils',
+    'parse_table_as_dict': 'src.utils.table_utils',
+    'TableCache': 'src.utils.table_utils',
+    'table_cache': 'src.utils.table_utils',
+    'table_cache_info': 'src.utils.table_utils',
+    'build_dataframe_from_jsons': 'src.utils.table_utils',
+    # Dates
+    'parse_hl7_ts': 'src.utils.dates',
+    'parse_dates': 'src.utils.dates',
+    'age_in_years': 'src.utils.dates',
+    'days_between': 'src.utils.dates',
+    # Text normalization
+    'tokenize': 'src.utils.text',
+    'normalize': 'src.utils.text',
+    'stem': 'src.utils.text',
+    # Helper functions
+    'find_section_by_optimized_path': 'src.utils.helpers',
+    'clean_keys': 'src.utils.helpers',
+    # Data analysis utilities
+    'analyze_json_values': 'src.utils.analysis_utils',
+    'plot_value_distribution': 'src.utils.analysis_utils',
+    'find_files_with_value': 'src.utils.analysis_utils',
+}
 
-# Helper functions
-from src.utils.helpers import find_section_by_optimized_path, clean_keys
-
-# Data analysis utilities
-from src.utils.analysis_utils import (
-    analyze_json_values,
-    plot_value_distribution,
-    find_files_with_value
-) 
\ No newline at end of file
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -4,45 +4,51 @@ Module with utilities for JSON data analysis.
 import os
 import json
 from collections import Counter
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-from tqdm import tqdm
+from src.utils.lazy import lazy_import, lazy_function
 
-def analyze_json_values(directory, value_expression, handle_lists=False):
+storage = lazy_import('src.io.storage')
+selective = lazy_import('src.io.selective')
+pd = lazy_import('pandas')
+plt = lazy_import('matplotlib.pyplot')
+np = lazy_import('numpy')
+tqdm = lazy_function('tqdm', 'tqdm')
+
+def analyze_json_values(directory, value_expression, handle_lists=False, fields=None):
     """
     Extracts values from JSON files and returns a DataFrame with their distribution.
 
     Args:
-        directory (str): Path to directory with JSON files.
+        directory (str): Path to directory (or pack) with JSON files.
         value_expression (str): Python expression to extract value from the `data` variable.
         handle_lists (bool): If True, handles list values by counting each item in the list separately.
+        fields (list, optional): Paths the expression reads, e.g. ['tables.final_table1']. Only these
+            are loaded from each file (see src.io.selective); None loads whole files.
 
     Returns:
         pd.DataFrame: Table with columns ["Value", "Count"].
     """
     value_counts = Counter()
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
+    source = storage.open_source(directory)
+    json_files = source.list_names('.json')
 
     for filename in tqdm(json_files, desc="Processing files"):
-        filepath = os.path.join(directory, filename)
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                value = eval(value_expression)
-                
-                if handle_lists and isinstance(value, list):
-                    # Count each item in the list separately
-                    for item in value:
-                        if item is not None:  # Skip None values
-                            value_counts[item] += 1
-                else:
-                    # Handle as a single value
-                    if value is not None:  # Skip None values
-                        value_counts[value] += 1
-                        
+            data = selective.load_fields(source, filename, fields)
+            value = eval(value_expression)
+            
+            if handle_lists and isinstance(value, list):
+                # Count each item in the list separately
+                for item in value:
+                    if item is not None:  # Skip None values
+                        value_counts[item] += 1
+            else:
+                # Handle as a single value
+                if value is not None:  # Skip None values
+                    value_counts[value] += 1
+                    
         except Exception as e:
             print(f"Error in file {filename}: {e}")
+    source.close()
 
     df = pd.DataFrame(value_counts.items(), columns=['Value', 'Count']).sort_values(by='Count', ascending=False)
     return df
@@ -81,30 +87,31 @@ def plot_value_distribution(df, title='Value distribution', num_bins=None):
     plt.tight_layout()
     plt.show()
 
-def find_files_with_value(directory, value_expression, target_value):
+def find_files_with_value(directory, value_expression, target_value, fields=None):
     """
     Returns a list of files where the value from the eval expression equals the target value.
 
     Args:
-        directory (str): Path to directory with JSON files.
+        directory (str): Path to directory (or pack) with JSON files.
         value_expression (str): Python expression to extract value from the `data` variable.
         target_value (any): Value to find.
+        fields (list, optional): Paths the expression reads; only these are loaded (see `analyze_json_values`).
 
     Returns:
         list of str: Filenames where the value matches.
     """
     matching_files = []
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
+    source = storage.open_source(directory)
+    json_files = source.list_names('.json')
 
     for filename in tqdm(json_files, desc="Searching files"):
-        filepath = os.path.join(directory, filename)
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                value = eval(value_expression)
-                if value == target_value:
-                    matching_files.append(filename)
+            data = selective.load_fields(source, filename, fields)
+            value = eval(value_expression)
+            if value == target_value:
+                matching_files.append(filename)
         except Exception as e:
             print(f"Error in file {filename}: {e}")
+    source.close()
 
     return matching_files 
\ No newline at end of file
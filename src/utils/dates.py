@@ -0,0 +1,244 @@
+"""
+Vectorized date parsing for HL7 timestamps and the dates of document tables.
+
+CDA documents carry dates as HL7 TS values, `YYYY[MM[DD[HH[MM[SS[.S[S[S[S]]]]]]]]][+/-ZZzz]`,
+of any precision (`birthTime` is usually `YYYYMMDD`), while the tables of the
+text sections use `dd.mm.yyyy` (`table_gosp`) or the HL7 form, and typed
+tables written to CSV by pandas come back with ISO `yyyy-mm-dd` dates. The
+functions here parse whole columns at once: the strings are converted to a
+fixed-width array, viewed as a matrix of character codes, and the date fields
+are read from it with array arithmetic, so no Python code runs per value.
+
+Missing precision is filled with the start of the period (`1950` is
+1950-01-01 00:00:00). Fractions of a second and time zone offsets are
+ignored, so times are local times of the document; an offset must still be a
+sign and exactly four digits at the end of the value. Values that match no
+format, or name a date that does not exist (2023-02-30), become NaT.
+"""
+from src.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# Precision of an HL7 TS by its number of leading digits
+HL7_PRECISIONS = {4: 'year', 6: 'month', 8: 'day', 10: 'hour', 12: 'minute', 14: 'second'}
+
+_WIDTH = 24  # Longest HL7 TS: 14 digits, a 4-digit fraction and a time zone
+_DIGIT_0 = ord('0')
+
+
+def _char_codes(values):
+    """
+    Returns the character codes of the values as an (n, _WIDTH) matrix, zero-padded,
+    with the mask of digits and the digit values. Values that are not strings are
+    converted with str (None does not match any format).
+    """
+    text = np.char.strip(np.asarray(values, dtype=object).ravel().astype(f'U{_WIDTH + 1}'))
+    codes = text.astype(f'U{_WIDTH}').view(np.uint32).reshape(len(text), _WIDTH)
+    # Only ASCII characters are part of the formats; anything else becomes DEL
+    codes = np.minimum(codes, 0x7f).astype(np.uint8)
+    # Longer values match no format
+    codes[np.char.str_len(text) > _WIDTH] = 0x7f
+    is_digit = (codes >= _DIGIT_0) & (codes <= _DIGIT_0 + 9)
+    return codes, is_digit, codes - np.uint8(_DIGIT_0)
+
+
+def _number(digits, start, length):
+    """
+    Reads the number formed by `length` digits from column `start` of each row.
+    """
+    result = digits[:, start].astype(np.int64)
+    for column in range(start + 1, start + length):
+        result = result * 10 + digits[:, column]
+    return result
+
+
+def _compose(valid, year, month, day, hour, minute, second):
+    """
+    Builds datetime64[s] values from their fields; invalid fields give NaT.
+    """
+    valid = valid & (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + np.where(valid, day - 1, 0)
+    # Days past the end of the month roll over into the next one
+    valid &= days.astype('datetime64[M]') == months
+    result = days.astype('datetime64[s]') + (hour * 3600 + minute * 60 + second)
+    result[~valid] = np.datetime64('NaT')
+    return result
+
+
+def _hl7_fields(codes, is_digit, digits):
+    """
+    Reads the fields of HL7 TS values from their character codes.
+
+    Returns:
+        tuple: (match mask, year, month, day, hour, minute, second, number of leading digits)
+    """
+    rows = np.arange(len(codes))
+    # Zero columns past the end, so that every suffix check below can read 6 characters ahead
+    codes = np.pad(codes, ((0, 0), (0, 6)))
+    is_digit = np.pad(is_digit, ((0, 0), (0, 6)))
+
+    def first_non_digit(start):
+        later = ~is_digit & (np.arange(is_digit.shape[1]) >= start[:, None])
+        return later.argmax(axis=1)
+
+    # Number of leading digits; what follows must be the end, a fraction or a time zone
+    run = first_non_digit(np.zeros(len(codes), dtype=np.int64))
+    valid = np.isin(run, list(HL7_PRECISIONS))
+    # A fraction of a second (1-4 digits) needs full precision
+    fraction = codes[rows, run] == ord('.')
+    fraction_end = first_non_digit(run + 1)
+    valid &= ~fraction | ((run == 14) & (fraction_end - run >= 2) & (fraction_end - run <= 5))
+    # A time zone offset is a sign and exactly four digits, and ends the value
+    zone = np.where(fraction, fraction_end, run)
+    sign = codes[rows, zone]
+    offset = (sign == ord('+')) | (sign == ord('-'))
+    valid &= (sign == 0) | offset
+    valid &= ~offset | ((first_non_digit(zone + 1) == zone + 5) & (codes[rows, zone + 5] == 0))
+
+    def field(start, default):
+        return np.where(run >= start + 2, _number(digits, start, 2), default)
+
+    return valid, _number(digits, 0, 4), field(4, 1), field(6, 1), field(8, 0), field(10, 0), field(12, 0), run
+
+
+def parse_hl7_ts(values, return_precision=False):
+    """
+    Parses HL7 TS values of any precision.
+
+    Args:
+        values: Array-like of strings, e.g. a column of `birthTime` values
+        return_precision: Also return the precision of each value
+
+    Returns:
+        np.ndarray: datetime64[s] values (NaT where a value is missing or invalid), and with
+            return_precision an object array of precision names (see HL7_PRECISIONS, None if invalid)
+    """
+    *fields, run = _hl7_fields(*_char_codes(values))
+    result = _compose(*fields)
+    if not return_precision:
+        return result
+    names = np.full(_WIDTH + 1, None, dtype=object)
+    for length, name in HL7_PRECISIONS.items():
+        names[length] = name
+    return result, np.where(np.isnat(result), None, names[run])
+
+
+def _chars_are(codes, positions, char):
+    return np.all(codes[:, positions] == ord(char), axis=1)
+
+
+def _date_time_fields(codes, is_digit, digits, matches, separators):
+    """
+    Reads the optional time of 10-character dates: a separator, then `hh:mm` or `hh:mm:ss`.
+
+    Args:
+        matches: Mask of the values whose first 10 characters are a date
+        separators: Characters allowed between the date and the time
+
+    Returns:
+        tuple: (match mask, hour, minute, second)
+    """
+    date_only = matches & (codes[:, 10] == 0)
+    with_minutes = matches & np.isin(codes[:, 10], [ord(char) for char in separators]) \
+        & np.all(is_digit[:, [11, 12, 14, 15]], axis=1) & _chars_are(codes, [13], ':')
+    with_seconds = with_minutes & _chars_are(codes, [16], ':') & np.all(is_digit[:, [17, 18]], axis=1) \
+        & (codes[:, 19] == 0)
+    with_minutes &= codes[:, 16] == 0
+
+    timed = with_minutes | with_seconds
+    return (date_only | with_minutes | with_seconds, np.where(timed, _number(digits, 11, 2), 0),
+            np.where(timed, _number(digits, 14, 2), 0), np.where(with_seconds, _number(digits, 17, 2), 0))
+
+
+def _dotted_fields(codes, is_digit, digits):
+    """
+    Reads the fields of `dd.mm.yyyy` values, optionally followed by ` hh:mm` or ` hh:mm:ss`.
+
+    Returns:
+        tuple: (match mask, year, month, day, hour, minute, second)
+    """
+    matches = np.all(is_digit[:, [0, 1, 3, 4, 6, 7, 8, 9]], axis=1) & _chars_are(codes, [2, 5], '.')
+    matches, *time = _date_time_fields(codes, is_digit, digits, matches, ' ')
+    return (matches, _number(digits, 6, 4), _number(digits, 3, 2), _number(digits, 0, 2), *time)
+
+
+def _iso_fields(codes, is_digit, digits):
+    """
+    Reads the fields of ISO `yyyy-mm-dd` values, optionally followed by ` hh:mm[:ss]` or
+    `Thh:mm[:ss]` (the form pandas writes dates in, e.g. to CSV).
+
+    Returns:
+        tuple: (match mask, year, month, day, hour, minute, second)
+    """
+    matches = np.all(is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9]], axis=1) & _chars_are(codes, [4, 7], '-')
+    matches, *time = _date_time_fields(codes, is_digit, digits, matches, ' T')
+    return (matches, _number(digits, 0, 4), _number(digits, 5, 2), _number(digits, 8, 2), *time)
+
+
+def parse_dates(values):
+    """
+    Parses a column of dates in any of the formats found in the documents and
+    the tables: HL7 TS of any precision (`20230428`, `202304281530+0300`),
+    `dd.mm.yyyy` and ISO `yyyy-mm-dd` (as dates read back from CSV are), both
+    with an optional `hh:mm[:ss]` time.
+
+    Args:
+        values: Array-like of strings (other values are converted with str)
+
+    Returns:
+        np.ndarray: datetime64[s] values, NaT where a value is missing or invalid
+    """
+    codes = _char_codes(values)
+    *hl7, _ = _hl7_fields(*codes)
+    dotted = _dotted_fields(*codes)
+    iso = _iso_fields(*codes)
+    # The formats exclude each other
+    fields = (np.where(dotted[0], a, b) for a, b in zip(dotted, hl7))
+    return _compose(*(np.where(iso[0], a, b) for a, b in zip(iso, fields)))
+
+
+def _month_day(dates):
+    """
+    Returns month * 100 + day of datetime64 values.
+    """
+    days = dates.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    month = months.astype(np.int64) % 12 + 1
+    return month * 100 + (days - months).astype(np.int64) + 1
+
+
+def age_in_years(birth, reference):
+    """
+    Computes ages in completed years.
+
+    Args:
+        birth: datetime64 array of birth dates
+        reference: datetime64 array of the dates to compute the age at (e.g. admission)
+
+    Returns:
+        np.ndarray: float64 ages, NaN where a date is missing
+    """
+    birth = np.asarray(birth, dtype='datetime64[s]')
+    reference = np.asarray(reference, dtype='datetime64[s]')
+    years = reference.astype('datetime64[Y]').astype(np.int64) - birth.astype('datetime64[Y]').astype(np.int64)
+    years = years - (_month_day(reference) < _month_day(birth))
+    return np.where(np.isnat(birth) | np.isnat(reference), np.nan, years.astype(np.float64))
+
+
+def days_between(start, end):
+    """
+    Computes the number of calendar days from start to end (the bed-days of a stay
+    from admission to discharge).
+
+    Args:
+        start: datetime64 array
+        end: datetime64 array
+
+    Returns:
+        np.ndarray: float64 day counts, NaN where a date is missing
+    """
+    start = np.asarray(start, dtype='datetime64[s]').astype('datetime64[D]')
+    end = np.asarray(end, dtype='datetime64[s]').astype('datetime64[D]')
+    days = (end - start).astype(np.int64).astype(np.float64)
+    return np.where(np.isnat(start) | np.isnat(end), np.nan, days)
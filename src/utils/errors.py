@@ -0,0 +1,227 @@
+"""
+Structured error collection for the batch processors.
+
+Instead of printing every failure, the folder functions record one entry per
+failed document:
+
+    {"file": ..., "stage": ..., "error_type": ..., "message": ..., "parser": ..., "location": ...}
+
+`parser` is the innermost instrumented call the exception passed through
+(see `src.utils.profiling.call`), e.g. 'get_gosp_info' or 'safe_parse_table'.
+`location` is the source line the exception was raised at.
+
+Records are aggregated by cause (stage, parser, exception type and message with
+numbers masked) and can be streamed to a JSON Lines log, from which the failed
+files can be read back to re-run them.
+"""
+import json
+import os
+import re
+import traceback
+
+_NUMBER = re.compile(r'\d+')
+
+
+def error_location(exc):
+    """
+    Returns the source line an exception was raised at, e.g. 'hosp_parser.py:41 in get_gosp_info'.
+    Exceptions sent back from worker processes carry it as `failed_location`.
+
+    Args:
+        exc: The exception
+
+    Returns:
+        str or None: Location
+    """
+    location = getattr(exc, 'failed_location', None)
+    if location is not None:
+        return location
+    frames = traceback.extract_tb(exc.__traceback__)
+    if not frames:
+        return None
+    frame = frames[-1]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+
+
+class ErrorCollector:
+    """
+    Collects error records and aggregates them by cause.
+
+    Args:
+        log_path: Optional JSON Lines file that every record is appended to as it is collected
+        max_examples: Number of example files kept per cause in the summary
+    """
+
+    def __init__(self, log_path=None, max_examples=5):
+        self.records = []
+        self.max_examples = max_examples
+        self._causes = {}
+        self._log = None
+        if log_path:
+            directory = os.path.dirname(log_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._log = open(log_path, 'a', encoding='utf-8')
+
+    def record(self, file, stage, exc, parser=None):
+        """
+        Records a failure.
+
+        Args:
+            file: Name of the document that failed
+            stage: Pipeline stage, e.g. 'extract_features'
+            exc: The exception
+            parser: Failing parser; taken from the exception if not given
+
+        Returns:
+            dict: The error record
+        """
+        if parser is None:
+            parser = getattr(exc, 'failed_call', None)
+            if parser and parser.startswith('parser.'):
+                parser = parser[len('parser.'):]
+
+        location = error_location(exc)
+
+        entry = {
+            'file': file,
+            'stage': stage,
+            'error_type': type(exc).__name__,
+            'message': str(exc),
+            'parser': parser,
+            'location': location,
+        }
+        self.records.append(entry)
+        self._add_cause(entry)
+
+        if self._log is not None:
+            self._log.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._log.flush()
+        return entry
+
+    def _add_cause(self, entry):
+        """
+        Adds a record to the aggregation by cause.
+        """
+        key = (entry['stage'], entry['parser'], entry['error_type'], _NUMBER.sub('N', entry['message']))
+        cause = self._causes.get(key)
+        if cause is None:
+            cause = self._causes[key] = {
+                'stage': entry['stage'],
+                'parser': entry['parser'],
+                'error_type': entry['error_type'],
+                'message': entry['message'],
+                'count': 0,
+                'files': [],
+            }
+        cause['count'] += 1
+        if len(cause['files']) < self.max_examples:
+            cause['files'].append(entry['file'])
+
+    def state(self, since=0):
+        """
+        Returns the collected records and the error log position, for checkpoints.
+
+        Args:
+            since: Only return the records after the first `since` ones (those saved by an earlier checkpoint)
+
+        Returns:
+            dict: {'records': [...], 'count': number of all records, 'log_size': int or None}
+        """
+        log_size = None
+        if self._log is not None:
+            self._log.flush()
+            log_size = self._log.tell()
+        return {'records': self.records[since:], 'count': len(self.records), 'log_size': log_size}
+
+    def restore(self, state):
+        """
+        Restores records saved by `state`, cutting the error log back to the saved position.
+
+        Args:
+            state: Output of `state`
+        """
+        if self._log is not None and state.get('log_size') is not None:
+            self._log.truncate(state['log_size'])
+            self._log.seek(state['log_size'])
+        for entry in state['records']:
+            self.records.append(entry)
+            self._add_cause(entry)
+
+    def __len__(self):
+        return len(self.records)
+
+    def summary(self):
+        """
+        Returns the errors aggregated by cause, most frequent first.
+
+        Returns:
+            list: Dicts with stage, parser, error_type, message (first occurrence),
+                count and up to `max_examples` example files
+        """
+        return sorted((dict(cause, files=list(cause['files'])) for cause in self._causes.values()),
+                      key=lambda cause: -cause['count'])
+
+    def failed_files(self, stage=None):
+        """
+        Returns the names of failed documents in the order they failed.
+
+        Args:
+            stage: Only return failures of this stage
+
+        Returns:
+            list: File names without duplicates
+        """
+        return list(dict.fromkeys(r['file'] for r in self.records if stage is None or r['stage'] == stage))
+
+    def print_summary(self, limit=10):
+        """
+        Prints the most frequent causes, one line each.
+
+        Args:
+            limit: Maximum number of causes to print
+        """
+        causes = self.summary()
+        if not causes:
+            return
+        print("Errors by cause:")
+        for cause in causes[:limit]:
+            where = f"{cause['stage']}/{cause['parser']}" if cause['parser'] else cause['stage']
+            print(f"  {cause['count']:>6}  {where}: {cause['error_type']}: {cause['message'][:120]}")
+        if len(causes) > limit:
+            print(f"  ... {len(causes) - limit} more causes")
+
+    def close(self):
+        """
+        Closes the error log.
+        """
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def load_error_log(log_path, stage=None):
+    """
+    Reads an error log written by `ErrorCollector`.
+
+    Args:
+        log_path: Path to the JSON Lines log
+        stage: Only return records of this stage
+
+    Returns:
+        list: Error records
+    """
+    records = []
+    with open(log_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                if stage is None or entry['stage'] == stage:
+                    records.append(entry)
+    return records
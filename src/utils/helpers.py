@@ -1,7 +1,30 @@
 """
 Helper functions for data processing.
 """
-import pandas as pd
+
+
+# Compiled paths by (short path, prefix); the parsers use a few dozen fixed paths
+_compiled_paths = {}
+
+
+def compile_path(short_path, prefix='{urn:hl7-org:v3}'):
+    """
+    Returns the full key path for a short path, adding the prefix to string elements.
+    Results are cached, so each parser path is only built once per process.
+
+    Args:
+        short_path: Simplified path as a list of keys and indices.
+        prefix: Prefix added to string path elements.
+
+    Returns:
+        tuple: Full path
+    """
+    key = (tuple(short_path), prefix)
+    full_path = _compiled_paths.get(key)
+    if full_path is None:
+        full_path = _compiled_paths[key] = tuple((prefix + element) if isinstance(element, str)
+                                                 else element for element in short_path)
+    return full_path
 
 
 def find_section_by_optimized_path(data, short_path, fields=None, prefix='{urn:hl7-org:v3}'):
@@ -20,10 +43,10 @@ def find_section_by_optimized_path(data, short_path, fields=None, prefix='{urn:h
         The section at the specified path, or specific fields from the section, or None if the path is invalid.
     """
     current = data
-    full_path = [(prefix + element) if isinstance(element, str)
-                 else element for element in short_path]
 
     try:
+        # Raises TypeError for unhashable path elements, which cannot be keys either
+        full_path = compile_path(short_path, prefix)
         for key in full_path:
             if isinstance(current, list):  # Handle list indices
                 current = current[int(key)]
@@ -0,0 +1,109 @@
+"""
+Lazy loading of heavy dependencies and package re-exports.
+
+pandas, numpy, matplotlib and tqdm take most of the import time of this
+package. Modules bind them with `lazy_import` / `lazy_function`, so they are
+imported on first use instead of when the module is imported. Packages declare
+their re-exports with `lazy_exports`, so `from src.parsers import get_sex` only
+imports the modules it needs.
+"""
+import importlib
+import sys
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Args:
+        name: Module name, e.g. 'pandas' or 'matplotlib.pyplot'
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = self.__dict__['_module'] = importlib.import_module(self._name)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Returns a module, or a `LazyModule` stand-in if it has not been imported yet.
+
+    Args:
+        name: Module name
+
+    Returns:
+        module or LazyModule
+    """
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
+
+
+def lazy_function(module_name, attr):
+    """
+    Returns a callable that imports `module_name` on its first call and calls `attr` of it.
+
+    Args:
+        module_name: Module name, e.g. 'tqdm'
+        attr: Name of the function or class in the module
+
+    Returns:
+        callable
+    """
+    target = None
+
+    def wrapper(*args, **kwargs):
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(module_name), attr)
+        return target(*args, **kwargs)
+
+    wrapper.__name__ = attr
+    wrapper.__qualname__ = attr
+    wrapper.__doc__ = f"Lazily imported {module_name}.{attr}."
+    return wrapper
+
+
+def lazy_exports(package_name, exports):
+    """
+    Builds module-level `__getattr__` and `__dir__` (PEP 562) for lazy re-exports.
+
+    Args:
+        package_name: `__name__` of the package
+        exports: Mapping of exported name -> module that defines it
+
+    Returns:
+        tuple: (__getattr__, __dir__) to assign in the package namespace
+    """
+    package = sys.modules[package_name]
+
+    def __getattr__(name):
+        module_name = exports.get(name)
+        if module_name is None:
+            raise AttributeError(f"module '{package_name}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(module_name), name)
+        setattr(package, name, value)  # Later lookups bypass __getattr__
+        return value
+
+    def __dir__():
+        return sorted(set(vars(package)) | set(exports))
+
+    return __getattr__, __dir__
@@ -0,0 +1,170 @@
+"""
+Ordered per-document processing in worker processes.
+
+The folder functions apply a per-document function `func(source, name)` to
+every input document and write the results in input order. With `workers > 1`
+the calls run in a process pool: each worker opens its own source from the
+input path (sources hold file handles and memory maps, which cannot be
+shared), processes a batch of names and sends the results back. Writing stays
+in the calling process, so the output is identical to a serial run.
+
+Profiling timers and samples of the per-document function are only collected
+in serial runs; in parallel runs only the writing side is timed.
+
+For latency-bound storage, `io_concurrency` prefetches the reads of a serial
+run asynchronously instead (see src.utils.prefetch).
+
+Sources that are only cheap to read in storage order (`sequential_reads`: tar
+archives, JSON Lines shards) are read in one pass with their `iter_bytes` in
+serial runs, when the names are given in that order.
+"""
+import os
+import pickle
+from collections import deque
+from contextlib import nullcontext
+from src.utils.lazy import lazy_function
+from src.utils.profiling import sample_capture
+from src.utils.prefetch import prefetch_documents, PrefetchedSource
+
+ProcessPoolExecutor = lazy_function('concurrent.futures', 'ProcessPoolExecutor')
+
+DEFAULT_BATCH_SIZE = 16
+
+# Sources opened by this worker process, by input path
+_sources = {}
+
+
+def _portable_error(exc):
+    """
+    Makes an exception safe to send back from a worker, keeping the fields the
+    error collector reports (the traceback itself cannot be pickled).
+    """
+    from src.utils.errors import error_location
+
+    location = error_location(exc)
+    try:
+        pickle.loads(pickle.dumps(exc))
+    except Exception:
+        failed_call = getattr(exc, 'failed_call', None)
+        exc = RuntimeError(f"{type(exc).__name__}: {exc}")
+        exc.failed_call = failed_call
+    exc.failed_location = location
+    return exc
+
+
+def _run_batch(func, source_path, names):
+    """
+    Worker entry point: processes a batch of documents from a source opened by path.
+
+    Returns:
+        list: (result, exception) pairs in batch order
+    """
+    from src.io.storage import open_source
+
+    source = _sources.get(source_path)
+    if source is None:
+        source = _sources[source_path] = open_source(source_path)
+    outcomes = []
+    for name in names:
+        try:
+            outcomes.append((func(source, name), None))
+        except Exception as e:
+            outcomes.append((None, _portable_error(e)))
+    return outcomes
+
+
+def _read_in_order(source, names):
+    """
+    Yields (name, bytes, exception) for names given in the storage order of a sequential
+    source, reading it in one pass. A failed read ends the pass; the remaining names are
+    then read one by one.
+    """
+    stream = source.iter_bytes(names)
+    for name in names:
+        try:
+            if stream is not None:
+                _, data = next(stream)
+            else:
+                data = source.read_bytes(name)
+        except Exception as e:
+            stream = None
+            yield name, None, e
+        else:
+            yield name, data, None
+
+
+def _in_storage_order(source, names):
+    """
+    Checks whether names are listed in the storage order of a sequential source.
+    """
+    if not getattr(source, 'sequential_reads', False):
+        return False
+    wanted = set(names)
+    return [name for name in source.list_names() if name in wanted] == list(names)
+
+
+def process_documents(func, source, source_path, names, workers=1, batch_size=DEFAULT_BATCH_SIZE, sample=None,
+                      io_concurrency=None):
+    """
+    Applies `func(source, name)` to every document, yielding outcomes in input order.
+    Exceptions are returned instead of raised, so one bad document does not stop the run.
+
+    Args:
+        func: Module-level function (it must be picklable for workers > 1)
+        source: Open source, used when workers <= 1
+        source_path: Input path that workers open their own source from
+        names: Document names in processing order
+        workers: Number of worker processes; 1 processes everything in this process
+        batch_size: Documents per worker task
+        sample: Position of one document to run under `sample_capture` (serial runs only)
+        io_concurrency: Prefetch up to this many reads asynchronously while documents are
+            processed and written (see src.utils.prefetch); serial runs only
+
+    Yields:
+        tuple: (name, result, exception) - exactly one of result/exception is set
+    """
+    if io_concurrency:
+        if workers is not None and workers > 1:
+            raise ValueError("io_concurrency cannot be combined with workers > 1")
+        yield from prefetch_documents(func, source, names, io_concurrency, sample)
+        return
+
+    if (workers is None or workers <= 1) and _in_storage_order(source, names):
+        for i, (name, data, error) in enumerate(_read_in_order(source, names)):
+            if error is not None:
+                yield name, None, error
+                continue
+            try:
+                with sample_capture(name) if i == sample else nullcontext():
+                    result = func(PrefetchedSource(source, name, data), name)
+            except Exception as e:
+                yield name, None, e
+            else:
+                yield name, result, None
+        return
+
+    if workers is None or workers <= 1:
+        for i, name in enumerate(names):
+            try:
+                with sample_capture(name) if i == sample else nullcontext():
+                    result = func(source, name)
+            except Exception as e:
+                yield name, None, e
+            else:
+                yield name, result, None
+        return
+
+    batches = [names[i:i + batch_size] for i in range(0, len(names), batch_size)]
+    source_path = os.path.abspath(source_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_batch = 0
+        while next_batch < len(batches) or pending:
+            # Keep a bounded number of batches in flight, so results do not pile up in memory
+            while next_batch < len(batches) and len(pending) < 2 * workers:
+                pending.append((batches[next_batch],
+                                executor.submit(_run_batch, func, source_path, batches[next_batch])))
+                next_batch += 1
+            batch, future = pending.popleft()
+            for name, (result, error) in zip(batch, future.result()):
+                yield name, result, error
@@ -0,0 +1,171 @@
+"""
+Asynchronous document prefetching for latency-bound storage.
+
+On network filesystems the time to open and read a file, not parsing, limits
+the folder functions. `prefetch_documents` keeps up to `concurrency` reads in
+flight in a bounded thread pool, scheduled by an asyncio event loop in a
+background thread, and applies the per-document function in one parsing
+thread as the reads complete, in input order. The caller receives the
+outcomes through a bounded queue and writes them while the next documents are
+read and parsed, so reads, parsing and writes overlap, and at most about
+2 * concurrency documents are held in memory.
+
+The per-document function runs in a single thread and sees the prefetched
+bytes through `PrefetchedSource`, so its results are those of a serial run.
+Sources that move a shared file position (tar archives, JSON Lines shards)
+do not set `concurrent_reads`; their reads are done one at a time, still
+overlapping with parsing and writing.
+"""
+import asyncio
+import io
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+from src.utils.profiling import timed, sample_capture
+
+DEFAULT_IO_CONCURRENCY = 16
+
+_DONE = object()
+
+
+class _Failure:
+    """
+    Carries an exception of the prefetching thread itself to the consumer.
+    """
+
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class PrefetchedSource:
+    """
+    Source view of one prefetched document, passed to the per-document function.
+    Other names are read from the underlying source.
+
+    Args:
+        source: Open source the document was read from
+        name: Document name
+        data: Document bytes
+    """
+
+    def __init__(self, source, name, data):
+        self.source = source
+        self.name = name
+        self.data = data
+
+    def read_bytes(self, name):
+        if name != self.name:
+            return self.source.read_bytes(name)
+        return self.data
+
+    def open(self, name):
+        return io.BytesIO(self.read_bytes(name))
+
+    def load_json(self, name):
+        from src.io.backends import json_loads
+
+        data = self.read_bytes(name)
+        with timed('json.load'):
+            return json_loads(data)
+
+
+def _apply(func, source, name, data, sampled):
+    """
+    Runs the per-document function on prefetched bytes (in the parsing thread).
+    """
+    try:
+        with sample_capture(name) if sampled else nullcontext():
+            return name, func(PrefetchedSource(source, name, data), name), None
+    except Exception as e:
+        return name, None, e
+
+
+async def _pipeline(func, source, names, concurrency, sample, output, stop):
+    """
+    Reads with up to `concurrency` reads in flight and parses in input order,
+    putting (name, result, exception) outcomes into `output`.
+    """
+    loop = asyncio.get_running_loop()
+    lock = None if getattr(source, 'concurrent_reads', False) else threading.Lock()
+
+    def read(name):
+        with lock if lock is not None else nullcontext():
+            return source.read_bytes(name)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='prefetch-read') as readers, \
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch-parse') as parser:
+        remaining = enumerate(names)
+        reads = deque()
+        while True:
+            # Keep the read window full
+            for i, name in islice(remaining, concurrency - len(reads)):
+                reads.append((i, name, loop.run_in_executor(readers, read, name)))
+            if not reads or stop.is_set():
+                break
+            i, name, reading = reads.popleft()
+            try:
+                data = await reading
+            except Exception as e:
+                outcome = (name, None, e)
+            else:
+                outcome = await loop.run_in_executor(parser, _apply, func, source, name, data, i == sample)
+            # Waits while the consumer is behind; the reads in flight continue meanwhile
+            await loop.run_in_executor(None, output.put, outcome)
+        for _, _, reading in reads:
+            reading.cancel()
+
+
+def _run(func, source, names, concurrency, sample, output, stop):
+    """
+    Entry point of the prefetching thread.
+    """
+    try:
+        asyncio.run(_pipeline(func, source, names, concurrency, sample, output, stop))
+    except BaseException as e:
+        output.put(_Failure(e))
+    else:
+        output.put(_DONE)
+
+
+def prefetch_documents(func, source, names, concurrency=DEFAULT_IO_CONCURRENCY, sample=None):
+    """
+    Applies `func(source, name)` to every document with asynchronously prefetched reads,
+    yielding outcomes in input order. Exceptions are returned instead of raised.
+
+    Args:
+        func: Per-document function; it reads the document through the source it is given
+        source: Open source
+        names: Document names in processing order
+        concurrency: Maximum number of reads in flight
+        sample: Position of one document to run under `sample_capture`
+
+    Yields:
+        tuple: (name, result, exception) - exactly one of result/exception is set
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be positive")
+    output = queue.Queue(maxsize=concurrency)
+    stop = threading.Event()
+    thread = threading.Thread(target=_run, args=(func, source, names, concurrency, sample, output, stop),
+                              name='prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = output.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        # The consumer may stop early: let the pipeline finish its current put and exit
+        stop.set()
+        while thread.is_alive():
+            try:
+                output.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        thread.join()
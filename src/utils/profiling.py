@@ -0,0 +1,248 @@
+"""
+Opt-in profiling instrumentation for the processing pipeline.
+
+Code in src.io and src.parsers reports timings and counters through the
+module-level helpers `timed`, `count` and `call`. They do nothing unless a
+`StageProfiler` is active, so the instrumentation costs one global lookup when
+profiling is off.
+
+Timer names used by the pipeline:
+- io.read / io.write - file, pack, shard and archive I/O
+- json.load / json.dump / xml.parse - parsing and serialization
+- stage.<name> - whole pipeline stages, e.g. stage.extract_features
+- parser.<name> - individual parsers, e.g. parser.compute_full_wards
+
+Counters: bytes_read, bytes_written, documents, table.parsed_by.<method>,
+table.fallbacks (methods tried before the successful one), table.failed,
+table.cache_hits / table.cache_misses (see src.utils.table_utils.table_cache),
+layout.hits / layout.misses (section layout cache, see src.parsers.layout).
+"""
+import io
+import threading
+import time
+from contextlib import contextmanager
+
+_active = None
+
+
+class StageProfiler:
+    """
+    Collects timers and counters.
+    """
+
+    def __init__(self):
+        self.timers = {}
+        self.counters = {}
+        self.sample = None
+        # Prefetching threads report I/O timers concurrently (see src.utils.prefetch)
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        """
+        Adds one measurement to a timer.
+
+        Args:
+            name: Timer name
+            seconds: Elapsed time
+        """
+        with self._lock:
+            timer = self.timers.get(name)
+            if timer is None:
+                self.timers[name] = [1, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+
+    def count(self, name, n=1):
+        """
+        Increments a counter.
+
+        Args:
+            name: Counter name
+            n: Increment
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        """
+        Returns the collected data as a JSON-serializable dictionary.
+
+        Returns:
+            dict: {'timers': {name: {calls, total_s, mean_ms}}, 'counters': {...}, 'sample': {...} or None}
+        """
+        timers = {
+            name: {
+                'calls': calls,
+                'total_s': round(total, 6),
+                'mean_ms': round(total / calls * 1000, 4) if calls else 0.0,
+            }
+            for name, (calls, total) in sorted(self.timers.items(), key=lambda item: -item[1][1])
+        }
+        return {'timers': timers, 'counters': dict(sorted(self.counters.items())), 'sample': self.sample}
+
+
+def get_profiler():
+    """
+    Returns the active profiler or None.
+    """
+    return _active
+
+
+@contextmanager
+def profiling(profiler=None, enabled=True):
+    """
+    Activates a profiler for the duration of the block.
+
+    Args:
+        profiler: StageProfiler to activate (a new one if None)
+        enabled: If False, nothing is activated and None is yielded
+
+    Yields:
+        StageProfiler or None: The active profiler
+    """
+    global _active
+    if not enabled:
+        yield None
+        return
+    previous = _active
+    _active = profiler if profiler is not None else StageProfiler()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@contextmanager
+def timed(name):
+    """
+    Times the block under the given timer name if profiling is active.
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add_time(name, time.perf_counter() - start)
+
+
+def count(name, n=1):
+    """
+    Increments a counter if profiling is active.
+    """
+    if _active is not None:
+        _active.count(name, n)
+
+
+def call(name, func, *args, **kwargs):
+    """
+    Calls a function, timing it under the given name if profiling is active.
+    An exception raised by the function is tagged with the name as `failed_call`
+    (innermost call wins), which `src.utils.errors` reports as the failing parser.
+
+    Args:
+        name: Timer name
+        func: Function to call
+        *args, **kwargs: Function arguments
+
+    Returns:
+        Result of the function
+    """
+    profiler = _active
+    start = time.perf_counter() if profiler is not None else None
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        if getattr(e, 'failed_call', None) is None:
+            try:
+                e.failed_call = name
+            except AttributeError:
+                pass  # Exception types without a __dict__
+        raise
+    finally:
+        if profiler is not None:
+            profiler.add_time(name, time.perf_counter() - start)
+
+
+class _CountingReader:
+    """
+    Binary stream wrapper that counts the bytes read from it.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        count('bytes_read', len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stream.close()
+
+
+def counted(stream):
+    """
+    Wraps a binary stream so that reads are added to the bytes_read counter.
+    Returns the stream unchanged if profiling is not active.
+    """
+    if _active is None:
+        return stream
+    return _CountingReader(stream)
+
+
+@contextmanager
+def sample_capture(label, top=25):
+    """
+    Runs the block under cProfile and tracemalloc and stores the result as the
+    active profiler's sample. Does nothing if profiling is not active.
+
+    Args:
+        label: Name of the sampled document
+        top: Number of functions and allocation sites to keep
+    """
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    cprofile = cProfile.Profile()
+    cprofile.enable()
+    try:
+        yield
+    finally:
+        cprofile.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        text = io.StringIO()
+        pstats.Stats(cprofile, stream=text).sort_stats('cumulative').print_stats(top)
+        allocations = [
+            {'location': str(stat.traceback), 'size_kb': round(stat.size / 1024, 2), 'count': stat.count}
+            for stat in snapshot.statistics('lineno')[:top]
+        ]
+        profiler.sample = {
+            'document': label,
+            'peak_memory_kb': round(peak / 1024, 2),
+            'cprofile': text.getvalue(),
+            'top_allocations': allocations,
+        }
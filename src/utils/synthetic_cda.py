@@ -0,0 +1,222 @@
+"""
+Generator of synthetic HL7 CDA discharge summaries.
+
+The documents follow the layout the parsers expect (see src.parsers):
+the structured body section under SUB_PATH holds the hospitalization table and
+observation entries, and its components are, in order:
+0 - disease anamnesis, 1 - condition with the diagnosis subsection,
+2 - life anamnesis, 3 - departments (ward table, one subsection per ward with
+research tables), 4 - final tables.
+
+No real patient data is used: all values are drawn from small vocabularies
+with a seeded random generator, so the same arguments always give the same corpus.
+"""
+import os
+import random
+from datetime import date, timedelta
+from xml.sax.saxutils import escape, quoteattr
+
+NAMESPACE = 'urn:hl7-org:v3'
+SECTION_CODE_SYSTEM = '1.2.643.5.1.13.13.99.2.197'
+
+SECTIONS = [
+    ('ANAM', 'Анамнез заболевания'),
+    ('STATECUR', 'Состояние при поступлении'),
+    ('LANAM', 'Анамнез жизни'),
+    ('DEPART', 'Пребывание в отделениях'),
+    ('SUM', 'Итоги госпитализации'),
+]
+
+SEXES = ['Мужской', 'Женский']
+HOSP_TYPES = ['Экстренная', 'Плановая', 'Неотложная']
+HOSP_WAYS = ['Доставлен скорой медицинской помощью', 'Самостоятельно', 'Направлен поликлиникой', 'Переведен из другой МО']
+WARDS = ['Терапевтическое отделение', 'Кардиологическое отделение', 'Неврологическое отделение',
+         'Хирургическое отделение', 'Отделение реанимации и интенсивной терапии', 'Гастроэнтерологическое отделение']
+DIAGNOSES = [('I10', 'Эссенциальная гипертензия'), ('I21.0', 'Острый трансмуральный инфаркт миокарда'),
+             ('J18.9', 'Пневмония неуточненная'), ('E11.9', 'Сахарный диабет 2 типа'),
+             ('K85.1', 'Острый билиарный панкреатит'), ('I63.5', 'Инфаркт мозга')]
+OUTCOMES = ['Выписан', 'Переведен в другую МО', 'Умер']
+RESULTS = ['Выздоровление', 'Улучшение', 'Без перемен', 'Ухудшение']
+CHARACTERS = ['Острое', 'Впервые в жизни установленное хроническое', 'Ранее установленное хроническое']
+RESEARCHES = {
+    'Общий анализ крови': [('Гемоглобин', 'г/л', 90, 170), ('Эритроциты', '10^12/л', 3.0, 5.8),
+                           ('Лейкоциты', '10^9/л', 3.0, 18.0), ('Тромбоциты', '10^9/л', 120, 450),
+                           ('СОЭ', 'мм/ч', 2, 60)],
+    'Биохимический анализ крови': [('Глюкоза', 'ммоль/л', 3.5, 15.0), ('Креатинин', 'мкмоль/л', 50, 250),
+                                   ('Мочевина', 'ммоль/л', 2.5, 20.0), ('АЛТ', 'Ед/л', 5, 120),
+                                   ('АСТ', 'Ед/л', 5, 120), ('Общий белок', 'г/л', 55, 85)],
+    'Общий анализ мочи': [('Удельный вес', '', 1.005, 1.030), ('Белок', 'г/л', 0, 1.0),
+                          ('Лейкоциты', 'в п/з', 0, 20)],
+    'Коагулограмма': [('МНО', '', 0.8, 3.5), ('АЧТВ', 'с', 22, 60), ('Фибриноген', 'г/л', 1.5, 6.0)],
+}
+COMPLAINTS = ['боли за грудиной', 'одышку при нагрузке', 'слабость', 'головокружение', 'кашель с мокротой',
+              'повышение температуры тела', 'боли в эпигастрии', 'отеки нижних конечностей']
+PHRASES = ['Со слов пациента, болеет в течение {n} дней.', 'Ухудшение состояния отмечает с {d}.',
+           'Ранее за медицинской помощью не обращался.', 'Принимает гипотензивную терапию нерегулярно.',
+           'Аллергологический анамнез не отягощен.', 'Вредные привычки отрицает.',
+           'Перенесенные заболевания: ОРВИ, хронический гастрит.', 'Наследственность отягощена по ССЗ.']
+
+
+def _table(headers, rows):
+    """
+    Renders a table with thead/tbody and content-wrapped cells.
+    """
+    head = ''.join(f'<th>{escape(h)}</th>' for h in headers)
+    body = ''.join(
+        '<tr>' + ''.join(f'<td><content>{escape(str(c))}</content></td>' for c in row) + '</tr>'
+        for row in rows
+    )
+    return f'<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>'
+
+
+def _section(code, title, inner):
+    """
+    Renders a component/section with code and title.
+    """
+    return (f'<component><section><code code="{code}" codeSystem="{SECTION_CODE_SYSTEM}" '
+            f'displayName={quoteattr(title)}/><title>{escape(title)}</title>{inner}</section></component>')
+
+
+def _ts(day):
+    return day.strftime('%Y%m%d')
+
+
+def _text(rng, sentences, admission):
+    phrases = [rng.choice(PHRASES).format(n=rng.randint(1, 30), d=admission.strftime('%d.%m.%Y'))
+               for _ in range(sentences)]
+    return escape(' '.join(phrases))
+
+
+def _value(rng, low, high):
+    value = rng.uniform(low, high)
+    if high >= 20:
+        return str(int(round(value)))
+    return f'{value:.2f}' if high < 2 else f'{value:.1f}'
+
+
+def _ward(rng, name, start, days, researches):
+    """
+    Renders one ward subsection with its research tables.
+    """
+    items = []
+    offsets = sorted(rng.randint(0, days - 1) for _ in range(researches))
+    for offset in offsets:
+        research = rng.choice(list(RESEARCHES))
+        day = start + timedelta(days=offset)
+        rows = [[param, f'{_value(rng, low, high)} {unit}'.strip()]
+                for param, unit, low, high in RESEARCHES[research]]
+        title = f'{research} от {day.strftime("%d.%m.%Y")}'
+        items.append(f'<component><section><title>{escape(title)}</title>'
+                     f'<text>{_table(["Показатель", "Результат"], rows)}</text></section></component>')
+    inner = f'<component><section>{"".join(items)}</section></component>' if items else ''
+    return f'<component><section><title>{escape(name)}</title>{inner}</section></component>'
+
+
+def generate_document(index, seed=0, wards=(1, 3), researches=(2, 4), anamnesis_sentences=(3, 12)):
+    """
+    Generates one synthetic CDA document.
+
+    Args:
+        index: Document number, used for identifiers and as part of the random seed
+        seed: Corpus seed
+        wards: (min, max) number of wards per stay
+        researches: (min, max) number of research tables per ward
+        anamnesis_sentences: (min, max) number of sentences in each anamnesis text
+
+    Returns:
+        str: XML document
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    n_wards = max(2, rng.randint(*wards))  # get_ward_list expects a list of wards
+
+    admission = date(2020, 1, 1) + timedelta(days=rng.randint(0, 1460))
+    stay = rng.randint(3, 30)
+    discharge = admission + timedelta(days=stay)
+    birth = admission - timedelta(days=rng.randint(18 * 365, 95 * 365))
+    sex = rng.choice(SEXES)
+
+    gosp_table = _table(['Дата поступления', 'Дата выписки', 'Койко-дней'],
+                        [[admission.strftime('%d.%m.%Y'), discharge.strftime('%d.%m.%Y'), stay]])
+    entries = ''.join(
+        f'<entry><observation classCode="OBS" moodCode="EVN"><code code="{code}"/>'
+        f'<value displayName={quoteattr(value)}/></observation></entry>'
+        for code, value in [('4001', _ts(admission)), ('4002', _ts(discharge)),
+                            ('4003', rng.choice(HOSP_TYPES)), ('4004', rng.choice(HOSP_WAYS))]
+    )
+
+    code, diagnosis = rng.choice(DIAGNOSES)
+    diagnosis_table = _table(['Вид диагноза', 'Код МКБ-10', 'Диагноз'],
+                             [['Основной', code, diagnosis], ['Сопутствующий', 'I10', 'Эссенциальная гипертензия']])
+    complaints = ', '.join(rng.sample(COMPLAINTS, rng.randint(1, 4)))
+    condition = (f'<content>Состояние: {rng.choice(["удовлетворительное", "средней тяжести", "тяжелое"])}</content>'
+                 f'<content>Жалобы: {escape(complaints)}</content>'
+                 f'<content>Объективный статус: АД {rng.randint(100, 190)}/{rng.randint(60, 110)} мм рт.ст., '
+                 f'ЧСС {rng.randint(50, 120)} уд/мин</content>')
+
+    ward_names = rng.sample(WARDS, min(n_wards, len(WARDS)))
+    ward_days = max(1, stay // len(ward_names))
+    ward_rows = []
+    ward_sections = []
+    for k, name in enumerate(ward_names):
+        start = admission + timedelta(days=k * ward_days)
+        ward_rows.append([name, start.strftime('%d.%m.%Y'), ward_days])
+        ward_sections.append(_ward(rng, name, start, ward_days, rng.randint(*researches)))
+
+    final1 = _table(['Характер основного заболевания', 'Исход госпитализации', 'Результат обращения',
+                     'Признак подозрения на злокачественное новообразование',
+                     'Признак развертывания индивидуального поста'],
+                    [[rng.choice(CHARACTERS), rng.choice(OUTCOMES), rng.choice(RESULTS), 'Нет', 'Нет']])
+    final2 = _table(['Листок нетрудоспособности', 'Рекомендации'],
+                    [['Не требуется', 'Наблюдение терапевта по месту жительства']])
+
+    components = [
+        _section(*SECTIONS[0], f'<text>{_text(rng, rng.randint(*anamnesis_sentences), admission)}</text>'),
+        _section(*SECTIONS[1], f'<text>{condition}</text>'
+                               f'<component><section><title>Диагноз</title><text>{diagnosis_table}</text></section></component>'),
+        _section(*SECTIONS[2], f'<text>{_text(rng, rng.randint(*anamnesis_sentences), admission)}</text>'),
+        _section(*SECTIONS[3], f'<text>{_table(["Отделение", "Дата поступления", "Койко-дней"], ward_rows)}</text>'
+                               + ''.join(ward_sections)),
+        _section(*SECTIONS[4], f'<text>{final1}</text>'
+                               f'<component><section><title>Листок нетрудоспособности</title><text>{final2}</text></section></component>'),
+    ]
+
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<ClinicalDocument xmlns="{NAMESPACE}">'
+        f'<id root="1.2.643.5.1.13.13.17.1.1" extension="DOC{seed}-{index:08d}"/>'
+        f'<effectiveTime value="{_ts(discharge)}"/>'
+        f'<recordTarget><patientRole>'
+        f'<id root="1.2.643.5.1.13.13.12.2" extension="{rng.randint(10**9, 10**10 - 1)}"/>'
+        f'<id root="1.2.643.100.3" extension="{rng.randint(10**10, 10**11 - 1)}"/>'
+        f'<patient><administrativeGenderCode code="{SEXES.index(sex) + 1}" displayName="{sex}"/>'
+        f'<birthTime value="{_ts(birth)}"/></patient>'
+        f'</patientRole></recordTarget>'
+        f'<component><structuredBody><component><section>'
+        f'<title>Сведения о госпитализации</title><text>{gosp_table}</text>{entries}'
+        f'{"".join(components)}'
+        f'</section></component></structuredBody></component>'
+        f'</ClinicalDocument>'
+    )
+
+
+def generate_corpus(directory, count, seed=0, **kwargs):
+    """
+    Writes a synthetic corpus of `count` documents to a directory as `doc_{i}.xml`.
+
+    Args:
+        directory: Output directory
+        count: Number of documents
+        seed: Corpus seed
+        **kwargs: Passed to `generate_document` (wards, researches, anamnesis_sentences)
+
+    Returns:
+        list: Paths of the written files
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'doc_{i}.xml')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(generate_document(i, seed=seed, **kwargs))
+        paths.append(path)
+    return paths
@@ -1,11 +1,25 @@
 """
 Utilities for working with tabular data from XML/JSON.
 """
-import pandas as pd
 from src.utils.helpers import clean_keys
 import os
 import json
-from tqdm import tqdm
+import hashlib
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from src.utils.lazy import lazy_import, lazy_function
+from src.utils.profiling import count
+from src.utils.errors import ErrorCollector
+
+storage = lazy_import('src.io.storage')
+pd = lazy_import('pandas')
+tqdm = lazy_function('tqdm', 'tqdm')
+ProcessPoolExecutor = lazy_function('concurrent.futures', 'ProcessPoolExecutor')
+
+DEFAULT_TABLE_CACHE_SIZE = 4096
+
+# Active cache of parse_table_as_dict, see `table_cache`
+_table_cache = None
 
 
 def parse_table(json_data, prefix='{urn:hl7-org:v3}'):
@@ -174,12 +188,16 @@ def safe_parse_table(table_data):
         parse_table_wtheader
     ]
     
-    for method in parse_methods:
+    for attempt, method in enumerate(parse_methods):
         try:
-            return method(table_data)
+            table = method(table_data)
         except Exception as e:
             continue  # Try next method
+        count(f'table.parsed_by.{method.__name__}')
+        count('table.fallbacks', attempt)
+        return table
     
+    count('table.failed')
     raise ValueError("All parsing methods failed for the given table data.")
 
 
@@ -196,44 +214,315 @@ def save_table_as_dict(table):
     return table.to_dict(orient="list")
 
 
-def build_dataframe_from_jsons(directory, extract_expressions, column_names=None):
+class TableCache:
+    """
+    Bounded LRU cache of parsed tables, keyed by a canonical hash of the raw table subtree.
+    Tables filled from templates (final tables, common research tables) repeat across
+    documents byte for byte, so their column dicts only need to be built once.
+
+    Args:
+        maxsize: Maximum number of cached tables
+    """
+
+    def __init__(self, maxsize=DEFAULT_TABLE_CACHE_SIZE):
+        if maxsize < 1:
+            raise ValueError("table cache size must be positive")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tables = OrderedDict()
+
+    @staticmethod
+    def key(table_data):
+        """
+        Returns the canonical hash of a table subtree (independent of key order).
+        """
+        canonical = json.dumps(table_data, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()
+
+    def parse(self, table_data):
+        """
+        Returns the column dict of a table, parsing it with `safe_parse_table` on a miss.
+
+        Returns:
+            dict: Table as a dictionary (a copy, callers may modify it)
+        """
+        key = self.key(table_data)
+        columns = self._tables.get(key)
+        if columns is None:
+            self.misses += 1
+            count('table.cache_misses')
+            columns = save_table_as_dict(safe_parse_table(table_data))
+            self._tables[key] = columns
+            if len(self._tables) > self.maxsize:
+                self._tables.popitem(last=False)
+        else:
+            self.hits += 1
+            count('table.cache_hits')
+            self._tables.move_to_end(key)
+        return {column: list(values) for column, values in columns.items()}
+
+    def info(self):
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: {'hits': int, 'misses': int, 'size': int, 'maxsize': int}
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._tables), 'maxsize': self.maxsize}
+
+
+@contextmanager
+def table_cache(maxsize=DEFAULT_TABLE_CACHE_SIZE):
+    """
+    Enables the table cache of `parse_table_as_dict` for the duration of the block.
+
+    Args:
+        maxsize: Maximum number of cached tables; None or 0 leaves caching off
+
+    Yields:
+        TableCache or None: The active cache
+    """
+    global _table_cache
+    if not maxsize:
+        yield None
+        return
+    previous = _table_cache
+    _table_cache = TableCache(maxsize)
+    try:
+        yield _table_cache
+    finally:
+        _table_cache = previous
+
+
+def enable_table_cache(maxsize=DEFAULT_TABLE_CACHE_SIZE):
+    """
+    Enables the table cache for the rest of the process (e.g. in a worker process),
+    keeping an already active cache.
+
+    Returns:
+        TableCache: The active cache
+    """
+    global _table_cache
+    if _table_cache is None:
+        _table_cache = TableCache(maxsize)
+    return _table_cache
+
+
+def table_cache_info():
+    """
+    Returns statistics of the active table cache.
+
+    Returns:
+        dict or None: See `TableCache.info`, None if caching is off
+    """
+    return _table_cache.info() if _table_cache is not None else None
+
+
+def parse_table_as_dict(table_data):
+    """
+    Parses a table with `safe_parse_table` and converts it to a column dict.
+    Identical tables are parsed once while a table cache is active (see `table_cache`).
+
+    Args:
+        table_data: Tabular data
+
+    Returns:
+        dict: Table as a dictionary
+
+    Raises:
+        ValueError: If all parsing methods fail.
+    """
+    if _table_cache is not None:
+        return _table_cache.parse(table_data)
+    return save_table_as_dict(safe_parse_table(table_data))
+
+
+def _eval_json_chunk(directory, filenames, column_names, extract_expressions, spill_path=None, spill_format='pickle'):
+    """
+    Evaluates extraction expressions for a chunk of JSON files and builds a typed column chunk.
+    Runs in worker processes, so it only takes picklable arguments.
+
+    Args:
+        directory (str): Path to directory (or pack) with JSON files.
+        filenames (list of str): Files of this chunk.
+        column_names (list of str): Column names for the expressions.
+        extract_expressions (list of str): Expressions evaluated against the `data` variable.
+        spill_path (str, optional): If set, the chunk is written to this file and the path is returned.
+        spill_format (str): 'pickle' or 'parquet'.
+
+    Returns:
+        tuple: (column chunk as pd.DataFrame or the path of the spilled chunk,
+            list of (filename, exception) for the files that could not be read)
+    """
+    from src.utils.parallel import _portable_error
+
+    compiled = [compile(expr, '<expression>', 'eval') for expr in extract_expressions]
+    columns = {name: [] for name in column_names}
+    columns['filename'] = []
+    failures = []
+
+    source = storage.open_source(directory)
+    for filename in filenames:
+        try:
+            data = source.load_json(filename)
+        except Exception as e:
+            failures.append((filename, _portable_error(e)))
+            continue
+
+        scope = {'data': data, 'filename': filename}
+        for col_name, code in zip(column_names, compiled):
+            try:
+                columns[col_name].append(eval(code, globals(), scope))
+            except Exception:
+                columns[col_name].append(None)
+        columns['filename'].append(filename)
+    source.close()
+
+    # Building the frame from whole columns lets pandas infer one dtype per column
+    chunk = pd.DataFrame(columns)
+
+    if spill_path is None:
+        return chunk, failures
+    _write_chunk(chunk, spill_path, spill_format)
+    return spill_path, failures
+
+
+def _write_chunk(chunk, path, spill_format):
+    """
+    Writes a column chunk to disk.
+
+    Args:
+        chunk (pd.DataFrame): Chunk to write.
+        path (str): Destination file.
+        spill_format (str): 'pickle' or 'parquet'.
+    """
+    if spill_format == 'parquet':
+        chunk.to_parquet(path, index=False)
+    elif spill_format == 'pickle':
+        chunk.to_pickle(path)
+    else:
+        raise ValueError("spill_format must be 'parquet' or 'pickle'")
+
+
+def _read_chunk(path, spill_format):
+    """
+    Reads a column chunk written by `_write_chunk`.
+
+    Args:
+        path (str): Chunk file.
+        spill_format (str): 'pickle' or 'parquet'.
+
+    Returns:
+        pd.DataFrame: The chunk.
+    """
+    if spill_format == 'parquet':
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def _iter_json_chunks(directory, json_files, column_names, extract_expressions,
+                      workers, chunk_size, spill_dir, spill_format, errors):
+    """
+    Yields column chunks in file order, evaluating them serially or in a process pool.
+    Files that cannot be read are recorded in `errors`, whose summary is printed at the end.
+
+    At most `2 * workers` chunks are in flight at a time, so a slow consumer
+    does not make finished chunks pile up in memory.
+    """
+    chunks = [json_files[i:i + chunk_size] for i in range(0, len(json_files), chunk_size)]
+    spill_ext = 'parquet' if spill_format == 'parquet' else 'pkl'
+
+    def task_args(k):
+        spill_path = None
+        if spill_dir is not None:
+            spill_path = os.path.join(spill_dir, f"chunk_{k:05d}.{spill_ext}")
+        return (directory, chunks[k], column_names, extract_expressions, spill_path, spill_format)
+
+    def load(outcome):
+        result, failures = outcome
+        for filename, exc in failures:
+            errors.record(filename, 'build_dataframe', exc)
+        if isinstance(result, str):
+            return _read_chunk(result, spill_format)
+        return result
+
+    progress = tqdm(total=len(json_files), desc="Processing files")
+    offset = 0
+    try:
+        if workers <= 1:
+            for k in range(len(chunks)):
+                chunk = load(_eval_json_chunk(*task_args(k)))
+                progress.update(len(chunks[k]))
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield chunk
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            next_chunk = 0
+            while next_chunk < len(chunks) or pending:
+                while next_chunk < len(chunks) and len(pending) < 2 * workers:
+                    pending.append((next_chunk, executor.submit(_eval_json_chunk, *task_args(next_chunk))))
+                    next_chunk += 1
+                k, future = pending.popleft()
+                chunk = load(future.result())
+                progress.update(len(chunks[k]))
+                chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+                offset += len(chunk)
+                yield chunk
+    finally:
+        progress.close()
+        errors.print_summary()
+
+
+def build_dataframe_from_jsons(directory, extract_expressions, column_names=None, workers=1,
+                               chunk_size=10000, spill_dir=None, spill_format='pickle', lazy=False, errors=None):
     """
     Builds a DataFrame where each row is a JSON file and each column is the result of one of the expressions.
 
+    Files are processed in chunks of `chunk_size`. Each chunk is evaluated (in a pool of
+    `workers` processes when `workers > 1`) straight into typed columns, so no per-row
+    dictionaries are kept around. Finished chunks can be spilled to `spill_dir` as
+    columnar files; workers then write them directly and only return the file path.
+
     Args:
-        directory (str): Path to directory with JSON files.
+        directory (str): Path to directory (or pack) with JSON files.
         extract_expressions (list of str): List of string expressions to extract values from the `data` variable.
         column_names (list of str, optional): Column names for the resulting table. If None, expressions are used as names.
+        workers (int): Number of worker processes. 1 evaluates everything in the current process.
+        chunk_size (int): Number of files per chunk.
+        spill_dir (str, optional): Directory to write finished chunks to.
+        spill_format (str): Format of spilled chunks: 'pickle', or 'parquet' (needs pyarrow,
+            and expressions must not return nested lists or dictionaries).
+        lazy (bool): If True, returns an iterator over chunk DataFrames instead of one DataFrame.
+        errors (ErrorCollector): Collector for files that cannot be read (a new one if None).
+            Errors aggregated by cause are also stored in the result's attrs['errors']
 
     Returns:
-        pd.DataFrame: Table with results.
+        pd.DataFrame or iterator of pd.DataFrame: Table with results.
     """
     if column_names is None:
         column_names = extract_expressions
 
     assert len(column_names) == len(extract_expressions), "Length of column_names must match extract_expressions"
+    if spill_format not in ('parquet', 'pickle'):
+        raise ValueError("spill_format must be 'parquet' or 'pickle'")
+    errors = errors if errors is not None else ErrorCollector()
 
-    result = []
+    with storage.open_source(directory) as source:
+        json_files = source.list_names('.json')
 
-    json_files = [f for f in os.listdir(directory) if f.endswith('.json')]
-
-    for filename in tqdm(json_files, desc="Processing files"):
-        filepath = os.path.join(directory, filename)
-        row = {}
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                for col_name, expr in zip(column_names, extract_expressions):
-                    try:
-                        row[col_name] = eval(expr)
-                    except Exception as inner_e:
-                        row[col_name] = None  # or np.nan if preferred
-        except Exception as e:
-            print(f"Error processing {filename}: {e}")
-            continue
+    if spill_dir is not None:
+        os.makedirs(spill_dir, exist_ok=True)
 
-        row["filename"] = filename  # Add filename as a column
-        result.append(row)
+    chunks = _iter_json_chunks(directory, json_files, list(column_names), list(extract_expressions),
+                               max(1, workers or 1), max(1, chunk_size), spill_dir, spill_format, errors)
+    if lazy:
+        return chunks
 
-    df = pd.DataFrame(result)
-    return df 
\ No newline at end of file
+    frames = list(chunks)
+    result_df = pd.concat(frames) if frames else pd.DataFrame()
+    result_df.attrs['errors'] = errors.summary()
+    return result_df
@@ -0,0 +1,160 @@
+"""
+Tokenization and normalization of Russian clinical text.
+
+Text is lowercased, 'ё' is read as 'е', and words are split at everything
+that is not a letter or a digit ('АД 164/86 мм рт.ст.' -> 'ад', '164', '86',
+'мм', 'рт', 'ст'). Words are reduced to their stems with the Snowball
+stemming algorithm for Russian, so the inflected forms of a word match
+('боли', 'болью', 'болей' -> 'бол'). Latin words and numbers are kept as
+they are.
+
+The stemmer is a pure-Python implementation of the published algorithm
+(https://snowballstem.org/algorithms/russian/stemmer.html); stems are cached,
+since the vocabulary of a corpus is small compared with its text.
+"""
+import re
+from functools import lru_cache
+
+STEM_CACHE_SIZE = 1 << 17
+
+_WORD = re.compile(r'[0-9a-zа-я]+')
+_VOWELS = frozenset('аеиоуыэюя')
+_A_YA = frozenset('ая')
+
+
+def _endings(*groups):
+    """
+    Returns (ending, needs a preceding 'а' or 'я') pairs, longest first.
+    Each group is (needs_a_ya, endings).
+    """
+    pairs = [(ending, needs) for needs, endings in groups for ending in endings.split()]
+    return sorted(pairs, key=lambda pair: -len(pair[0]))
+
+
+_PERFECTIVE_GERUND = _endings((True, 'в вши вшись'), (False, 'ив ивши ившись ыв ывши ывшись'))
+_ADJECTIVE = _endings((False, 'ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую юю ая яя ою ею'))
+_PARTICIPLE = _endings((True, 'ем нн вш ющ щ'), (False, 'ивш ывш ующ'))
+_REFLEXIVE = _endings((False, 'ся сь'))
+_VERB = _endings((True, 'ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно'),
+                 (False, 'ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят ует уют ит ыт ены '
+                         'ить ыть ишь ую ю'))
+_NOUN = _endings((False, 'а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам ом о у ах иях ях ы ь '
+                         'ию ью ю ия ья я'))
+_SUPERLATIVE = _endings((False, 'ейш ейше'))
+
+
+def _regions(word):
+    """
+    Returns the start of the RV and R2 regions of a word.
+    """
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i - 1] in _VOWELS and word[i] not in _VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """
+    Removes the longest of the endings that lies in word[start:]. Returns None if none
+    matches, or if the longest one needs a preceding 'а'/'я' (in the region) and lacks it.
+    """
+    for ending, needs_a_ya in endings:
+        cut = len(word) - len(ending)
+        if cut >= start and word.endswith(ending):
+            if needs_a_ya and not (cut - 1 >= start and word[cut - 1] in _A_YA):
+                return None
+            return word[:cut]
+    return None
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word):
+    """
+    Returns the Snowball stem of a lowercase Russian word; other words are returned unchanged.
+
+    Args:
+        word: Lowercase word
+
+    Returns:
+        str: Stem
+    """
+    word = word.replace('ё', 'е')
+    rv, r2 = _regions(word)
+    if rv >= len(word):
+        return word
+
+    # Step 1: perfective gerund, or reflexive followed by adjectival, verb or noun endings
+    stripped = _strip(word, rv, _PERFECTIVE_GERUND)
+    if stripped is None:
+        reflexive = _strip(word, rv, _REFLEXIVE)
+        if reflexive is not None:
+            word = reflexive
+        stripped = _strip(word, rv, _ADJECTIVE)
+        if stripped is not None:
+            participle = _strip(stripped, rv, _PARTICIPLE)
+            if participle is not None:
+                stripped = participle
+        else:
+            stripped = _strip(word, rv, _VERB)
+            if stripped is None:
+                stripped = _strip(word, rv, _NOUN)
+    if stripped is not None:
+        word = stripped
+
+    # Step 2
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Step 3: derivational ending
+    for ending in ('ость', 'ост'):
+        if word.endswith(ending) and len(word) - len(ending) >= r2:
+            word = word[:-len(ending)]
+            break
+
+    # Step 4: superlative, double 'н', soft sign
+    superlative = _strip(word, rv, _SUPERLATIVE)
+    if superlative is not None:
+        word = superlative
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        word = word[:-1]
+    elif superlative is None and word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """
+    Splits text into lowercase words ('ё' read as 'е').
+
+    Args:
+        text: Text (None gives no words)
+
+    Returns:
+        list: Words in order
+    """
+    if not text:
+        return []
+    return _WORD.findall(text.lower().replace('ё', 'е'))
+
+
+def normalize(text):
+    """
+    Splits text into stemmed words, the terms of src.io.text_index.
+
+    Args:
+        text: Text (None gives no terms)
+
+    Returns:
+        list: Terms in order
+    """
+    return [stem(word) for word in tokenize(text)]
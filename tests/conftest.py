@@ -0,0 +1,25 @@
+"""
+Shared fixtures: a small synthetic corpus run through the document stages.
+"""
+import pytest
+
+from src.io.data_processor import process_folder_to_structured_format, save_features
+from src.io.file_converter import process_files_in_directory
+from src.utils.synthetic_cda import generate_corpus
+
+CORPUS_SIZE = 12
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    """
+    Returns a dict stage -> directory ('xml', 'json', 'features', 'structured') of one corpus.
+    Tests must not modify the directories.
+    """
+    root = tmp_path_factory.mktemp('corpus')
+    paths = {stage: str(root / stage) for stage in ('xml', 'json', 'features', 'structured')}
+    generate_corpus(paths['xml'], CORPUS_SIZE, seed=0, wards=(2, 3))
+    process_files_in_directory(paths['xml'], paths['json'])
+    save_features(paths['json'], paths['features'])
+    process_folder_to_structured_format(paths['features'], paths['structured'])
+    return paths
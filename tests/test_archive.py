@@ -0,0 +1,49 @@
+"""
+Zip and tar archives as document sources.
+"""
+import gzip
+import io
+import json
+import tarfile
+import zipfile
+
+from src.io.archive import ArchiveSource
+from src.io.storage import open_source
+
+RECORDS = {f'file_{i}.json': {'id': str(i), 'text': 'Анамнез ' * i, 'values': [i, None, True]} for i in range(1, 6)}
+
+
+def _archive_members():
+    members = {f'batch/{name}': json.dumps(record).encode('utf-8') for name, record in RECORDS.items()}
+    members['batch/file_9.json.gz'] = gzip.compress(b'{"id": "9"}')
+    return members
+
+
+def test_zip_archive_source(tmp_path):
+    path = str(tmp_path / 'docs.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in _archive_members().items():
+            archive.writestr(name, data)
+    with open_source(path) as source:
+        assert isinstance(source, ArchiveSource)
+        assert len(source.list_names('.json')) == 6
+        assert source.load_json('batch/file_2.json') == RECORDS['file_2.json']
+        assert source.load_json('batch/file_9.json.gz') == {'id': '9'}
+
+
+def test_tar_archive_source_reads_in_archive_order(tmp_path):
+    path = str(tmp_path / 'docs.tar.gz')
+    members = _archive_members()
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    with ArchiveSource(path) as source:
+        assert source.sequential_reads
+        assert source.list_names('.json') == list(members)
+        read = dict(source.iter_bytes())
+        assert list(read) == list(members)
+        assert json.loads(read['batch/file_9.json.gz']) == {'id': '9'}
+        assert [name for name, _ in source.iter_bytes(['batch/file_3.json', 'batch/file_1.json'])] \
+            == ['batch/file_1.json', 'batch/file_3.json']
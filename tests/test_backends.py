@@ -0,0 +1,60 @@
+"""
+JSON backend selection and equivalence with the json module.
+"""
+import json
+import math
+
+import pytest
+
+from src.io import backends
+from src.io.backends import (available_backends, get_backends, json_dumps_compact, json_dumps_pretty, json_loads,
+                             set_backend)
+from src.io.dataset_process import create_table_generic
+
+RECORD = {'id': '1', 'tables': {'table_gosp': {'A': ['x', 'y'], 'B': [float('nan'), 'z']}},
+          'values': [1e16, 1 / 3, -2.5e-07, None, True, 'Анамнез "жизни"\n']}
+
+
+@pytest.fixture
+def restore_backends():
+    selected = get_backends()
+    yield
+    for kind, name in selected.items():
+        set_backend(kind, name)
+
+
+def test_selected_backends_pass_the_probe():
+    for kind, name in get_backends().items():
+        assert name in available_backends()[kind]
+        assert backends._probe_ok(kind, backends._REGISTRY[kind][0][name])
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        set_backend('loads', 'simdjson')
+
+
+@pytest.mark.parametrize('name', available_backends()['loads'])
+def test_loads_reads_what_the_json_module_writes(name, restore_backends):
+    set_backend('loads', name)
+    text = json.dumps(RECORD, ensure_ascii=False)
+    for data in (text, text.encode('utf-8')):
+        result = json_loads(data)
+        assert math.isnan(result['tables']['table_gosp']['B'][0])
+        assert json.dumps(result, ensure_ascii=False) == text
+    with pytest.raises(json.JSONDecodeError):
+        json_loads(b'{"id": ')
+
+
+def test_dumps_match_the_json_module():
+    assert json_dumps_compact(RECORD) == json.dumps(RECORD, ensure_ascii=False, separators=(',', ':'))
+    assert json_dumps_pretty(RECORD) == json.dumps(RECORD, ensure_ascii=False, indent=4)
+
+
+def test_tables_read_records_with_missing_cells(tmp_path):
+    with open(tmp_path / 'file_1.json', 'w', encoding='utf-8') as file:
+        json.dump(RECORD, file, ensure_ascii=False, indent=4)
+    table = create_table_generic(str(tmp_path), "pd.DataFrame.from_dict(data['tables']['table_gosp'])",
+                                 id_column_name='table_gosp_id')
+    assert table.attrs['errors'] == []
+    assert table['B'].isna().tolist() == [True, False]
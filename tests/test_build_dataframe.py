@@ -0,0 +1,56 @@
+"""
+build_dataframe_from_jsons builds the same table serially, in chunks, in workers and spilled to disk.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.utils.table_utils import build_dataframe_from_jsons
+
+EXPRESSIONS = ["data['id']", "data['sex']", "data['birth_date']", "len(data['ward_list'] or [])",
+               "data['tables']['table_gosp']"]
+COLUMNS = ['id', 'sex', 'birth_date', 'wards', 'table_gosp']
+
+
+@pytest.fixture(scope='module')
+def serial(corpus):
+    return build_dataframe_from_jsons(corpus['structured'], EXPRESSIONS, COLUMNS)
+
+
+def test_serial_table(corpus, serial):
+    assert list(serial.columns) == COLUMNS + ['filename']
+    assert len(serial) == len(os.listdir(corpus['structured']))
+    assert serial['wards'].between(2, 3).all()
+    assert serial.attrs['errors'] == []
+
+
+@pytest.mark.parametrize('workers, chunk_size, spill', [(1, 5, False), (1, 5, True), (2, 3, False), (2, 4, True)])
+def test_chunked_table_matches_serial(corpus, serial, tmp_path, workers, chunk_size, spill):
+    spill_dir = str(tmp_path / 'spill') if spill else None
+    result = build_dataframe_from_jsons(corpus['structured'], EXPRESSIONS, COLUMNS, workers=workers,
+                                        chunk_size=chunk_size, spill_dir=spill_dir)
+    pd.testing.assert_frame_equal(result, serial)
+    if spill:
+        assert len(os.listdir(spill_dir)) == -(-len(serial) // chunk_size)
+
+
+def test_lazy_chunks(corpus, serial):
+    chunks = list(build_dataframe_from_jsons(corpus['structured'], EXPRESSIONS, COLUMNS, chunk_size=5, lazy=True))
+    assert [len(chunk) for chunk in chunks] == [5, 5, 2]
+    pd.testing.assert_frame_equal(pd.concat(chunks), serial, check_exact=True)
+
+
+def test_unreadable_files_are_recorded(corpus, serial, tmp_path):
+    directory = tmp_path / 'input'
+    shutil.copytree(corpus['structured'], directory)
+    (directory / 'broken.json').write_text('{"broken": ', encoding='utf-8')
+
+    result = build_dataframe_from_jsons(str(directory), EXPRESSIONS + ["data['missing']"], COLUMNS + ['missing'],
+                                        workers=2, chunk_size=5)
+    assert result['missing'].isna().all()
+    pd.testing.assert_frame_equal(result.drop(columns='missing').sort_values('filename', ignore_index=True),
+                                  serial.sort_values('filename', ignore_index=True))
+    assert [(cause['stage'], cause['count'], cause['files']) for cause in result.attrs['errors']] == \
+        [('build_dataframe', 1, ['broken.json'])]
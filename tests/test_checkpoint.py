@@ -0,0 +1,106 @@
+"""
+Checkpoints: an interrupted and resumed run writes the same output and errors as an uninterrupted one.
+"""
+import os
+import shutil
+
+import pytest
+
+from src.io import data_processor, dataset_process
+from src.io.checkpoint import Checkpoint
+from src.io.data_processor import save_features
+from src.io.dataset_process import create_table_generic
+from src.io.storage import open_source
+from src.utils.errors import ErrorCollector, load_error_log
+
+ACCESSOR = "pd.DataFrame.from_dict(data['tables']['table_gosp'])"
+
+
+class Interrupted(BaseException):
+    """
+    Stands for a crash: not an Exception, so it is not collected as a document error.
+    """
+
+
+def interrupt_after(monkeypatch, module, name, calls):
+    original = getattr(module, name)
+    seen = []
+
+    def wrapper(*args, **kwargs):
+        seen.append(1)
+        if len(seen) > calls:
+            raise Interrupted
+        return original(*args, **kwargs)
+    monkeypatch.setattr(module, name, wrapper)
+
+
+def with_failures(directory, tmp_path):
+    """
+    Copies a stage of the corpus and adds two documents that fail.
+    """
+    path = tmp_path / 'input'
+    shutil.copytree(directory, path)
+    (path / 'doc_1a.json').write_text('{"broken": ', encoding='utf-8')
+    (path / 'doc_6a.json').write_text('[]', encoding='utf-8')
+    return str(path)
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {name: source.load_json(name) for name in source.list_names('.json')}
+
+
+@pytest.mark.parametrize('output_name', ['features', 'features.pack'])
+def test_save_features_resumes(corpus, tmp_path, monkeypatch, output_name):
+    inputs = with_failures(corpus['json'], tmp_path)
+    expected_stats = save_features(inputs, str(tmp_path / 'expected'))
+    output = str(tmp_path / output_name)
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, data_processor, '_extract_document', 8)
+        with pytest.raises(Interrupted):
+            save_features(inputs, output, checkpoint_every=3)
+    stats = save_features(inputs, output, resume=True, checkpoint_every=3)
+
+    assert stats['errors'] == expected_stats['errors'] == 2
+    assert stats['error_causes'] == expected_stats['error_causes']
+    assert read_all(output) == read_all(str(tmp_path / 'expected'))
+    assert not any(name.endswith(('.checkpoint', '.errors.jsonl')) for name in os.listdir(tmp_path))
+
+
+def test_create_table_generic_resumes(corpus, tmp_path, monkeypatch):
+    inputs = with_failures(corpus['structured'], tmp_path)
+    expected = create_table_generic(inputs, ACCESSOR, id_column_name='table_gosp_id')
+    checkpoints = str(tmp_path / 'checkpoints')
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, dataset_process, 'load_fields', 9)
+        with pytest.raises(Interrupted):
+            create_table_generic(inputs, ACCESSOR, id_column_name='table_gosp_id', checkpoint_dir=checkpoints,
+                                 checkpoint_every=4)
+    assert any(name.endswith('.errors.jsonl') for name in os.listdir(checkpoints))
+    result = create_table_generic(inputs, ACCESSOR, id_column_name='table_gosp_id', checkpoint_dir=checkpoints,
+                                  checkpoint_every=4, resume=True)
+
+    assert result.equals(expected)
+    assert result.attrs['errors'] == expected.attrs['errors'] and len(expected.attrs['errors']) == 2
+    assert os.listdir(checkpoints) == []
+
+
+def test_checkpoint_appends_errors(tmp_path):
+    path = str(tmp_path / 'job.checkpoint')
+    errors = ErrorCollector()
+    errors.record('before', 'earlier_job', ValueError('not saved'))
+    checkpoint = Checkpoint(path, 'job', 'input', errors=errors)
+
+    for position in range(3):
+        errors.record(f'file_{position}', 'job', ValueError(f'failed {position}'))
+        checkpoint.save({'position': position + 1})
+    errors.record('file_3', 'job', ValueError('after the last checkpoint'))
+
+    with open(path, encoding='utf-8') as file:
+        assert 'failed' not in file.read()
+    assert [entry['file'] for entry in load_error_log(checkpoint.errors_path)] == ['file_0', 'file_1', 'file_2']
+
+    resumed = ErrorCollector()
+    state = Checkpoint(path, 'job', 'input', errors=resumed).load()
+    assert state['position'] == 3
+    assert resumed.failed_files() == ['file_0', 'file_1', 'file_2']
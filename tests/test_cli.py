@@ -0,0 +1,62 @@
+"""
+Command-line runner: stage ranges, outputs of every stage and the JSON summary.
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from src.cli import GENERIC_TABLES, STAGES, main, run_pipeline, stage_output
+from src.io.storage import open_source
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {name: source.load_json(name) for name in source.list_names('.json')}
+
+
+def test_full_pipeline(corpus, tmp_path, capsys):
+    output = tmp_path / 'out'
+    main([corpus['xml'], str(output), '--workers', '2', '--error-logs'])
+    summary = json.loads(capsys.readouterr().out)
+
+    assert list(summary['stages']) == list(STAGES)
+    assert summary['errors'] == 0
+    for stage in STAGES:
+        assert summary['stages'][stage]['success'] == len(os.listdir(corpus['xml']))
+    for stage in ('json', 'features', 'structured'):
+        assert read_all(str(output / stage)) == read_all(corpus[stage])
+
+    tables = sorted(os.listdir(output / 'tables'))
+    assert tables == sorted(f'{name}.csv' for name in ['patients', 'ward_list', *GENERIC_TABLES])
+    patients = pd.read_csv(output / 'tables' / 'patients.csv')
+    assert len(patients) == summary['stages']['tables']['tables']['patients']
+
+
+def test_stage_range_and_summary_file(corpus, tmp_path, capsys):
+    output = str(tmp_path / 'out')
+    summary_path = str(tmp_path / 'summary.json')
+    main([corpus['features'], output, '--from', 'structured', '--to', 'structured',
+          '--output-format', 'pack', '--summary', summary_path])
+    assert capsys.readouterr().out == ''
+
+    with open(summary_path, encoding='utf-8') as file:
+        summary = json.load(file)
+    assert list(summary['stages']) == ['structured']
+    assert summary['stages']['structured']['output'] == stage_output(output, 'structured', 'pack')
+    assert read_all(stage_output(output, 'structured', 'pack')) == read_all(corpus['structured'])
+
+
+def test_incremental_run_skips_converted(corpus, tmp_path, capsys):
+    output = str(tmp_path / 'out')
+    run_pipeline(corpus['xml'], output, last='convert')
+    summary = run_pipeline(corpus['xml'], output, last='convert', incremental=True)
+    assert summary['stages']['convert']['skipped'] == len(os.listdir(corpus['xml']))
+
+
+def test_invalid_options(corpus, tmp_path, capsys):
+    with pytest.raises(ValueError):
+        run_pipeline(corpus['xml'], str(tmp_path), first='tables', last='convert')
+    with pytest.raises(SystemExit):
+        main([corpus['xml'], str(tmp_path), '--output-format', 'pack', '--compress', 'gz'])
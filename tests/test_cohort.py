@@ -0,0 +1,63 @@
+"""
+Compressed bitmaps and cohort queries over tables.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.io.cohort import ARRAY_LIMIT, Bitmap, CohortIndex
+
+
+@pytest.fixture
+def card_sets():
+    rng = np.random.default_rng(0)
+    # Sparse chunks (array containers) and a dense one (bitset container)
+    dense = np.arange(1 << 16, (1 << 16) + 3 * ARRAY_LIMIT)
+    a = np.concatenate([rng.integers(0, 1 << 16, 500), dense[::2], rng.integers(5 << 16, 6 << 16, 100)])
+    b = np.concatenate([rng.integers(0, 1 << 16, 800), dense[::3]])
+    return a, b
+
+
+def test_bitmap_set_operations(card_sets):
+    a, b = card_sets
+    left, right = Bitmap.from_cards(a), Bitmap.from_cards(b)
+    assert any(container.dtype == np.uint64 for container in left.containers)
+    np.testing.assert_array_equal(left.to_array(), np.unique(a))
+    np.testing.assert_array_equal((left & right).to_array(), np.intersect1d(a, b))
+    np.testing.assert_array_equal((left | right).to_array(), np.union1d(a, b))
+    np.testing.assert_array_equal((left - right).to_array(), np.setdiff1d(a, b))
+    assert len(left) == len(np.unique(a))
+    assert int(a[0]) in left and (7 << 16) not in left
+
+
+def test_bitmap_complement_needs_universe():
+    with pytest.raises(ValueError):
+        ~Bitmap.from_cards([1, 2])
+    universe = Bitmap.from_cards(range(10))
+    assert list(~Bitmap.from_cards([1, 2], universe=universe)) == [0, 3, 4, 5, 6, 7, 8, 9]
+
+
+def test_cohort_index_queries():
+    patients = pd.DataFrame({'id_card': [0, 1, 2, 3, 4, 5],
+                             'sex': pd.Categorical(['Мужской', 'Женский', 'Мужской', 'Мужской', 'Женский', 'Мужской']),
+                             'hospitalization_outcome': ['Выписан', 'Выписан', 'Умер', 'Выписан', None, 'Выписан'],
+                             'disease_history': [f'текст {i}' for i in range(6)]})
+    ward_list = pd.DataFrame({'id_card': [0, 0, 2, 3, 5], 'ward_list_id': range(5),
+                              'column_name': ['Кардиология', 'Хирургия', 'Кардиология', 'Терапия', 'Хирургия'],
+                              'options': [['a'], ['a', 'b'], ['b'], [], ['c']]})
+    cohort = CohortIndex.from_tables(patients=patients)
+    # Few rows per value: the default limits would leave these columns out
+    cohort.add_table('ward_list', ward_list, columns=['column_name', 'options'])
+
+    assert 'patients.disease_history' not in cohort.bitmaps  # free text is not indexed
+    assert cohort.values('patients.sex') == {'Женский': 2, 'Мужской': 4}
+    selected = (cohort.eq('patients.sex', 'Мужской')
+                & cohort.isin('ward_list.column_name', ['Кардиология', 'Хирургия'])
+                & ~cohort.eq('patients.hospitalization_outcome', 'Умер'))
+    assert list(selected) == [0, 5]
+    assert list(cohort.eq('ward_list.options', 'b')) == [0, 2]
+    assert cohort.rows(selected, 'ward_list')['ward_list_id'].tolist() == [0, 1, 4]
+    assert cohort.rows(selected, 'patients', ['id_card']).to_dict('list') == {'id_card': [0, 5]}
+    assert len(cohort.eq('patients.sex', 'Неизвестно')) == 0
+    with pytest.raises(KeyError):
+        cohort.eq('patients.unknown', 1)
@@ -0,0 +1,46 @@
+"""
+Compressed stage outputs are read back transparently by the next stage.
+"""
+import gzip
+import io
+import os
+
+import pytest
+
+from src.io.compression import normalize_compression, open_file, strip_compression_suffix, wrap_stream
+from src.io.data_processor import process_folder_to_structured_format, save_features
+from src.io.file_converter import process_files_in_directory
+from src.io.storage import open_source
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {strip_compression_suffix(name): source.load_json(name) for name in source.list_names('.json')}
+
+
+@pytest.mark.parametrize('compress, suffix', [(True, '.gz'), ('xz', '.xz'), ('bz2', '.bz2')])
+def test_compressed_stages(corpus, tmp_path, compress, suffix):
+    json_dir, features_dir, structured_dir = (str(tmp_path / stage) for stage in ('json', 'features', 'structured'))
+    process_files_in_directory(corpus['xml'], json_dir, compress=compress)
+    save_features(json_dir, features_dir, compress=compress)
+    process_folder_to_structured_format(features_dir, structured_dir, compress=compress)
+
+    for stage, path in (('json', json_dir), ('features', features_dir), ('structured', structured_dir)):
+        assert all(name.endswith('.json' + suffix) for name in os.listdir(path))
+        assert read_all(path) == read_all(corpus[stage])
+
+
+def test_open_file_round_trip(tmp_path):
+    for name in ('plain.json', 'packed.json.gz', 'packed.json.xz', 'packed.json.bz2'):
+        with open_file(str(tmp_path / name), 'w') as file:
+            file.write('{"текст": 1}')
+        with open_file(str(tmp_path / name)) as file:
+            assert file.read() == b'{"\xd1\x82\xd0\xb5\xd0\xba\xd1\x81\xd1\x82": 1}'
+    assert gzip.decompress((tmp_path / 'packed.json.gz').read_bytes()) == '{"текст": 1}'.encode('utf-8')
+    assert wrap_stream(io.BytesIO(gzip.compress(b'data')), 'member.GZ').read() == b'data'
+
+
+def test_normalize_compression():
+    assert [normalize_compression(value) for value in (None, False, True, 'xz', '.BZ2')] == ['', '', '.gz', '.xz', '.bz2']
+    with pytest.raises(ValueError):
+        normalize_compression('zip')
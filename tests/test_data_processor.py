@@ -0,0 +1,30 @@
+"""
+The single-file steps record failures in an ErrorCollector instead of printing them.
+"""
+import os
+
+import pytest
+
+from src.io.data_processor import modify_json, process_file_to_structured_format
+from src.utils.errors import ErrorCollector
+
+
+@pytest.mark.parametrize('function, stage, input_stage', [
+    (modify_json, 'extract_features', 'json'),
+    (process_file_to_structured_format, 'structured_format', 'features'),
+])
+def test_single_file_errors_are_recorded(function, stage, input_stage, corpus, tmp_path, capsys):
+    broken = tmp_path / 'broken.json'
+    broken.write_text('{"broken": ', encoding='utf-8')
+    errors = ErrorCollector()
+
+    assert function(str(broken), str(tmp_path / 'out.json'), errors=errors) is False
+    assert not (tmp_path / 'out.json').exists()
+    assert errors.failed_files() == [str(broken)]
+    assert errors.records[0]['stage'] == stage
+    assert capsys.readouterr().out == ''
+
+    name = sorted(os.listdir(corpus[input_stage]))[0]
+    assert function(os.path.join(corpus[input_stage], name), str(tmp_path / 'out.json'), errors=errors) is True
+    assert len(errors) == 1
+    assert (tmp_path / 'out.json').exists()
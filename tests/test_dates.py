@@ -0,0 +1,53 @@
+"""
+Vectorized parsing of HL7 TS, dd.mm.yyyy and ISO dates.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from src.utils.dates import age_in_years, days_between, parse_dates, parse_hl7_ts
+
+
+def dates(*values):
+    return np.array([np.datetime64(value) if value else np.datetime64('NaT') for value in values],
+                    dtype='datetime64[s]')
+
+
+def test_parse_hl7_ts_precisions():
+    result, precision = parse_hl7_ts(['1950', '195003', '19500315', '1950031514', '195003151430',
+                                      '19500315143005', '19500315143005.123+0300', '2023-04-28'],
+                                     return_precision=True)
+    np.testing.assert_array_equal(result, dates('1950-01-01', '1950-03-01', '1950-03-15', '1950-03-15T14:00',
+                                                '1950-03-15T14:30', '1950-03-15T14:30:05', '1950-03-15T14:30:05',
+                                                None))
+    assert list(precision) == ['year', 'month', 'day', 'hour', 'minute', 'second', 'second', None]
+
+
+def test_parse_hl7_ts_rejects_malformed_suffixes():
+    values = ['202304281530+03', '202304281530+03000', '2023+00x0', '20230428.5', '20230428153000.', '2023042']
+    assert np.isnat(parse_hl7_ts(values)).all()
+
+
+def test_parse_dates_formats():
+    values = ['20230428', '202304281530+0300', '28.04.2023', '28.04.2023 10:30', '28.04.2023 10:30:15',
+              '2023-04-28', '2023-04-28 10:30:15', '2023-04-28T10:30', None, '', 'вчера', '2023-02-30',
+              '31.04.2023']
+    expected = dates('2023-04-28', '2023-04-28T15:30', '2023-04-28', '2023-04-28T10:30', '2023-04-28T10:30:15',
+                     '2023-04-28', '2023-04-28T10:30:15', '2023-04-28T10:30', None, None, None, None, None)
+    np.testing.assert_array_equal(parse_dates(values), expected)
+
+
+def test_parse_dates_reads_dates_written_to_csv():
+    birth = pd.Series(parse_dates(['19810221', '19500315']))
+    written = pd.read_csv(io.StringIO(pd.DataFrame({'birth_date': birth}).to_csv(index=False)))
+    np.testing.assert_array_equal(parse_dates(written['birth_date'].to_numpy(dtype=object)), birth.to_numpy())
+
+
+def test_age_and_days():
+    birth = dates('1981-02-21', '1981-02-21', None)
+    reference = dates('2023-02-20', '2023-02-21', '2023-02-21')
+    np.testing.assert_array_equal(age_in_years(birth, reference), [41.0, 42.0, np.nan])
+    np.testing.assert_array_equal(days_between(dates('2023-02-27T23:00', None, '2024-02-28'),
+                                               dates('2023-03-01T01:00', '2023-03-01', '2024-03-01')),
+                                  [2.0, np.nan, 2.0])
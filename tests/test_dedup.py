@@ -0,0 +1,66 @@
+"""
+Duplicate detection by content hash and (patient id, document id) key.
+"""
+import os
+import shutil
+
+from src.io.dedup import SeenSet, content_hash, document_key, find_duplicates
+from src.io.file_converter import process_files_in_directory
+from src.io.storage import DirectorySource
+from src.utils.synthetic_cda import generate_corpus
+
+
+def test_content_hash_ignores_formatting():
+    document = b'<a>\n  <b>x</b>\n</a>'
+    assert content_hash(b'\xef\xbb\xbf' + document.replace(b'\n', b'\r\n')) == content_hash(document)
+    assert content_hash(b'<a><b>x</b></a>') == content_hash(document)
+    assert content_hash(b'<a><b>y</b></a>') != content_hash(document)
+
+
+def test_document_key_needs_both_ids():
+    assert document_key(12, 'D-1') == ('12', 'D-1')
+    assert document_key('', 'D-1') is None
+    assert document_key('12', None) is None
+
+
+def test_seen_set_is_persisted(tmp_path):
+    path = str(tmp_path / 'seen' / 'convert.seen.jsonl')
+    with SeenSet(path) as seen:
+        seen.add('abc', ('1', 'D-1'))
+        assert seen.duplicate_of('abc') == 'content'
+    with SeenSet(path) as seen:
+        assert len(seen) == 1
+        assert seen.duplicate_of('other', ('1', 'D-1')) == 'id'
+        assert seen.duplicate_of('other', ('1', 'D-2')) is None
+
+
+def test_find_duplicates(tmp_path):
+    records = {
+        'file_1.json': b'{"id": "1", "document_id": "A", "x": 1}',
+        'file_2.json': b'{"id": "1", "document_id": "A", "x": 1}',  # same content
+        'file_3.json': b'{"id": "1", "document_id": "A", "x": 2}',  # same ids, resent
+        'file_4.json': b'{"id": "2", "document_id": "B"}',
+    }
+    for name, data in records.items():
+        (tmp_path / name).write_bytes(data)
+    with DirectorySource(str(tmp_path)) as source, SeenSet() as seen:
+        duplicates = find_duplicates(source, list(records), seen)
+    assert duplicates == {'file_2.json': 'content', 'file_3.json': 'id'}
+
+
+def test_convert_skips_duplicates_across_runs(tmp_path):
+    first, second = tmp_path / 'batch_1', tmp_path / 'batch_2'
+    generate_corpus(str(first), 3)
+    os.makedirs(second)
+    # The second batch resends doc_1 and adds a new document
+    shutil.copy(first / 'doc_1.xml', second / 'doc_1.xml')
+    generate_corpus(str(tmp_path / 'new'), 4)
+    shutil.copy(tmp_path / 'new' / 'doc_3.xml', second / 'doc_3.xml')
+
+    seen = str(tmp_path / 'dedup' / 'convert.seen.jsonl')
+    output = tmp_path / 'json'
+    stats = process_files_in_directory(str(first), str(output), dedup=seen)
+    assert (stats['success'], stats['duplicates']) == (3, 0)
+    stats = process_files_in_directory(str(second), str(output), dedup=seen)
+    assert (stats['success'], stats['duplicates']) == (1, 1)
+    assert sorted(os.listdir(output)) == ['doc_0.json', 'doc_1.json', 'doc_2.json', 'doc_3.json']
@@ -0,0 +1,25 @@
+"""
+Importing the packages must not load the heavy dependencies (see src.utils.lazy).
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('pandas', 'numpy', 'lxml')
+
+
+@pytest.mark.parametrize('statement', [
+    'import src',
+    'import src.io',
+    'import src.io; from src.io import xml_to_dict, extract_features, PackReader',
+    'import src.utils',
+    'import src.parsers',
+])
+def test_import_does_not_load_heavy_modules(statement):
+    probe = f"{statement}\nimport json, sys\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, '-c', probe], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []
@@ -0,0 +1,36 @@
+"""
+JSON Lines shards: rotation, compression and rewritten records.
+"""
+import os
+
+from src.io.jsonl import JsonlShardSource, JsonlShardWriter
+from src.io.storage import open_source
+
+RECORDS = {f'file_{i}.json': {'id': str(i), 'text': 'Анамнез ' * i, 'values': [i, None, True]} for i in range(1, 6)}
+
+
+def test_jsonl_shards_round_trip(tmp_path):
+    directory = str(tmp_path / 'shards')
+    with JsonlShardWriter(directory, shard_size=2, compress='gz') as writer:
+        for name, record in RECORDS.items():
+            writer.write(name, record)
+    assert sorted(os.listdir(directory)) == ['part-00000.jsonl.gz', 'part-00001.jsonl.gz', 'part-00002.jsonl.gz']
+    with open_source(directory) as source:
+        assert isinstance(source, JsonlShardSource)
+        assert source.list_names('.json') == list(RECORDS)
+        assert source.load_json('file_4.json') == RECORDS['file_4.json']
+        assert [name for name, _ in source.iter_bytes()] == list(RECORDS)
+
+
+def test_jsonl_rewritten_record_last_wins(tmp_path):
+    directory = str(tmp_path / 'shards')
+    with JsonlShardWriter(directory, shard_size=10) as writer:
+        writer.write('a.json', {'v': 1})
+        writer.write('b.json', {'v': 2})
+    # A rerun appends a new version of a.json in a new shard
+    with JsonlShardWriter(directory, shard_size=10) as writer:
+        writer.write('a.json', {'v': 3})
+    with JsonlShardSource(directory) as source:
+        assert source.load_json('a.json') == {'v': 3}
+        records = dict(source)
+    assert records == {'b.json': {'v': 2}, 'a.json': {'v': 3}}
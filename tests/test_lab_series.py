@@ -0,0 +1,96 @@
+"""
+Per-patient lab series: the segmented queries agree with a per-patient loop.
+"""
+import numpy as np
+import pytest
+
+from src.io.lab_series import ParameterSeries
+
+DAY = np.timedelta64(1, 'D')
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    id_card = np.sort(rng.integers(0, 40, 400))
+    times = np.datetime64('2021-01-01T00:00') + rng.integers(0, 30 * 24, 400) * np.timedelta64(1, 'h')
+    order = np.lexsort((times, id_card))
+    values = rng.uniform(50, 180, 400).round(1)
+    values[::37] = np.nan
+    return ParameterSeries.from_observations('Гемоглобин', id_card[order], times[order], values[order])
+
+
+def patients(series):
+    for i, card in enumerate(series.cards):
+        part = slice(series.offsets[i], series.offsets[i + 1])
+        yield card, series.times[part], series.values[part]
+
+
+def reference_max_drop(times, values, relative, within):
+    best = 0.0
+    for j in range(len(values)):
+        for k in range(j + 1):
+            if within is not None and times[j] - times[k] > within:
+                continue
+            drop = values[k] - values[j]
+            if relative:
+                drop = drop / values[k] if values[k] > 0 else np.nan
+            best = np.fmax(best, drop)
+    return best
+
+
+def test_from_observations_drops_missing(series):
+    assert not np.isnan(series.values).any()
+    assert series.offsets[-1] == len(series.values) == 400 - len(range(0, 400, 37))
+    assert (series.counts > 0).all()
+
+
+@pytest.mark.parametrize('relative', [False, True])
+@pytest.mark.parametrize('within', [None, 2, np.timedelta64(12, 'h')])
+def test_max_drop(series, relative, within):
+    window = None if within is None else np.timedelta64(int(within * 86400), 's') \
+        if not isinstance(within, np.timedelta64) else within
+    expected = [reference_max_drop(times, values, relative, window) for _, times, values in patients(series)]
+    np.testing.assert_allclose(series.max_drop(relative=relative, within=within), expected)
+
+
+def test_summaries(series):
+    frame = series.to_frame()
+    for i, (card, _, values) in enumerate(patients(series)):
+        row = frame.iloc[i]
+        assert row['id_card'] == card and row['count'] == len(values)
+        assert (row['first'], row['last'], row['min'], row['max']) == \
+            (values[0], values[-1], values.min(), values.max())
+        assert row['mean'] == pytest.approx(values.mean())
+        assert row['change'] == pytest.approx(values[-1] - values[0])
+
+
+def test_window(series):
+    start = np.datetime64('2021-01-10')
+    cards = series.cards[::2]
+    ends = start + np.arange(len(cards)) * DAY
+    kept = series.window(start, ends, cards=cards)
+
+    bounds = dict(zip(cards.tolist(), ends))
+    expected = {}
+    for card, times, values in patients(series):
+        keep = (times >= start) & ((times <= bounds[card]) if card in bounds else True)
+        if keep.any():
+            expected[card] = values[keep].tolist()
+    assert kept.cards.tolist() == list(expected)
+    assert [values.tolist() for _, _, values in patients(kept)] == list(expected.values())
+
+
+def test_window_without_cards_aligns_with_series(series):
+    ends = np.full(len(series), np.datetime64('NaT'), dtype='datetime64[s]')
+    ends[0] = series.times[0]
+    kept = series.window(end=ends)
+    assert kept.counts[0] == 1
+    np.testing.assert_array_equal(kept.values[1:], series.values[series.offsets[1]:])
+
+
+def test_empty_series():
+    empty = ParameterSeries.from_observations('СРБ', [], np.array([], dtype='datetime64[s]'), [])
+    assert len(empty) == 0
+    assert len(empty.max_drop()) == 0 and len(empty.max_drop(within=1)) == 0
+    assert len(empty.window(np.datetime64('2021-01-01'))) == 0
@@ -0,0 +1,53 @@
+"""
+Long-format lab store: splitting of results, queries and persistence.
+"""
+import numpy as np
+import pytest
+
+from src.io.lab_store import LabStore, LabStoreBuilder, split_values
+
+
+def test_split_values():
+    values, qualifiers, units = split_values(['5,2 ммоль/л', '6.9 10^9/л', '<0.5', '>= 1000 ед', '1 000',
+                                              '12 345,6 мл', '50с', '1.2-3.4', 'отрицательно', None])
+    np.testing.assert_array_equal(values, [5.2, 6.9, 0.5, 1000, 1000, 12345.6, 50, np.nan, np.nan, np.nan])
+    assert list(qualifiers) == [None, None, '<', '≥', None, None, None, None, None, None]
+    assert list(units) == ['ммоль/л', '10^9/л', None, 'ед', None, 'мл', 'с', None, None, None]
+
+
+@pytest.fixture
+def store():
+    builder = LabStoreBuilder()
+    builder.add_table(1, {'Показатель': ['Гемоглобин', 'СРБ'], 'Результат': ['120', '<0.5'],
+                          'Ед. изм.': ['г/л', 'мг/л']}, 'Терапия', 'Общий анализ крови от 26.07.2021')
+    builder.add_table(1, {'Показатель': ['Гемоглобин'], 'Результат': ['90 г/л']},
+                      'Терапия', 'Общий анализ крови от 30.07.2021')
+    builder.add_table(2, {'Показатель': ['Гемоглобин', 'СРБ'], 'Результат': ['85 г/л', '12']},
+                      'Хирургия', 'Общий анализ крови от 27.07.2021 10:30')
+    return builder.build()
+
+
+def test_queries_skip_censored_results(store):
+    assert len(store) == 5
+    assert store.cards('Гемоглобин', high=100).tolist() == [1, 2]
+    assert store.cards('СРБ', low=0.1).tolist() == [2]
+    assert store.cards('СРБ', low=0.1, censored=True).tolist() == [1, 2]
+    rows = store.query('СРБ', censored=True)
+    assert rows['qualifier'].tolist()[0] == '<' and rows['unit'].tolist()[0] == 'мг/л'
+    assert store.query('Гемоглобин', unit='г/л')['value'].tolist() == [120, 90, 85]
+    assert store.series('СРБ').cards.tolist() == [2]
+
+
+def test_rows_are_sorted_and_dated(store):
+    frame = store.to_frame(store.rows('Гемоглобин'))
+    assert frame['id_card'].tolist() == [1, 1, 2]
+    assert frame['research'].tolist() == ['Общий анализ крови'] * 3
+    assert frame['research_date'].tolist()[2] == np.datetime64('2021-07-27T10:30')
+
+
+def test_save_and_load(store, tmp_path):
+    path = str(tmp_path / 'labs.npz')
+    store.save(path)
+    loaded = LabStore.load(path)
+    assert loaded.to_frame().equals(store.to_frame())
+    assert loaded.parameters == ['Гемоглобин', 'СРБ']
@@ -0,0 +1,81 @@
+"""
+Section layout resolution: reordered templates give the same features, layouts are cached by fingerprint.
+"""
+import copy
+import json
+import os
+
+import pytest
+
+from src.io.data_processor import extract_features
+from src.parsers import layout
+from src.parsers.layout import (PREFIX, clear_layout_cache, document_layout, layout_cache_info, layout_fingerprint,
+                                resolve_layout)
+from src.parsers.base_parser import SUB_PATH
+from src.utils.helpers import find_section_by_optimized_path
+
+STANDARD = {'disease_anamnesis': 0, 'condition': 1, 'life_anamnesis': 2, 'departments': 3, 'final': 4,
+            'hosp_type': 2, 'hosp_way': 3}
+
+
+@pytest.fixture
+def document(corpus):
+    name = sorted(os.listdir(corpus['json']))[0]
+    with open(os.path.join(corpus['json'], name), encoding='utf-8') as file:
+        return json.load(file)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_layout_cache()
+    yield
+    clear_layout_cache()
+
+
+def reordered(document, drop_codes=False):
+    """
+    Returns a copy of a document with the sections and entries in reverse order.
+    """
+    document = copy.deepcopy(document)
+    body = find_section_by_optimized_path(document, SUB_PATH)
+    body[PREFIX + 'component'].reverse()
+    body[PREFIX + 'entry'].reverse()
+    if drop_codes:
+        for component in body[PREFIX + 'component']:
+            component[PREFIX + 'section'].pop(PREFIX + 'code', None)
+    return document
+
+
+def test_standard_layout(document):
+    assert resolve_layout(document) == STANDARD
+    assert resolve_layout({}) == STANDARD
+    assert layout_fingerprint({}) == ((), ())
+
+
+@pytest.mark.parametrize('drop_codes', [False, True])
+def test_reordered_template_gives_the_same_features(document, drop_codes):
+    other = reordered(document, drop_codes)
+    assert resolve_layout(other) == {'disease_anamnesis': 4, 'condition': 3, 'life_anamnesis': 2, 'departments': 1,
+                                     'final': 0, 'hosp_type': 1, 'hosp_way': 0}
+    assert extract_features(other) == extract_features(document)
+
+
+def test_layouts_are_cached_by_fingerprint(document, monkeypatch):
+    with document_layout(document) as positions:
+        assert positions == STANDARD
+        extract_features(document)
+    assert layout_cache_info()['misses'] == 1
+    assert layout._current == (None, None)
+
+    resolve_layout(copy.deepcopy(document))
+    resolve_layout(reordered(document))
+    info = layout_cache_info()
+    assert (info['layouts'], info['misses']) == (2, 2)
+    assert info['hits'] >= 1
+
+    # The standard layout is the least recently used one and is evicted
+    monkeypatch.setattr(layout, 'LAYOUT_CACHE_SIZE', 2)
+    resolve_layout(reordered(document, drop_codes=True))
+    assert layout_cache_info()['layouts'] == 2
+    resolve_layout(document)
+    assert layout_cache_info()['misses'] == 4
@@ -0,0 +1,48 @@
+"""
+Packs: round trip, checkpoint resume and index entries past the data.
+"""
+import os
+
+from src.io.pack import PackReader, PackWriter
+from src.io.storage import existing_names, open_source
+
+RECORDS = {f'file_{i}.json': {'id': str(i), 'text': 'Анамнез ' * i, 'values': [i, None, True]} for i in range(1, 6)}
+
+
+def test_pack_round_trip(tmp_path):
+    path = str(tmp_path / 'docs.pack')
+    with PackWriter(path) as writer:
+        for name, record in RECORDS.items():
+            writer.write(name, record)
+    with open_source(path) as reader:
+        assert isinstance(reader, PackReader)
+        assert reader.list_names('.json') == list(RECORDS)
+        for name, record in RECORDS.items():
+            assert reader.load_json(name) == record
+
+
+def test_pack_rewrite_last_wins_and_resume(tmp_path):
+    path = str(tmp_path / 'docs.pack')
+    with PackWriter(path) as writer:
+        writer.write('a.json', {'v': 1})
+        state = writer.sync()
+        writer.write('b.json', {'v': 2})
+    # Resuming from the checkpoint drops b.json
+    with PackWriter(path, resume_state=state) as writer:
+        writer.write('a.json', {'v': 3})
+    with PackReader(path) as reader:
+        assert reader.names() == ['a.json']
+        assert reader.load_json('a.json') == {'v': 3}
+
+
+def test_pack_ignores_index_entries_past_the_data(tmp_path):
+    path = str(tmp_path / 'docs.pack')
+    with PackWriter(path) as writer:
+        writer.write('a.json', {'v': 1})
+    size = os.path.getsize(path)
+    # An index line whose data never reached the disk
+    with open(path + '.idx', 'a', encoding='utf-8') as index:
+        index.write(f"{size}\t10\tghost.json\n")
+    with PackReader(path) as reader:
+        assert reader.names() == ['a.json']
+    assert existing_names(path) == {'a.json'}
@@ -0,0 +1,93 @@
+"""
+Asynchronous prefetching: outcomes in input order, bounded reads in flight, same output as a serial run.
+"""
+import random
+import threading
+import time
+
+import pytest
+
+from src.io.data_processor import save_features
+from src.io.file_converter import process_files_in_directory
+from src.io.storage import open_source
+from src.utils.prefetch import prefetch_documents
+
+
+class SlowSource:
+    """
+    Source whose reads take a random time; records the largest number of concurrent reads.
+    """
+    concurrent_reads = True
+
+    def __init__(self, count, missing=()):
+        self.names = [f'doc_{i}.json' for i in range(count)]
+        self.missing = set(missing)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.reads = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+    def read_bytes(self, name):
+        with self._lock:
+            self.in_flight += 1
+            self.reads += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = self._random.uniform(0, 0.005)
+        time.sleep(delay)
+        with self._lock:
+            self.in_flight -= 1
+        if name in self.missing:
+            raise FileNotFoundError(name)
+        return f'{{"name": "{name}"}}'.encode('utf-8')
+
+
+def parse(source, name):
+    return source.load_json(name)['name']
+
+
+def test_outcomes_in_input_order():
+    source = SlowSource(60, missing={'doc_7.json'})
+    outcomes = list(prefetch_documents(parse, source, source.names, concurrency=8))
+
+    assert [name for name, _, _ in outcomes] == source.names
+    for name, result, error in outcomes:
+        if name == 'doc_7.json':
+            assert result is None and isinstance(error, FileNotFoundError)
+        else:
+            assert result == name and error is None
+    assert 1 < source.max_in_flight <= 8
+
+
+def test_function_errors_are_returned():
+    def fail(source, name):
+        raise ValueError(name)
+
+    outcomes = list(prefetch_documents(fail, SlowSource(3), ['doc_0.json', 'doc_1.json'], concurrency=2))
+    assert [type(error) for _, _, error in outcomes] == [ValueError, ValueError]
+
+
+def test_early_stop_ends_the_thread():
+    source = SlowSource(200)
+    outcomes = prefetch_documents(parse, source, source.names, concurrency=4)
+    assert [next(outcomes)[0] for _ in range(3)] == source.names[:3]
+    outcomes.close()
+    assert not any(thread.name == 'prefetch' for thread in threading.enumerate())
+    assert source.reads < 200
+
+    with pytest.raises(ValueError):
+        next(prefetch_documents(parse, source, source.names, concurrency=0))
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {name: source.load_json(name) for name in source.list_names('.json')}
+
+
+def test_stages_with_prefetching_match_serial(corpus, tmp_path):
+    process_files_in_directory(corpus['xml'], str(tmp_path / 'json'), io_concurrency=4)
+    assert read_all(str(tmp_path / 'json')) == read_all(corpus['json'])
+
+    stats = save_features(corpus['json'], str(tmp_path / 'features'), io_concurrency=4, profile=True)
+    assert read_all(str(tmp_path / 'features')) == read_all(corpus['features'])
+    assert stats['profile']['timers']['stage.extract_features']['calls'] == stats['total']
@@ -0,0 +1,75 @@
+"""
+Profiling: stage and parser timers, counters and the sampled document; failing parsers are named.
+"""
+import json
+
+import pytest
+
+from src.io.data_processor import save_features
+from src.utils.errors import ErrorCollector
+from src.utils.profiling import StageProfiler, call, count, get_profiler, profiling, timed
+
+
+def test_helpers_do_nothing_when_inactive():
+    assert get_profiler() is None
+    with timed('stage.x'):
+        count('documents')
+    assert call('parser.len', len, [1, 2]) == 2
+
+
+def test_profiler_collects_timers_and_counters():
+    with profiling() as profiler:
+        assert get_profiler() is profiler
+        for _ in range(3):
+            with timed('stage.x'):
+                count('documents', 2)
+        call('parser.len', len, [])
+        with profiling(enabled=False) as disabled:
+            assert disabled is None and get_profiler() is profiler
+    assert get_profiler() is None
+
+    result = profiler.as_dict()
+    json.dumps(result)
+    assert result['timers']['stage.x']['calls'] == 3
+    assert result['timers']['parser.len']['calls'] == 1
+    assert result['counters'] == {'documents': 6}
+
+
+def test_failing_call_names_the_parser():
+    def inner(data):
+        raise ValueError(f"cannot parse {data}")
+
+    def parse(data):
+        return call('parser.inner', inner, data)
+
+    with pytest.raises(ValueError) as raised:
+        call('parser.outer', parse, 'x')
+    assert raised.value.failed_call == 'parser.inner'
+
+    errors = ErrorCollector()
+    entry = errors.record('doc.json', 'extract_features', raised.value)
+    assert entry['parser'] == 'inner'
+    assert entry['location'].startswith('test_profiling.py:') and entry['location'].endswith(' in inner')
+
+
+def test_save_features_profile(corpus, tmp_path):
+    stats = save_features(corpus['json'], str(tmp_path / 'features'), profile=True, profile_sample=2)
+    profile = stats['profile']
+
+    assert profile['timers']['stage.extract_features']['calls'] == stats['total']
+    assert profile['timers']['parser.get_gosp_info']['calls'] == stats['total']
+    assert profile['counters']['documents'] == stats['success']
+    assert profile['counters']['bytes_read'] > 0
+    assert profile['sample']['peak_memory_kb'] > 0
+    assert 'extract_features' in profile['sample']['cprofile']
+
+    assert 'profile' not in save_features(corpus['json'], str(tmp_path / 'plain'))
+
+
+def test_profiler_is_thread_safe():
+    from concurrent.futures import ThreadPoolExecutor
+
+    profiler = StageProfiler()
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda _: [profiler.count('n') for _ in range(1000)], range(8)))
+    assert profiler.counters['n'] == 8000
@@ -0,0 +1,52 @@
+"""
+save_features numbers its records the same way for every input format.
+"""
+import io
+import os
+import tarfile
+
+import pytest
+
+from src.io.data_processor import save_features
+from src.io.file_converter import process_files_in_directory
+from src.io.jsonl import JsonlShardWriter
+from src.io.storage import open_source
+from src.utils.synthetic_cda import generate_corpus
+
+
+@pytest.fixture(scope='module')
+def json_dir(tmp_path_factory):
+    root = tmp_path_factory.mktemp('corpus')
+    generate_corpus(str(root / 'xml'), 12)
+    process_files_in_directory(str(root / 'xml'), str(root / 'json'))
+    return str(root / 'json')
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {name: source.load_json(name) for name in source.list_names('.json')}
+
+
+def test_numbering_does_not_depend_on_storage_order(json_dir, tmp_path):
+    names = sorted(os.listdir(json_dir), reverse=True)
+    tar_path = str(tmp_path / 'json.tar.gz')
+    with tarfile.open(tar_path, 'w:gz') as archive:
+        for name in names:
+            with open(os.path.join(json_dir, name), 'rb') as file:
+                data = file.read()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    shards = str(tmp_path / 'shards')
+    with JsonlShardWriter(shards, shard_size=5) as writer, open_source(json_dir) as source:
+        for name in names:
+            writer.write(name, source.load_json(name))
+
+    save_features(json_dir, str(tmp_path / 'from_dir'))
+    expected = read_all(str(tmp_path / 'from_dir'))
+    assert len(expected) == 12
+    for path in (tar_path, shards):
+        output = str(tmp_path / f'from_{os.path.basename(path)}')
+        stats = save_features(path, output, output_format='jsonl')
+        assert stats['success'] == 12
+        assert read_all(output) == expected
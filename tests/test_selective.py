@@ -0,0 +1,64 @@
+"""
+Selective JSON loading gives the pruned full decode for indented and compact documents.
+"""
+import json
+import os
+
+import pytest
+
+from src.io.selective import compile_fields, prune, select_json
+
+FIELD_SPECS = [
+    ['id'],
+    ['id', 'sex', 'birth_date'],
+    ['anamnez.disease_history', 'ward_list'],
+    [('tables', 'final_table1'), 'conditions', 'missing', 'tables.missing'],
+    ['tables', 'tables.diagnosis'],
+    ['ward_list.0'],
+]
+
+
+def encodings(record):
+    yield json.dumps(record, ensure_ascii=False, indent=4)
+    yield json.dumps(record, ensure_ascii=False, indent=2).encode('utf-8')
+    yield json.dumps(record, indent=4)
+    yield json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+    yield json.dumps(record)
+    yield b'\xef\xbb\xbf' + json.dumps(record, ensure_ascii=False).encode('utf-8')
+
+
+@pytest.fixture(scope='module')
+def records(corpus):
+    result = []
+    for stage in ('features', 'structured'):
+        for name in sorted(os.listdir(corpus[stage]))[:3]:
+            with open(os.path.join(corpus[stage], name), encoding='utf-8') as file:
+                result.append(json.load(file))
+    return result
+
+
+@pytest.mark.parametrize('fields', FIELD_SPECS)
+def test_select_json_matches_pruned_decode(records, fields):
+    tree = compile_fields(fields)
+    for record in records:
+        expected = prune(record, tree)
+        for content in encodings(record):
+            assert select_json(content, fields) == expected
+
+
+def test_compile_fields():
+    assert compile_fields(['a.b', ('a', 'c'), 'd']) == {'a': {'b': None, 'c': None}, 'd': None}
+    assert compile_fields(['a', 'a.b']) == {'a': None}
+    assert compile_fields(['a.b', 'a']) == {'a': None}
+
+
+@pytest.mark.parametrize('content', [
+    '{"a \\"quoted\\" key": {"x": [1, {"y": "}"}]}, "text": "line\\nbreak ]}", "n": -1.5e3, "ключ": null}',
+    json.dumps({'a "quoted" key': {'x': [1, {'y': '}'}]}, 'text': 'line\nbreak ]}', 'n': -1.5e3, 'ключ': None},
+               ensure_ascii=False, indent=2),
+    '{ "n" : 1 , "text" : "a" , "ключ" : true }',
+    '{}',
+])
+def test_tricky_documents(content):
+    fields = ['a "quoted" key.x', 'text', 'n', 'ключ']
+    assert select_json(content, fields) == prune(json.loads(content), compile_fields(fields))
@@ -0,0 +1,54 @@
+"""
+The in-memory service API: same records as the file pipeline, invalid paths give None.
+"""
+import json
+import os
+
+import pytest
+
+from src.service import parse_batch, parse_document
+from src.utils.helpers import find_section_by_optimized_path
+
+
+def canonical(record):
+    return json.dumps(json.loads(json.dumps(record)), sort_keys=True)
+
+
+def test_parse_document_matches_pipeline(corpus):
+    parsed = []
+    for name in sorted(os.listdir(corpus['xml'])):
+        with open(os.path.join(corpus['xml'], name), 'rb') as file:
+            parsed.append(canonical(parse_document(file.read())))
+
+    written = []
+    for name in os.listdir(corpus['structured']):
+        with open(os.path.join(corpus['structured'], name), encoding='utf-8') as file:
+            written.append(canonical(json.load(file)))
+
+    assert sorted(parsed) == sorted(written)
+
+
+def test_parse_batch_reports_failures():
+    (record, error), = parse_batch([b'<not xml'])
+    assert record is None
+    assert error['error_type']
+    with pytest.raises(ValueError):
+        parse_document(b'<ClinicalDocument/>', stage='pdf')
+
+
+@pytest.mark.parametrize('path', [
+    ['section', ['unhashable']],
+    [{'key': 'value'}],
+    ['section', 'missing'],
+    ['section', 'entries', 5],
+    None,
+])
+def test_invalid_paths_return_none(path):
+    data = {'{urn:hl7-org:v3}section': {'{urn:hl7-org:v3}entries': [{'a': 1}]}}
+    assert find_section_by_optimized_path(data, path) is None
+
+
+def test_path_fields():
+    data = {'{urn:hl7-org:v3}section': {'{urn:hl7-org:v3}entries': [{'a': 1, 'b': 2}]}}
+    assert find_section_by_optimized_path(data, ['section', 'entries', '0']) is None
+    assert find_section_by_optimized_path(data, ['section', 'entries', 0], fields=('a', 'c')) == {'a': 1, 'c': None}
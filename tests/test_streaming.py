@@ -0,0 +1,81 @@
+"""
+Streaming API: the generator chain gives the records and tables of the folder functions, lazily.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.io import streaming
+from src.io.dataset_process import create_patients_table, create_table_generic, create_ward_list_table
+from src.io.storage import open_source
+from src.io.streaming import (iter_documents, iter_features, iter_records, iter_structured, iter_table_rows,
+                              table_fields)
+from src.utils.errors import ErrorCollector
+
+
+def read_all(path):
+    with open_source(path) as source:
+        return {name: source.load_json(name) for name in source.list_names('.json')}
+
+
+def test_chain_matches_folder_functions(corpus):
+    documents = dict(iter_documents(corpus['xml']))
+    assert documents == read_all(corpus['json'])
+
+    features = [record for _, record in iter_features(iter_records(corpus['json']))]
+    structured = [record for _, record in iter_structured(iter_features(iter_documents(corpus['xml'])))]
+    sort_key = lambda record: record['document_id']
+    assert sorted(features, key=sort_key) == sorted(read_all(corpus['features']).values(), key=sort_key)
+    assert sorted(structured, key=sort_key) == sorted(read_all(corpus['structured']).values(), key=sort_key)
+
+
+@pytest.mark.parametrize('table', ['patients', 'ward_list', 'table_gosp', 'final_table1'])
+def test_table_rows_match_builders(corpus, table):
+    rows = pd.DataFrame(iter_table_rows(iter_records(corpus['structured'], fields=table_fields(table)), table))
+    if table == 'patients':
+        expected = create_patients_table(corpus['structured'])
+    elif table == 'ward_list':
+        expected = create_ward_list_table(corpus['structured'])
+    else:
+        expected = create_table_generic(corpus['structured'], f"pd.DataFrame.from_dict(data['tables']['{table}'])",
+                                        id_column_name=f'{table}_id')
+    pd.testing.assert_frame_equal(rows, expected, check_like=True)
+
+
+def test_chain_is_lazy(corpus, monkeypatch):
+    converted = []
+    convert = streaming._convert_document
+    monkeypatch.setattr(streaming, '_convert_document',
+                        lambda source, name: converted.append(name) or convert(source, name))
+
+    chain = iter_structured(iter_features(iter_documents(corpus['xml'])))
+    assert converted == []
+    next(chain)
+    assert len(converted) == 1
+    next(chain)
+    assert len(converted) == 2
+    chain.close()
+
+
+def test_failures_raise_or_are_recorded(corpus, tmp_path):
+    directory = tmp_path / 'input'
+    directory.mkdir()
+    for name in sorted(os.listdir(corpus['json']))[:3]:
+        shutil.copy(os.path.join(corpus['json'], name), directory / name)
+    (directory / 'broken.json').write_text('{"broken": ', encoding='utf-8')
+    (directory / 'empty.json').write_text('[]', encoding='utf-8')
+    names = sorted(os.listdir(directory))
+
+    with pytest.raises(Exception):
+        list(iter_features(iter_records(str(directory), names)))
+
+    errors = ErrorCollector()
+    features = list(iter_features(iter_records(str(directory), names, errors=errors), errors=errors))
+    assert len(features) == 3
+    assert [(record['file'], record['stage']) for record in errors.records] == \
+        [('broken.json', 'load'), ('empty.json', 'extract_features')]
+
+    with pytest.raises(ValueError):
+        list(iter_table_rows([], 'unknown'))
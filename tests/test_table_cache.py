@@ -0,0 +1,40 @@
+"""
+Table parse cache: equal results, and statistics of serial and parallel runs.
+"""
+import os
+
+import pytest
+
+from src.io.data_processor import process_folder_to_structured_format
+from src.io.storage import open_source
+from src.utils.table_utils import parse_table_as_dict, table_cache, table_cache_info
+
+TABLE = {'{urn:hl7-org:v3}table': {
+    '{urn:hl7-org:v3}thead': {'{urn:hl7-org:v3}tr': {'{urn:hl7-org:v3}th': [{'text': 'Показатель'},
+                                                                          {'text': 'Результат'}]}},
+    '{urn:hl7-org:v3}tbody': {'{urn:hl7-org:v3}tr': [
+        {'{urn:hl7-org:v3}td': [{'{urn:hl7-org:v3}content': {'text': 'Гемоглобин'}},
+                                {'{urn:hl7-org:v3}content': {'text': '120'}}]}]}}}
+
+
+def test_cached_tables_equal_parsed_tables():
+    expected = parse_table_as_dict(TABLE)
+    with table_cache(maxsize=8) as cache:
+        assert parse_table_as_dict(TABLE) == expected
+        assert parse_table_as_dict(TABLE) == expected
+        assert cache.info() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 8}
+    assert table_cache_info() is None
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_structured_stage_reports_cache_statistics(corpus, tmp_path, workers):
+    output = str(tmp_path / 'structured')
+    stats = process_folder_to_structured_format(corpus['features'], output, workers=workers, table_cache_size=64)
+    info = stats['table_cache']
+    # Every worker process that converted documents reports its own cache
+    assert 1 <= info['caches'] <= workers and info['maxsize'] == 64 * info['caches']
+    assert info['hits'] > 0 and info['hits'] + info['misses'] >= stats['success']
+    with open_source(output) as cached, open_source(corpus['structured']) as uncached:
+        assert sorted(os.listdir(output)) == sorted(uncached.list_names())
+        for name in uncached.list_names():
+            assert cached.load_json(name) == uncached.load_json(name)
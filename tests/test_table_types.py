@@ -0,0 +1,77 @@
+"""
+Typed patients table: dates, shared categories, interned text and the stay columns.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.io.dataset_process import create_patients_table
+from src.io.table_types import SharedCategories, add_stay_columns, table_memory, type_patients_table
+
+
+def patients(sexes, birth_dates=None):
+    birth_dates = birth_dates or ['19500315'] * len(sexes)
+    return pd.DataFrame({
+        'id_card': range(len(sexes)),
+        'sex': sexes,
+        'birth_date': birth_dates,
+        'treatment_result': [['Улучшение'], [], ['Улучшение', 'Без перемен']][:len(sexes)],
+        'disease_history': ['одинаковый ' + 'текст'] * len(sexes),
+    })
+
+
+def test_type_patients_table():
+    df = patients(['М', 'Ж', None], ['19500315', '28.04.1961', 'неизвестно'])
+    typed = type_patients_table(df, report=False)
+
+    assert typed['birth_date'].dtype.kind == 'M'
+    assert list(typed['birth_date'].isna()) == [False, False, True]
+    assert typed['birth_date'][1] == pd.Timestamp('1961-04-28')
+    assert list(typed['sex'].astype(object)) == ['М', 'Ж', np.nan]
+    assert list(typed['treatment_result'].astype(object)) == ['Улучшение', np.nan, 'Улучшение; Без перемен']
+    assert typed['disease_history'][0] is typed['disease_history'][2]
+    assert typed.attrs['memory']['after'] == table_memory(typed)['total']
+    assert typed.attrs['memory']['after'] < typed.attrs['memory']['before']
+
+
+def test_shared_categories_agree_across_batches(tmp_path):
+    categories = SharedCategories()
+    first = type_patients_table(patients(['М', 'Ж']), categories, report=False)
+    second = type_patients_table(patients(['Ж', None, 'неизв.']), categories, report=False)
+
+    assert list(first['sex'].cat.codes) == [0, 1]
+    assert list(second['sex'].cat.codes) == [1, -1, 2]
+    combined = pd.concat([categories.align(first), categories.align(second)], ignore_index=True)
+    assert isinstance(combined['sex'].dtype, pd.CategoricalDtype)
+
+    categories.save(str(tmp_path / 'categories.json'))
+    reloaded = SharedCategories(str(tmp_path / 'categories.json'))
+    assert reloaded.categories['sex'] == ['М', 'Ж', 'неизв.']
+
+
+def test_add_stay_columns():
+    df = patients(['М', 'Ж', 'М'], ['19500315', '19610428', '19700101'])
+    table_gosp = pd.DataFrame({
+        'id_card': [0, 0, 1],
+        'Дата поступления': ['10.03.2020', '01.03.2020', '28.04.2021'],
+        'Дата выписки': ['20.03.2020', '05.03.2020', None],
+    })
+    result = add_stay_columns(type_patients_table(df, report=False), table_gosp)
+
+    assert list(result['admission_date'][:2]) == [pd.Timestamp('2020-03-01'), pd.Timestamp('2021-04-28')]
+    assert result['admission_date'].isna()[2]
+    assert result['discharge_date'][0] == pd.Timestamp('2020-03-20')
+    np.testing.assert_array_equal(result['age_at_admission'], [69, 60, np.nan])
+    np.testing.assert_array_equal(result['length_of_stay'], [19, np.nan, np.nan])
+
+
+def test_typed_patients_table_keeps_values(corpus):
+    plain = create_patients_table(corpus['structured'])
+    typed = create_patients_table(corpus['structured'], typed=True)
+
+    assert len(typed) == len(plain)
+    for column in ('sex', 'type_gosp'):
+        assert isinstance(typed[column].dtype, pd.CategoricalDtype)
+        assert list(typed[column].astype(object).where(typed[column].notna(), None)) == \
+            list(plain[column].where(plain[column].notna(), None))
+    assert set(typed.attrs['memory']) == {'before', 'after'}
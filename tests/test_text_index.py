@@ -0,0 +1,68 @@
+"""
+Full-text index: queries, replacement of cards, persistence and compaction.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.io.text_index import TextIndex
+
+CARDS = {
+    1: {'disease_history': 'Жалобы на боли за грудиной и одышку', 'life_history': 'Курит 20 лет'},
+    2: {'disease_history': 'Кашель, одышка при нагрузке', 'condition_complaints': 'кашель'},
+    3: {'disease_history': 'Боли в животе', 'objective_status': 'Одышки нет'},
+}
+
+
+def build(path=None):
+    index = TextIndex(path)
+    for id_card, texts in CARDS.items():
+        index.add(id_card, texts)
+    return index
+
+
+def test_search_terms_phrases_and_operators():
+    index = build()
+    assert index.search('одышка').tolist() == [1, 2, 3]
+    assert index.search('"боли за грудиной"').tolist() == [1]
+    assert index.search('"за боли"').tolist() == []
+    assert index.search('одышка AND (кашель OR "боли за грудиной")').tolist() == [1, 2]
+    assert index.search('боли OR кашель').tolist() == [1, 2, 3]
+    assert index.search('курит', fields=['disease_history']).tolist() == []
+    assert index.search('курит', fields=['life_history']).tolist() == [1]
+
+
+def test_search_rejects_bad_queries():
+    index = build()
+    with pytest.raises(ValueError):
+        index.search('(одышка')
+    with pytest.raises(ValueError):
+        index.search('одышка', fields=['unknown'])
+
+
+def test_last_added_texts_win():
+    index = build()
+    index.add(2, {'disease_history': 'Головная боль'})
+    index.add_table(pd.DataFrame({'id_card': [3, 3], 'disease_history': ['кашель', 'тошнота']}))
+    index.add(1, {'disease_history': 'Тошнота'})
+    assert index.search('кашель').tolist() == []
+    assert index.search('тошнота').tolist() == [1, 3]
+    assert index.search('головная').tolist() == [2]
+    assert index.cards.tolist() == [1, 2, 3]
+
+
+def test_commit_reload_and_compact(tmp_path):
+    path = str(tmp_path / 'index')
+    index = build(path)
+    index.commit()
+    index.add(3, {'disease_history': 'Кашель'})
+    index.commit()
+    assert len(index.segments) == 2
+
+    reloaded = TextIndex(path)
+    assert reloaded.search('кашель').tolist() == [2, 3]
+    assert reloaded.search('живот').tolist() == []
+    reloaded.compact()
+    assert len(reloaded.segments) == 1
+    assert TextIndex(path).search('одышка').tolist() == [1, 2]
+    np.testing.assert_array_equal(TextIndex(path).cards, [1, 2, 3])